@@ -1,5 +1,12 @@
+import time
+
 import streamlit as st
 
+from phenomix.db import pool_stats
+from phenomix.snapshot import get_snapshot_or_warn
+from phenomix.trace_panel import show_trace_panel
+from phenomix.tracing import begin
+
 
 def init_session_state():
 
@@ -15,6 +22,9 @@ st.set_page_config(
     page_icon="👋",
 )
 
+# Queries and chat calls made during this rerun
+trace = begin("Home")
+
 
 
 def show():
@@ -24,7 +34,20 @@ def show():
         Explore the Sentinel, HDRUK, CPRD, OHDSI, and PHEKB phenotype databases with browser as well as GPT + Neo4j integrated chatbot.
     """)
 
+    snapshot = get_snapshot_or_warn("Browser and View Phenotype are reading from Neo4j instead.")
+    if snapshot is not None:
+        info = snapshot.info()
+        st.caption(f"Browser and View Phenotype are reading the local snapshot {snapshot.path}, "
+                   f"exported {time.strftime('%Y-%m-%d %H:%M', time.localtime(info['exported_at']))}.")
+
+    # Telemetry for the Neo4j connection pool shared by all pages and users
+    stats = pool_stats()
+    if stats:
+        with st.expander("Neo4j connection pool"):
+            st.json(stats)
+
 
 init_session_state()
 show()
+show_trace_panel(trace)
 
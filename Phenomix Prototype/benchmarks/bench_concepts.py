@@ -0,0 +1,114 @@
+"""
+Benchmark: client-side cost of building one detail's concept table.
+
+Compares the old get_concepts (literal_eval on every string property, then a
+per-concept projection loop) with the current path, and with project_concepts'
+columnar fallback for rows that still carry lists. PHENOTYPE_VIEW_QUERY only
+returns each detail's concept_count now; View Phenotype pages through the
+concepts with CONCEPT_PAGE_QUERY, which projects the lists server-side. The
+"server-projected" case times only the client side of that path
+(project_concepts building the DataFrame from rows already projected here in
+Python); the query itself is not run or timed.
+
+    python -m benchmarks.bench_concepts --concepts 50000
+"""
+import argparse
+import random
+import time
+from ast import literal_eval
+
+import pandas as pd
+
+from phenomix.concepts import project_concepts
+
+
+def synthetic_concepts(count, seed=0, legacy=False):
+    rng = random.Random(seed)
+    detail_pid = "CPRD0000"
+    concepts = []
+    for i in range(count):
+        pids = [f"CPRD{rng.randint(1, 500):04d}" for _ in range(rng.randint(0, 4))]
+        pids.insert(rng.randint(0, len(pids)), detail_pid)
+        concept = {
+            "CID": f"C{i:07d}",
+            "descr": f"concept {i}",
+            "read_code": f"{rng.randint(0, 99999):05d}",
+            "PIDs": pids,
+            "medcode": [float(rng.randint(1, 10 ** 6)) for _ in pids],
+            "snomedctconceptid": [float(rng.randint(1, 10 ** 9)) for _ in pids],
+            "disease": [f"disease {pid}" for pid in pids],
+            "disease_num": [int(pid[4:]) for pid in pids],
+            "category": [rng.choice(["Diagnosis", "History", "Symptom"]) for _ in pids],
+        }
+        if legacy:
+            concept = {key: repr(value) if isinstance(value, list) else value for key, value in concept.items()}
+        concepts.append(concept)
+    return concepts, detail_pid
+
+
+def projected_rows(concepts, detail_pid):
+    # What the server-side projection in CONCEPT_PAGE_QUERY returns
+    rows = []
+    for concept in concepts:
+        index = concept["PIDs"].index(detail_pid)
+        rows.append({key: value[index] if isinstance(value, list) else value for key, value in concept.items()})
+    return rows
+
+
+def rowwise_projection(concepts, detail_pid):
+    # The projection as get_concepts did it before the columnar rewrite
+    rows = []
+    for concept in concepts:
+        concept = dict(concept)
+        for key, value in concept.items():
+            if isinstance(value, str):
+                try:
+                    concept[key] = literal_eval(value)
+                except (ValueError, SyntaxError):
+                    pass
+        if "PIDs" in concept and isinstance(concept["PIDs"], list):
+            try:
+                index = concept["PIDs"].index(detail_pid)
+                for key, value in concept.items():
+                    if isinstance(value, list) and len(value) > index:
+                        concept[key] = value[index]
+            except ValueError:
+                pass
+        rows.append(concept)
+    return pd.DataFrame(rows)
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def run(count, repeat):
+    concepts, detail_pid = synthetic_concepts(count)
+    legacy, _ = synthetic_concepts(count, legacy=True)
+    projected = projected_rows(concepts, detail_pid)
+
+    timings = {}
+    timings["old get_concepts, unmigrated"], expected = best_of(lambda: rowwise_projection(legacy, detail_pid), repeat)
+    timings["old get_concepts, native lists"], _ = best_of(lambda: rowwise_projection(concepts, detail_pid), repeat)
+    timings["server-projected rows, client side only"], result = best_of(lambda: project_concepts(projected, detail_pid), repeat)
+    timings["columnar fallback, native lists"], fallback = best_of(lambda: project_concepts(concepts, detail_pid), repeat)
+    timings["columnar fallback, unmigrated"], _ = best_of(lambda: project_concepts(legacy, detail_pid), repeat)
+    assert result["medcode"].tolist() == expected["medcode"].tolist() == fallback["medcode"].tolist()
+
+    baseline = timings["old get_concepts, unmigrated"]
+    print(f"concepts: {count}")
+    for name, seconds in timings.items():
+        print(f"{name:<42} {seconds * 1e3:9.1f} ms  ({baseline / seconds:5.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concepts", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.concepts, args.repeat)
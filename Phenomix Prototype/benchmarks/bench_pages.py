@@ -0,0 +1,306 @@
+"""
+Offline benchmark of the Browser, View Phenotype and Chatbot pages.
+
+The pages run under streamlit's AppTest against a synthetic graph
+(benchmarks.synthetic) through stand-ins for the Neo4j driver and the chat
+client, installed with phenomix.db.set_driver and phenomix.llm.set_client.
+Each round trip sleeps --db-latency seconds and each chat call --llm-latency
+seconds, so the timings reflect how many calls a page makes as well as the
+work it does locally. Page timings include AppTest's script overhead; the
+phenomix data-access functions the pages call are timed on their own too.
+
+Every scenario reports median / min seconds, queries per run by kind and chat
+calls per run by kind, written as JSON. --compare flags scenarios that got
+slower than a previous run by more than --threshold, or that make more
+queries or chat calls, and exits with status 1 if there are any.
+
+    python -m benchmarks.bench_pages --output bench.json
+    python -m benchmarks.bench_pages --compare bench.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import traceback
+
+import streamlit as st
+from streamlit.logger import get_logger
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.synthetic import StandInChatClient, StandInDriver, SyntheticGraph
+from phenomix import db, llm
+from phenomix.concepts import concepts_frame, fetch_concepts_page
+from phenomix.details import load_details_by_pid, load_phenotype_view
+from phenomix.properties import as_list
+from phenomix.sources import DETAIL_LABELS, PID_PROPERTIES, source_mask, sources_of
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = {
+    "browser": os.path.join(ROOT, "pages", "Browser.py"),
+    "view": os.path.join(ROOT, "pages", "View Phenotype.py"),
+    "chat": os.path.join(ROOT, "pages", "Chatbot.py"),
+}
+
+# AppTest runs the pages without a server, and streamlit warns about that on every
+# run ("missing ScriptRunContext", "No runtime found"). It also resets its loggers'
+# levels on each run, so the warnings are dropped with filters, which it leaves alone.
+NOISY_LOGGERS = [
+    "streamlit.runtime.scriptrunner_utils.script_run_context",
+    "streamlit.runtime.caching.cache_data_api",
+]
+
+
+class _ErrorsOnly(logging.Filter):
+
+    def filter(self, record):
+        return record.levelno >= logging.ERROR
+
+
+for _name in NOISY_LOGGERS:
+    get_logger(_name).addFilter(_ErrorsOnly())
+
+QUESTION = "Which phenotypes use the concept codes for chronic kidney disease?"
+
+
+
+def clear_caches():
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def app(page, phenotype_id=None):
+    at = AppTest.from_file(PAGES[page], default_timeout=120)
+    # The stand-in driver ignores the credentials, but the pages read them
+    at.session_state["neo_uri"] = "bolt://offline"
+    at.session_state["neo_user"] = "neo4j"
+    at.session_state["neo_password"] = "offline"
+    at.session_state["current_pheno"] = phenotype_id
+    return at
+
+
+def rerun(at, change=None):
+    # change sets a widget value before the rerun
+    if change is not None:
+        change(at)
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at
+
+
+class Scenario:
+    # setup() is untimed; run(state) is the measured step
+
+    def __init__(self, name, run, setup=None, cold=False):
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda: None)
+        self.cold = cold
+
+
+def page_scenarios(graph):
+    view_id = graph.sample_ids(1, min_sources=3)[0]
+    phenotype = graph.by_id[view_id]
+    concept_pid = next(
+        pid for source in sources_of(source_mask(view_id)) if source != "HDRUK"
+        for pid in as_list(phenotype[PID_PROPERTIES[source]])
+        if graph.concept_index[DETAIL_LABELS[source]].get(pid)
+    )
+
+    def ask(at):
+        return rerun(at, lambda at: at.chat_input[0].set_value(QUESTION))
+
+    def chat(*checks):
+        def setup():
+            at = rerun(app("chat"))
+            for label in checks:
+                next(box for box in at.checkbox if box.label == label).check()
+            return rerun(at)
+        return setup
+
+    return [
+        # Browser: fetch_phenotype_data + show()
+        Scenario("browser_cold", lambda at: rerun(at), lambda: app("browser"), cold=True),
+        Scenario("browser_warm", lambda at: rerun(at), lambda: rerun(app("browser"))),
+        Scenario("browser_search", lambda at: rerun(at, lambda at: at.text_input[0].input("chronic kidney")),
+                 lambda: rerun(app("browser"))),
+        Scenario("browser_next_page", lambda at: rerun(at, lambda at: at.number_input(key="browser_page").set_value(2)),
+                 lambda: rerun(app("browser"))),
+        # View Phenotype: header + tabs(), then one page of concepts (get_concepts)
+        Scenario("view_phenotype", lambda at: rerun(at), lambda: app("view", view_id), cold=True),
+        Scenario("view_concepts", lambda at: rerun(at, lambda at: at.toggle(key=f"concepts_{concept_pid}").set_value(True)),
+                 lambda: rerun(app("view", view_id))),
+        # Chatbot: question -> Cypher -> guarded run -> streamed answer
+        Scenario("chat_answer_cold", ask, chat(), cold=True),
+        Scenario("chat_answer_warm", ask, chat()),
+        # ... plus find_phenotype and pheno_desc on the answer
+        Scenario("chat_descriptions_cold", ask,
+                 chat("Relevant Phenotype Description"), cold=True),
+    ]
+
+
+def function_scenarios(graph, driver):
+    view_ids = graph.sample_ids(20, seed=1)
+    pages = [
+        (DETAIL_LABELS[source], pid)
+        for phenotype_id in view_ids for source in sources_of(source_mask(phenotype_id)) if source != "HDRUK"
+        for pid in as_list(graph.by_id[phenotype_id][PID_PROPERTIES[source]])
+    ]
+    pids_by_label = {}
+    for phenotype_id in view_ids:
+        for source in sources_of(source_mask(phenotype_id)):
+            pids_by_label.setdefault(DETAIL_LABELS[source], []).extend(
+                as_list(graph.by_id[phenotype_id][PID_PROPERTIES[source]]))
+
+    def view_all(state):
+        for phenotype_id in view_ids:
+            load_phenotype_view(driver, phenotype_id)
+
+    def concept_pages(state):
+        for label, pid in pages:
+            concepts_frame(fetch_concepts_page(driver, label, pid, limit=100), pid)
+
+    return [
+        Scenario("load_phenotype_view_x20", view_all),
+        Scenario(f"concept_page_x{len(pages)}", concept_pages),
+        Scenario("load_details_by_pid_x20", lambda state: load_details_by_pid(driver, pids_by_label)),
+    ]
+
+
+def measure(scenario, driver, client, repeat):
+    timings, queries, calls = [], [], []
+    for _ in range(repeat):
+        if scenario.cold:
+            clear_caches()
+        state = scenario.setup()
+        driver.reset()
+        client.reset()
+        start = time.perf_counter()
+        scenario.run(state)
+        timings.append(time.perf_counter() - start)
+        queries.append(dict(driver.queries))
+        calls.append(dict(client.calls))
+
+    def per_run(counts):
+        kinds = sorted(set().union(*counts))
+        return {kind: statistics.median(c.get(kind, 0) for c in counts) for kind in kinds}
+
+    result = {
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "runs": repeat,
+        "queries": per_run(queries),
+        "llm_calls": per_run(calls),
+    }
+    result["query_total"] = sum(result["queries"].values())
+    result["llm_total"] = sum(result["llm_calls"].values())
+    return result
+
+
+def run(args):
+    start = time.perf_counter()
+    graph = SyntheticGraph(args.phenotypes, args.concepts_per_detail, args.details_per_concept, seed=args.seed)
+    built = time.perf_counter() - start
+    driver = StandInDriver(graph, latency=args.db_latency, result_rows=args.result_rows)
+    client = StandInChatClient(graph, latency=args.llm_latency, token_latency=args.token_latency, seed=args.seed)
+    db.set_driver(driver)
+    llm.set_client(client)
+
+    scenarios = function_scenarios(graph, driver) + page_scenarios(graph)
+    if args.scenarios:
+        scenarios = [scenario for scenario in scenarios if any(name in scenario.name for name in args.scenarios)]
+
+    results = {}
+    try:
+        for scenario in scenarios:
+            try:
+                results[scenario.name] = measure(scenario, driver, client, args.repeat)
+            except Exception as e:
+                results[scenario.name] = {"error": f"{type(e).__name__}: {e}"}
+                if args.verbose:
+                    traceback.print_exc()
+            print_row(scenario.name, results[scenario.name])
+    finally:
+        db.set_driver(None)
+        llm.set_client(None)
+        clear_caches()
+
+    return {
+        "created_at": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "verbose")},
+        "graph": {**graph.count(), "build_s": built},
+        "scenarios": results,
+    }
+
+
+def print_row(name, result):
+    if "error" in result:
+        print(f"{name:<26} ERROR {result['error']}")
+        return
+    queries = ", ".join(f"{kind} {count:g}" for kind, count in result["queries"].items()) or "-"
+    calls = ", ".join(f"{kind} {count:g}" for kind, count in result["llm_calls"].items()) or "-"
+    print(f"{name:<26} {result['median_s'] * 1e3:>9.1f} ms  queries: {queries}  llm: {calls}")
+
+
+def compare(report, baseline, threshold):
+    """Lines describing every regression against baseline."""
+    regressions = []
+    for name, result in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None or "error" in before:
+            continue
+        if "error" in result:
+            regressions.append(f"{name}: now fails ({result['error']})")
+            continue
+        ratio = result["median_s"] / before["median_s"] if before["median_s"] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {before['median_s'] * 1e3:.1f} ms -> {result['median_s'] * 1e3:.1f} ms ({ratio:.2f}x)")
+        for total, what in (("query_total", "queries"), ("llm_total", "chat calls")):
+            if result[total] > before[total]:
+                regressions.append(f"{name}: {before[total]:g} -> {result[total]:g} {what} per run")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--phenotypes", type=int, default=2000)
+    parser.add_argument("--concepts-per-detail", type=int, default=200)
+    parser.add_argument("--details-per-concept", type=int, default=3, help="average details sharing a concept")
+    parser.add_argument("--result-rows", type=int, default=50, help="rows returned by generated Cypher")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="seconds per Neo4j round trip")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per chat call before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="seconds per streamed token")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenarios", nargs="+", help="only run scenarios whose names contain one of these")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file from an earlier run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    parser.add_argument("--verbose", action="store_true", help="print tracebacks of failing scenarios")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
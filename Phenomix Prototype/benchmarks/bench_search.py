@@ -0,0 +1,70 @@
+"""
+Micro-benchmark: Browser substring scan vs. the prebuilt phenotype SearchIndex.
+
+Both paths return every match (no limit), as the Browser needs the full result
+count; "scan hits" / "index hits" are their result sizes (the index also finds
+typos and out-of-order words, so it can return more).
+
+    python -m benchmarks.bench_search --sizes 5000 50000 200000
+"""
+import argparse
+import random
+import time
+
+from phenomix.search import SearchIndex, scan_search
+
+WORDS = [
+    "acute", "chronic", "type", "diabetes", "mellitus", "kidney", "disease", "heart", "failure",
+    "myocardial", "infarction", "asthma", "pulmonary", "obstructive", "hypertension", "stroke",
+    "ischemic", "atrial", "fibrillation", "depression", "anxiety", "disorder", "cancer", "breast",
+    "lung", "colorectal", "sepsis", "pneumonia", "hepatitis", "cirrhosis", "anemia", "obesity",
+    "dementia", "epilepsy", "migraine", "arthritis", "rheumatoid", "psoriasis", "lupus", "gout",
+]
+
+QUERIES = ["diabetes", "diabtes", "betes", "heart failure", "myocardal infarction", "copd", "ast", "as", "XHCOP01"]
+
+
+def synthetic_records(count, seed=0, vocabulary=5000):
+    rng = random.Random(seed)
+    # Real catalogs have a long tail of rarer words next to the common clinical ones
+    tail = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 10))) for _ in range(vocabulary)]
+    records = []
+    for i in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(1, 2))] + [rng.choice(tail) for _ in range(rng.randint(0, 3))]
+        rng.shuffle(words)
+        name = " ".join(words).title()
+        flags = "".join(c if rng.random() < 0.4 else "X" for c in "SHCOP")
+        records.append({"id": f"{flags}{i:04d}", "phenotypes": name})
+    return records
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(sizes, repeat):
+    print(f"{'size':>8} {'build ms':>9} {'query':<22} {'scan ms':>9} {'index ms':>9} {'scan hits':>10} {'index hits':>10}")
+    for size in sizes:
+        records = synthetic_records(size)
+        start = time.perf_counter()
+        index = SearchIndex.from_records(records)
+        build = time.perf_counter() - start
+        for query in QUERIES:
+            scan = best_of(lambda: scan_search(records, query), repeat)
+            indexed = best_of(lambda: index.search(query), repeat)
+            scan_hits, index_hits = len(scan_search(records, query)), len(index.search(query))
+            print(f"{size:>8} {build * 1e3:>9.1f} {query:<22} {scan * 1e3:>9.3f} {indexed * 1e3:>9.3f} "
+                  f"{scan_hits:>10} {index_hits:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 50000, 200000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,119 @@
+"""
+Startup profile of the pages: what a fresh process imports to render each one,
+and how long the first render and the next rerun take.
+
+Each page is rendered in its own `python -X importtime` subprocess, under
+streamlit's AppTest, against the synthetic graph and the stand-in clients from
+benchmarks.synthetic (so no Neo4j or OpenAI is needed). Streamlit, AppTest, the
+stand-ins and the phenomix modules they need (db, llm and the query modules,
+and with them the neo4j driver) are imported before the page runs; the import
+figures cover everything else the page pulls in.
+
+    python -m benchmarks.startup_profile [--pages chat browser] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKER = "startup_profile: page starts"
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def parse_importtime(stderr):
+    """(module, cumulative µs) for each top-level import after MARKER, slowest first."""
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1:]
+    imports = []
+    for line in lines:
+        match = _IMPORT_LINE.match(line)
+        # Nested imports are already included in their top-level parent's cumulative time
+        if match and not match.group(3):
+            imports.append((match.group(4), int(match.group(2))))
+    return sorted(imports, key=lambda item: -item[1])
+
+
+def child(args):
+    # Runs inside the profiled process: everything before MARKER is harness
+    from benchmarks.bench_pages import app
+    from benchmarks.synthetic import StandInChatClient, StandInDriver, SyntheticGraph
+    from phenomix import db, llm
+
+    graph = SyntheticGraph(args.phenotypes)
+    driver = StandInDriver(graph, latency=args.db_latency)
+    client = StandInChatClient(graph, latency=args.llm_latency)
+    db.set_driver(driver)
+    llm.set_client(client)
+    at = app(args.child, graph.sample_ids(1)[0])
+
+    print(MARKER, file=sys.stderr, flush=True)
+    timings = {}
+    for run in ("first_render", "rerun"):
+        driver.reset()
+        start = time.perf_counter()
+        at.run()
+        timings[run] = {
+            "ms": 1e3 * (time.perf_counter() - start),
+            "queries": sum(driver.queries.values()),
+            "llm_calls": sum(client.calls.values()),
+            "error": at.exception[0].message if at.exception else None,
+        }
+    print(json.dumps(timings))
+
+
+def profile(page, args):
+    command = [
+        sys.executable, "-X", "importtime", "-m", "benchmarks.startup_profile", "--child", page,
+        "--phenotypes", str(args.phenotypes), "--db-latency", str(args.db_latency),
+        "--llm-latency", str(args.llm_latency),
+    ]
+    process = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if process.returncode:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+    imports = parse_importtime(process.stderr)
+    return {
+        "import_ms": sum(us for _, us in imports) / 1e3,
+        "slowest_imports": [{"module": module, "ms": us / 1e3} for module, us in imports[:args.top]],
+        **json.loads(process.stdout.strip().splitlines()[-1]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", nargs="+", choices=["browser", "view", "chat"], default=["browser", "view", "chat"])
+    parser.add_argument("--phenotypes", type=int, default=2000)
+    parser.add_argument("--db-latency", type=float, default=0.02, help="seconds per Neo4j round trip")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per chat call")
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list per page")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    results = {}
+    for page in args.pages:
+        result = results[page] = profile(page, args)
+        first, rerun = result["first_render"], result["rerun"]
+        print(f"{page}: imports {result['import_ms']:.0f} ms, first render {first['ms']:.0f} ms "
+              f"({first['queries']} queries), rerun {rerun['ms']:.0f} ms ({rerun['queries']} queries)")
+        for error in filter(None, (first["error"], rerun["error"])):
+            print(f"  error: {error}")
+        for entry in result["slowest_imports"]:
+            print(f"  {entry['ms']:8.1f} ms  {entry['module']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"created_at": time.time(), "python": sys.version.split()[0], "pages": results}, f, indent=2)
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+An in-memory phenotype graph and offline stand-ins for the Neo4j driver and
+the OpenAI chat client, for benchmarking the pages without Aura or OpenAI.
+
+SyntheticGraph follows the schema described in the Chatbot's
+node_properties_relationships. It has phenotype nodes whose ids encode
+their sources, one detail node per source PID, and concept nodes whose
+PIDs lists and aligned list properties link them to several details.
+
+StandInDriver answers the queries the app issues (matched on the query text
+from phenomix and the pages), sleeps `latency` seconds per round trip and
+counts queries by kind. StandInChatClient answers chat.completions.create
+with canned text for each prompt the app uses, after `latency` seconds plus
+`token_latency` per streamed token.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+from phenomix.concepts import CONCEPT_PAGE_QUERY
+from phenomix.details import DETAILS_BY_PID_QUERY, PHENOTYPE_VIEW_QUERY
+from phenomix.export import EXPORT_CONCEPTS_QUERY
+from phenomix.schema_cache import PROPERTIES_QUERY
+from phenomix.sources import CONCEPT_LABELS, DETAIL_LABELS, PID_PROPERTIES, SOURCE_CODES, SOURCES
+
+WORDS = [
+    "acute", "chronic", "type", "diabetes", "asthma", "heart", "failure", "kidney", "disease", "stroke",
+    "cancer", "breast", "lung", "liver", "cirrhosis", "infection", "sepsis", "pneumonia", "anaemia", "obesity",
+    "hypertension", "arthritis", "depression", "anxiety", "dementia", "epilepsy", "migraine", "psoriasis",
+]
+
+
+def _concept_properties(source, cid, pids, rng):
+    # Scalar identity plus one list entry per linked detail, as in the real data
+    n = len(pids)
+    if source == "CPRD":
+        return {
+            "CID": cid, "PIDs": pids, "descr": f"concept {cid}", "read_code": f"{rng.randint(0, 99999):05d}",
+            "medcode": [float(rng.randint(1, 10 ** 6)) for _ in range(n)],
+            "snomedctconceptid": [float(rng.randint(1, 10 ** 9)) for _ in range(n)],
+            "disease": [f"disease {pid}" for pid in pids],
+            "category": [rng.choice(["Diagnosis", "History", "Symptom"]) for _ in range(n)],
+        }
+    if source == "Sentinel":
+        return {
+            "CID": cid, "PIDs": pids, "code": f"{rng.randint(100, 999)}.{rng.randint(0, 99)}",
+            "description": f"concept {cid}", "code_type": [rng.choice(["ICD-10-CM", "CPT-4"]) for _ in range(n)],
+            "code_category": [rng.choice(["Diagnosis", "Procedure"]) for _ in range(n)],
+            "care_setting": [rng.choice(["IP", "ED", "AV"]) for _ in range(n)],
+        }
+    if source == "OHDSI":
+        return {
+            "CID": cid, "PIDs": pids, "ConceptId": rng.randint(1, 10 ** 7), "ConceptName": f"concept {cid}",
+            "VocabularyId": [rng.choice(["SNOMED", "ICD10CM"]) for _ in range(n)],
+            "ConceptCode": [str(rng.randint(10 ** 5, 10 ** 8)) for _ in range(n)],
+        }
+    return {
+        "CID": cid, "PIDs": pids, "code": f"{rng.randint(100, 999)}.{rng.randint(0, 9)}",
+        "description": f"concept {cid}", "code_type": [rng.choice(["ICD9", "ICD10"]) for _ in range(n)],
+    }
+
+
+class SyntheticGraph:
+
+    def __init__(self, phenotypes=2000, concepts_per_detail=200, details_per_concept=3, seed=0):
+        rng = random.Random(seed)
+        self.phenotypes = []
+        self.details = {label: {} for label in DETAIL_LABELS.values()}
+        self.concepts = {label: {} for label in CONCEPT_LABELS.values()}
+        self.concept_index = {label: {} for label in DETAIL_LABELS.values()}  # detail PID -> sorted CIDs
+
+        for number in range(phenotypes):
+            sources = [source for source in SOURCES if rng.random() < 0.45] or [rng.choice(SOURCES)]
+            code = "".join(c.upper() if source in sources else "X" for c, source in zip(SOURCE_CODES, SOURCES))
+            name = " ".join(rng.sample(WORDS, rng.randint(2, 4))).capitalize() + f" {number}"
+            phenotype = {"id": f"{code}{number:04d}", "phenotypes": name}
+            for source in sources:
+                label = DETAIL_LABELS[source]
+                pids = [f"{source[:2].upper()}{number:05d}"]
+                if source == "HDRUK":
+                    pids += [f"HD{number:05d}b"] * (rng.random() < 0.3)
+                for pid in pids:
+                    self.details[label][pid] = self._detail(source, pid, name, rng)
+                phenotype[PID_PROPERTIES[source]] = pids if source == "HDRUK" else pids[0]
+            self.phenotypes.append(phenotype)
+
+        # Concepts shared between a few details of the same source
+        for source, concept_label in CONCEPT_LABELS.items():
+            detail_label = DETAIL_LABELS[source]
+            pids = sorted(self.details[detail_label])
+            if not pids:
+                continue
+            count = len(pids) * concepts_per_detail // details_per_concept
+            for number in range(count):
+                cid = f"{source[0]}C{number:07d}"
+                linked = sorted(set(rng.choice(pids) for _ in range(rng.randint(1, 2 * details_per_concept - 1))))
+                self.concepts[concept_label][cid] = _concept_properties(source, cid, linked, rng)
+                for pid in linked:
+                    self.concept_index[detail_label].setdefault(pid, []).append(cid)
+
+        self.by_id = {phenotype["id"]: phenotype for phenotype in self.phenotypes}
+        self.names = [phenotype["phenotypes"] for phenotype in self.phenotypes]
+
+    @staticmethod
+    def _detail(source, pid, name, rng):
+        detail = {"PID": pid}
+        if source == "Sentinel":
+            detail.update(outcome=name, title=f"Sentinel report on {name}", request_id=["cder_mpl1r_wp001"],
+                          description="https://www.sentinelinitiative.org/")
+        elif source == "CPRD":
+            detail.update(disease=name, disease_num=rng.randint(1, 500))
+        elif source == "HDRUK":
+            detail.update(name=name, definition=f"Definition of {name}", sex=["Female", "Male"],
+                          coding_system=["ICD10", "Read"], status=2)
+        elif source == "OHDSI":
+            detail.update(cohortName=name, cohortId=rng.randint(1, 2000), logicDescription=f"People with {name}",
+                          hashTag=["#Disease"], isReferenceCohort=False)
+        else:
+            detail.update(name=name, description=f"PheKB algorithm for {name}", type_of_phenotype="Disease",
+                          genders=["Both"], authors=["A. Author"])
+        return detail
+
+    def sample_ids(self, count, seed=0, min_sources=2):
+        rng = random.Random(seed)
+        rich = [p["id"] for p in self.phenotypes if sum(c != "X" for c in p["id"][:5]) >= min_sources]
+        return rng.sample(rich or [p["id"] for p in self.phenotypes], count)
+
+    def count(self):
+        return {
+            "phenotypes": len(self.phenotypes),
+            "details": sum(map(len, self.details.values())),
+            "concepts": sum(map(len, self.concepts.values())),
+        }
+
+
+class Record(dict):
+
+    def data(self):
+        return dict(self)
+
+
+class Summary:
+
+    def __init__(self, plan=None, query_type="r"):
+        self.plan = plan
+        self.profile = plan
+        self.query_type = query_type
+
+
+class Result:
+
+    def __init__(self, rows, summary=None):
+        self._rows = [Record(row) for row in rows]
+        self._summary = summary or Summary()
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def data(self):
+        return [row.data() for row in self._rows]
+
+    def single(self):
+        return self._rows[0] if self._rows else None
+
+    def consume(self):
+        return self._summary
+
+
+def _normalize(query):
+    return " ".join(query.split())
+
+
+class StandInDriver:
+
+    def __init__(self, graph, latency=0.0, result_rows=50):
+        self.graph = graph
+        self.latency = latency
+        self.result_rows = result_rows
+        self.queries = Counter()
+        self._lock = threading.Lock()
+        self._routes = {
+            _normalize("MATCH (p:phenotype) RETURN p"): ("browser catalog", self._catalog),
+            _normalize(PHENOTYPE_VIEW_QUERY): ("phenotype view", self._phenotype_view),
+            _normalize(DETAILS_BY_PID_QUERY): ("details by pid", self._details_by_pid),
+        }
+        for label in DETAIL_LABELS.values():
+            self._routes[_normalize(CONCEPT_PAGE_QUERY.format(label=label))] = (
+                "concept page", lambda parameters, label=label: self._concept_page(label, parameters))
+            self._routes[_normalize(PROPERTIES_QUERY.format(label=label))] = (
+                "properties", lambda parameters, label=label: self._property_keys(label))
+            self._routes[_normalize(EXPORT_CONCEPTS_QUERY.format(label=label))] = (
+                "concept export", lambda parameters, label=label: self._concept_export(label, parameters))
+
+    # Driver / session API used by the app
+
+    def session(self, **kwargs):
+        return StandInSession(self)
+
+    def close(self):
+        pass
+
+    def reset(self):
+        with self._lock:
+            self.queries.clear()
+
+    def run(self, query, parameters):
+        time.sleep(self.latency)
+        text = _normalize(getattr(query, "text", query))
+        kind, handler = self._routes.get(text, (None, None))
+        if handler is None:
+            kind, handler = self._fallback(text)
+        with self._lock:
+            self.queries[kind] += 1
+        result = handler(parameters)
+        return result if isinstance(result, Result) else Result(result)
+
+    def _fallback(self, text):
+        if text.startswith("EXPLAIN "):
+            plan = {"operatorType": "ProduceResults@neo4j", "args": {"EstimatedRows": float(self.result_rows)},
+                    "children": [{"operatorType": "NodeByLabelScan@neo4j", "args": {"EstimatedRows": 1e3}, "children": []}]}
+            return "explain", lambda parameters: Result([], Summary(plan))
+        if "RETURN p.id AS id, p.phenotypes AS name" in text:
+            return "chatbot catalog", self._chatbot_catalog
+        # Anything else is generated Cypher: a page of concept-like rows
+        return "generated cypher", self._generated
+
+    # Handlers
+
+    def _catalog(self, parameters):
+        return [{"p": dict(phenotype)} for phenotype in self.graph.phenotypes]
+
+    def _chatbot_catalog(self, parameters):
+        return [
+            {"id": p["id"], "name": p["phenotypes"], **{key: p.get(key) for key in PID_PROPERTIES.values()}}
+            for p in self.graph.phenotypes
+        ]
+
+    def _phenotype_view(self, parameters):
+        phenotype = self.graph.by_id.get(parameters["phenotype_id"])
+        if phenotype is None:
+            return []
+        sources = []
+        for source, label in DETAIL_LABELS.items():
+            value = phenotype.get(PID_PROPERTIES[source])
+            for pid in value if isinstance(value, list) else [value] if value else []:
+                sources.append({
+                    "labels": [label], "detail": self.graph.details[label][pid],
+                    "concept_count": len(self.graph.concept_index[label].get(pid, ()))
+                })
+        return [{"name": phenotype["phenotypes"], "id": phenotype["id"], "sources": sources}]
+
+    def _concept_page(self, label, parameters):
+        source = next(source for source, detail_label in DETAIL_LABELS.items() if detail_label == label)
+        concepts = self.graph.concepts.get(CONCEPT_LABELS.get(source), {})
+        pid, after = parameters["detail_pid"], parameters["after"]
+        cids = [cid for cid in self.graph.concept_index[label].get(pid, ()) if after is None or cid > after]
+        rows = []
+        for cid in cids[:parameters["limit"]]:
+            concept = concepts[cid]
+            # Server-side projection, as CONCEPT_PAGE_QUERY does it
+            index = concept["PIDs"].index(pid)
+            rows.append({"concept": {key: value[index] if isinstance(value, list) else value
+                                     for key, value in concept.items()}})
+        return rows
+
+    def _concept_export(self, label, parameters):
+        source = next(source for source, detail_label in DETAIL_LABELS.items() if detail_label == label)
+        rows = []
+        for phenotype_id in parameters["phenotype_ids"]:
+            phenotype = self.graph.by_id.get(phenotype_id)
+            value = phenotype.get(PID_PROPERTIES[source]) if phenotype else None
+            # DISTINCT p, d, c: a detail listed twice is exported once
+            for pid in dict.fromkeys(value if isinstance(value, list) else [value] if value else []):
+                for page in self._concept_page(label, {"detail_pid": pid, "after": None, "limit": None}):
+                    rows.append({"phenotype_id": phenotype_id, "phenotype": phenotype["phenotypes"], "PID": pid, **page})
+        return rows
+
+    def _details_by_pid(self, parameters):
+        rows = []
+        for label, pids in parameters["pids"].items():
+            for pid in pids:
+                if pid in self.graph.details[label]:
+                    rows.append({"label": label, "pid": pid, "d": self.graph.details[label][pid]})
+        return rows
+
+    def _property_keys(self, label):
+        keys = set()
+        for detail in self.graph.details[label].values():
+            keys.update(detail)
+        return [{"key": key} for key in sorted(keys)]
+
+    def _generated(self, parameters):
+        concepts = self.graph.concepts[CONCEPT_LABELS["CPRD"]]
+        return [{"name": concept["descr"], "CID": cid} for cid, concept in list(concepts.items())[:self.result_rows]]
+
+
+class StandInSession:
+
+    def __init__(self, driver):
+        self._driver = driver
+
+    def run(self, query, parameters=None, **kwargs):
+        return self._driver.run(query, {**(parameters or {}), **kwargs})
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class _Message:
+
+    def __init__(self, content):
+        self.content = content
+
+
+class _Choice:
+
+    def __init__(self, content):
+        self.message = _Message(content)
+        self.delta = _Message(content)
+
+
+class _Response:
+
+    def __init__(self, content):
+        self.choices = [_Choice(content)]
+
+
+class StandInChatClient:
+
+    def __init__(self, graph, latency=0.0, token_latency=0.0, mentions=3, seed=0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._names = random.Random(seed).sample(graph.names, min(mentions, len(graph.names)))
+        self.chat = self
+        self.completions = self
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def create(self, model, messages, stream=False, **kwargs):
+        system = messages[0]["content"]
+        if "cypher generation expert" in system:
+            kind, text = "cypher", "```cypher\nMATCH (c:cprd_concept) RETURN c.descr AS name, c.CID AS CID LIMIT 50\n```"
+        elif "summarization expert" in system:
+            match = re.search(r"'name': '([^']*)'", messages[-1]["content"])
+            kind = "summary"
+            text = json.dumps({"name": match.group(1) if match else "Unknown", "sentinel_summary": "Summary."})
+        else:
+            kind = "answer"
+            text = "The phenotypes defined by these codes include " + ", ".join(self._names) + "."
+        with self._lock:
+            self.calls[kind] += 1
+
+        time.sleep(self.latency)
+        if not stream:
+            return _Response(text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        for token in re.findall(r"\S+\s*", text):
+            time.sleep(self.token_latency)
+            yield _Response(token)
@@ -1,41 +1,117 @@
+import io
+import math
+import os
+import tempfile
+import zipfile
+
 import streamlit as st
-from neo4j import GraphDatabase
+
+from phenomix.catalog import Catalog
+from phenomix.code_index import DEFAULT_PATH as CODE_INDEX_PATH, CodeIndex
+from phenomix.db import get_driver
+from phenomix.export import export_concepts, neo4j_rows, snapshot_rows
+from phenomix.snapshot import get_snapshot_or_warn
+from phenomix.sources import SOURCES, TAG_COLORS, sources_of
+from phenomix.trace_panel import show_trace_panel
+from phenomix.tracing import begin
 
 # Streamlit app configuration
 st.set_page_config(page_title="Phenotype Browser", page_icon="🔍")
 
-# Initialize Neo4j driver
-@st.cache_resource
+# Queries made during this rerun
+trace = begin("Browser")
+
+PAGE_SIZES = [10, 25, 50, 100]
+
+# Largest result set the page exports itself; bigger ones go through python -m phenomix.export
+EXPORT_MAX = int(os.getenv("PHENOMIX_EXPORT_MAX_PHENOTYPES", 500))
+
+# Shared, pooled Neo4j driver
 def init_driver():
-    return GraphDatabase.driver(st.session_state.neo_uri, auth=(st.session_state.neo_user, st.session_state.neo_password))
+    return get_driver(st.session_state.neo_uri, st.session_state.neo_user, st.session_state.neo_password)
 
-driver = init_driver()
+# Local snapshot (PHENOMIX_SNAPSHOT_PATH) if configured, otherwise Neo4j
+snapshot = get_snapshot_or_warn()
+snapshot_version = snapshot.version if snapshot else None
 
-# Fetch phenotype data from the database
+# Fetch phenotype data from the database; a new snapshot file invalidates the cache
 @st.cache_data
-def fetch_phenotype_data():
+def fetch_phenotype_data(snapshot_version):
+    if snapshot is not None:
+        return snapshot.phenotypes()
+
     query = """
     MATCH (p:phenotype)
     RETURN p
     """
-    with driver.session() as session:
+    with init_driver().session() as session:
         result = session.run(query)
         data = [record["p"] for record in result]
     return data
 
-# Generate tags based on the record ID
-def get_tags(record_id):
+# Build the catalog (and its search index) once per catalog load
+@st.cache_resource
+def load_catalog(snapshot_version):
+    return Catalog(fetch_phenotype_data(snapshot_version))
+
+# Code -> concept -> phenotype index (python -m phenomix.code_index), reloaded when the file changes
+@st.cache_resource(max_entries=1)
+def load_code_index(path, mtime):
+    return CodeIndex.load(path)
+
+def search_by_code(catalog):
+    # Returns (query, catalog positions, {phenotype id: [matching concept hits]})
+    if not os.path.exists(CODE_INDEX_PATH):
+        st.info("The code index has not been built; run `python -m phenomix.code_index`.")
+        return "", [], {}
+    code_index = load_code_index(CODE_INDEX_PATH, os.path.getmtime(CODE_INDEX_PATH))
+
+    code_col, system_col = st.columns([3, 1])
+    code = code_col.text_input("Search for a code:", key="browser_code")
+    system = system_col.selectbox("Coding system:", ["Any"] + list(code_index.system_counts()), key="browser_code_system")
+    if not code.strip():
+        return "", catalog.search(""), {}
+
+    hits = code_index.lookup(code, None if system == "Any" else system)
+    matches = {}
+    for hit in hits:
+        for phenotype_id in hit["phenotype_ids"]:
+            matches.setdefault(phenotype_id, []).append(hit)
+    concepts = {(hit["label"], hit["CID"]) for hit in hits}
+    st.caption(f"{len(concepts)} concepts use this code" + (f" ({', '.join(sorted({hit['system'] for hit in hits}))})" if hits else ""))
+    return (code, system), catalog.positions_of(matches), matches
+
+def export_filtered(catalog, positions, filters):
+    # Concepts of every phenotype matching the current search and filters, as a zip of per-source CSV files
+    with st.expander(f"Export the concepts of these {len(positions)} phenotypes"):
+        if len(positions) > EXPORT_MAX:
+            st.info(f"Narrow the search to {EXPORT_MAX} phenotypes or fewer, or export them with "
+                    "`python -m phenomix.export` (same --search / --sources options).")
+            return
+        export = st.session_state.get("browser_export")
+        if st.button("Prepare CSV export", key="browser_export_prepare", disabled=not len(positions)):
+            ids = [catalog.ids[position] for position in positions]
+            rows = snapshot_rows(snapshot) if snapshot is not None else neo4j_rows(init_driver())
+            with st.spinner("Exporting concepts..."), tempfile.TemporaryDirectory() as output_dir:
+                results = export_concepts(rows, ids, output_dir, formats=["csv"])
+                archive = io.BytesIO()
+                with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+                    for result in results.values():
+                        for path in result["files"]:
+                            zf.write(path, os.path.basename(path))
+            export = st.session_state["browser_export"] = (filters, archive.getvalue(), results)
+        # Only offer the file while it still matches the search and filters
+        if export and export[0] == filters:
+            _, data, results = export
+            st.caption(", ".join(f"{source}: {result['rows']} concepts" for source, result in results.items()))
+            st.download_button("Download concepts (zip of CSV files)", data, file_name="phenomix_concepts.zip",
+                               mime="application/zip", on_click="ignore")
+
+# Generate tags from the record's precomputed source bitmask
+def get_tags(mask):
     tags = []
-    if record_id[0].lower() == 's':
-        tags.append('<span style="border-radius: 20px; padding: 4px 8px; margin-right: 4px; color: white; background-color: darkblue;">Sentinel</span>')
-    if record_id[1].lower() == 'h':
-        tags.append('<span style="border-radius: 20px; padding: 4px 8px; margin-right: 4px; color: white; background-color: teal;">HDRUK</span>')
-    if record_id[2].lower() == 'c':
-        tags.append('<span style="border-radius: 20px; padding: 4px 8px; margin-right: 4px; color: white; background-color: blue;">CPRD</span>')
-    if record_id[3].lower() == 'o':
-        tags.append('<span style="border-radius: 20px; padding: 4px 8px; margin-right: 4px; color: white; background-color: orange;">OHDSI</span>')
-    if record_id[4].lower() == 'p':
-        tags.append('<span style="border-radius: 20px; padding: 4px 8px; margin-right: 4px; color: white; background-color: green;">PheKB</span>')
+    for source in sources_of(mask):
+        tags.append(f'<span style="border-radius: 20px; padding: 4px 8px; margin-right: 4px; color: white; background-color: {TAG_COLORS[source]};">{source}</span>')
     return ' '.join(tags)
 
 def update_current_phenotype(phenotype_id):
@@ -45,26 +121,67 @@ def show():
     st.title('Phenotype Browser')
 
     # Fetch data
-    data = fetch_phenotype_data()
-
-    # Search bar
-    search_query = st.text_input("Search for a phenotype:")
-    filtered_data = [record for record in data if search_query.lower() in record['phenotypes'].lower()]
+    catalog = load_catalog(snapshot_version)
+    data = catalog.records
+
+    search_mode = st.radio("Search by:", ["Name or ID", "Code"], horizontal=True, key="browser_search_mode")
+    code_matches = {}
+    if search_mode == "Code":
+        # Exact lookup of a medical code in any coding system
+        search_query, positions, code_matches = search_by_code(catalog)
+    else:
+        # Search bar (ranked and typo-tolerant, matches names and IDs)
+        search_query = st.text_input("Search for a phenotype:")
+        positions = catalog.search(search_query)
+
+    # Source facets, counted over the current search results
+    counts = catalog.facet_counts(positions)
+    selected_sources = st.multiselect(
+        "Filter by source:", SOURCES, key="browser_sources",
+        format_func=lambda source: f"{source} ({counts[source]})"
+    )
+    match = st.radio("Match:", ["all", "any"], horizontal=True, key="browser_match",
+                     format_func=lambda option: f"In {option} selected sources")
+    positions = catalog.filter(positions, selected_sources, match)
+
+    # Pagination controls; only the visible page of results is rendered
+    page_size = st.selectbox("Results per page:", PAGE_SIZES, index=1, key="browser_page_size")
+    page_count = max(1, math.ceil(len(positions) / page_size))
+
+    # Jump back to the first page whenever the search or filters change
+    filters = (search_mode, search_query, tuple(selected_sources), match)
+    if st.session_state.get("browser_last_filters") != filters:
+        st.session_state["browser_last_filters"] = filters
+        st.session_state["browser_page"] = 1
+    st.session_state["browser_page"] = min(st.session_state.get("browser_page", 1), page_count)
+
+    page = st.number_input(f"Page (of {page_count}):", min_value=1, max_value=page_count, step=1, key="browser_page")
+    start = (page - 1) * page_size
+    page_positions = positions[start:start + page_size]
 
     # Display the number of phenotypes being shown
-    st.markdown(f"Showing {len(filtered_data)} phenotypes out of {len(data)}")
+    if len(page_positions):
+        st.markdown(f"Showing {start + 1}-{start + len(page_positions)} of {len(positions)} matching phenotypes ({len(data)} total)")
+    else:
+        st.markdown(f"Showing 0 phenotypes out of {len(data)}")
+    export_filtered(catalog, positions, filters)
     st.markdown("---")
 
-    # Display filtered data
-    for record in filtered_data:
+    # Display the current page of filtered data
+    for position in page_positions:
+        record = data[position]
         st.markdown(f"### {record['phenotypes']}")
         st.markdown(f"**ID:** {record['id']}")
-        st.markdown(get_tags(record['id']), unsafe_allow_html=True)
-        if st.button(f"Explore {record['phenotypes']} at *View Phenotype*", key=record['id']):
+        st.markdown(get_tags(catalog.masks[position]), unsafe_allow_html=True)
+        if record['id'] in code_matches:
+            st.caption("Matched concepts: " + ", ".join(
+                f"{hit['system']} {hit['code']} ({hit['label']} {hit['CID']})" for hit in code_matches[record['id']]))
+        if st.button(f"Explore {record['phenotypes']} at *View Phenotype*", key=f"explore_{record['id']}"):
             update_current_phenotype(record['id'])
         st.markdown("---") 
 
 show()
+show_trace_panel(trace)
 
 
 
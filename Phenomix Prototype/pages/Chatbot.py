@@ -1,16 +1,27 @@
 import streamlit as st
-from openai import OpenAI
+from neo4j import READ_ACCESS
+from neo4j.exceptions import ClientError
 import os
-
-from langchain.chains import GraphCypherQAChain
-from langchain_community.graphs import Neo4jGraph
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts.prompt import PromptTemplate
-
-from neo4j import GraphDatabase
+import statistics
+import time
 
 import json
 
+from phenomix.chat_catalog import CatalogCache
+from phenomix.cypher_guard import RETRIES as GUARD_RETRIES, CypherRejected, extract_cypher, guard
+from phenomix.db import MAX_DRIVERS, credentials_key, get_driver
+from phenomix.details import load_details_by_pid
+from phenomix.llm import get_client, map_concurrent, stream_text, time_first_token, with_retries
+from phenomix.llm_cache import cache_key, content_key, response_cache_from_env
+from phenomix.matcher import PhraseMatcher
+from phenomix.properties import as_list
+from phenomix.results import run_bounded
+from phenomix.schema_cache import SchemaCache, format_properties
+from phenomix.similarity import DEFAULT_PATH as SIMILARITY_PATH, SimilarityIndex
+from phenomix.sources import DETAIL_LABELS, PID_PROPERTIES, sources_of
+from phenomix.trace_panel import show_trace_panel
+from phenomix.tracing import begin
+
 node_properties_relationships = """ 
 
 PID and CID are global ID system that spans across the databasaes. Listed below are the node labels and their properties:
@@ -20,7 +31,7 @@ PID and CID are global ID system that spans across the databasaes. Listed below
             phenotype_properties: {
                 "phenotypes": name of the phenotype,
                 "sentinel_PID": associated Sentinel PID
-                "hdruk_PID": string of an array of associated HDRUK PIDs,
+                "hdruk_PID": array of associated HDRUK PIDs,
                 "cprd_PID": associated CPRD PID,
                 "ohdsi_PID": associated OHDSI PID,
                 "phekb_PID": associated PheKb PID
@@ -239,42 +250,37 @@ PID and CID are global ID system that spans across the databasaes. Listed below
 
 """
 
+# Shared, pooled Neo4j driver
 def init_driver():
-    return GraphDatabase.driver(st.session_state.neo_uri, auth=(st.session_state.neo_user, st.session_state.neo_password))
-
-def get_schema():
+    return get_driver(st.session_state.neo_uri, st.session_state.neo_user, st.session_state.neo_password)
 
-    driver = init_driver()
-    
-    with driver.session(database="neo4j") as session:
-        result = session.run("CALL apoc.meta.schema() YIELD value RETURN value").data()
+# The caches below are kept per set of credentials, so a login to another
+# database never sees (or queries through) the first one's
+def driver_key():
+    return credentials_key(st.session_state.neo_uri, st.session_state.neo_user, st.session_state.neo_password)
 
-    session.close()
-    driver.close()
+# Detail property keys are fetched once per process and reused until the TTL expires
+@st.cache_resource(max_entries=MAX_DRIVERS)
+def get_schema_cache(driver_key):
+    return SchemaCache(init_driver())
 
-    return result
+# nl_to_cypher responses, shared by all sessions on a database (PHENOMIX_LLM_CACHE_SIZE / _PATH)
+@st.cache_resource(max_entries=MAX_DRIVERS)
+def get_llm_cache(driver_key):
+    return response_cache_from_env()
 
+# pheno_desc summaries (PHENOMIX_SUMMARY_CACHE_SIZE / _PATH)
+@st.cache_resource
+def get_summary_cache():
+    return response_cache_from_env("PHENOMIX_SUMMARY_CACHE")
 
 def get_properties():
+    return get_schema_cache(driver_key()).properties()
 
-    driver = init_driver()
-    detail_arr = ["cprd_detail", "hdruk_detail", "ohdsi_detail", "phekb_detail", "sentinel_detail"]
 
-    node_property = {}
-
-    with driver.session(database="neo4j") as session:
-        for detail in detail_arr:
-
-            result = session.run(f"MATCH (n:{detail}) WITH n, keys(n) AS keys UNWIND keys AS key RETURN DISTINCT key").data()
-            node_property[detail] = result
+def nl_to_cypher(question, rejected=()):
     
-    return node_property
-
-
-def nl_to_cypher(question):
-    
-    #schema = get_schema()
-    #properties = get_properties()
+    properties = format_properties(get_properties())
 
     assistant = f""" 
 
@@ -284,6 +290,10 @@ def nl_to_cypher(question):
         
         {node_properties_relationships}
 
+        The property keys currently present on each detail label are:
+
+        {properties}
+
         Return your response in the following format: ```cypher```
 
         Note that the following warnings are common; avoid them by all means: If you're using UNION, alias the names to match. for example 
@@ -309,33 +319,63 @@ def nl_to_cypher(question):
 
     prompt = question
 
-    response = client.chat.completions.create(
+    messages = [
+        {"role": "system", "content": assistant},
+        {"role": "user", "content": prompt}
+    ]
+    # Earlier attempts the guard turned down, with its reasons, so the model can write a cheaper query
+    for previous, feedback in rejected:
+        messages.append({"role": "assistant", "content": previous})
+        messages.append({"role": "user", "content": feedback})
+
+    # Repeat questions under the same prompt/schema skip the model call entirely;
+    # a revision replaces the rejected query in the cache
+    llm_cache = get_llm_cache(driver_key())
+    key = cache_key(prompt, assistant, "gpt-4o-mini")
+    if not rejected:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    response = get_client().chat.completions.create(
         model="gpt-4o-mini",
-        messages = [
-            {"role": "system", "content": assistant},
-            {"role": "user", "content": prompt}
-        ]
+        messages = messages
     )
 
     result = response.choices[0].message.content
+    llm_cache.put(key, result)
 
     return result
 
-def cypher_to_answer(question, cypher):
-
-    cypher = cypher.strip("```")
-    schema = get_schema()
-    properties = get_properties()
-
+def run_cypher(question, cypher):
+    # EXPLAINs the query first and hands rejected or failing queries back to the
+    # model; the one that passes runs read-only, under a timeout, and its records
+    # are streamed into a bounded summary. Returns (cypher run, summary, note).
     driver = init_driver()
-    with driver.session(database="neo4j") as session:
-        cypher_result = session.run(cypher).data()
-    
+    rejected = []
+    while True:
+        with driver.session(database="neo4j", default_access_mode=READ_ACCESS) as session:
+            try:
+                query, note = guard(session, extract_cypher(cypher))
+                return cypher, run_bounded(session, query), note
+            except CypherRejected as e:
+                feedback = str(e)
+            except ClientError as e:
+                feedback = f"The query failed: {e.message}"
+        rejected.append((cypher, feedback))
+        if len(rejected) > GUARD_RETRIES:
+            raise CypherRejected(feedback)
+        cypher = nl_to_cypher(question, rejected)
+
+def cypher_to_answer(question, cypher, result, stream=False):
+
+    cypher = extract_cypher(cypher)
+    cypher_result = result.to_prompt()
 
     assistant = f""" 
     
     You are a cypher interpretation expert. The cypher, {cypher}, has been generated given a question about a phenotype database. Running
-    the cypher returns {cypher_result}. Answer the question concisely such that you are speaking to an epidemiologist using the relevant cypher results.
+    the cypher returns {cypher_result}. If the results were cut off, say that the answer is based on partial results. Answer the question concisely such that you are speaking to an epidemiologist using the relevant cypher results.
     If not necessary or explicitly requested by the question, do not return any database logistical information like id. 
     Do not include any outside information.
 
@@ -345,109 +385,82 @@ def cypher_to_answer(question, cypher):
 
     prompt = question
 
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model="gpt-4o-mini",
         messages = [
             {"role": "system", "content": assistant},
             {"role": "user", "content": prompt}
-        ]
+        ],
+        stream=stream
     )
 
+    # Streaming returns a generator of text deltas for st.write_stream
+    if stream:
+        return stream_text(response)
+
     result = response.choices[0].message.content
 
     return result
 
 
-def all_phenotype():
-    driver = init_driver()
-    query = """
-    MATCH (p:phenotype)
-    RETURN p.id AS id, p.phenotypes AS name, 
-           p.ohdsi_PID AS ohdsi_PID, 
-           p.sentinel_PID AS sentinel_PID, 
-           p.hdruk_PID AS hdruk_PID,
-           p.cprd_PID AS cprd_PID, 
-           p.phekb_PID AS phekb_PID
-    """
-    
-    with driver.session(database="neo4j") as session:
-        results = session.run(query).data()
+# The phenotype list is loaded once per process and refreshed in the background
+# (PHENOMIX_CATALOG_TTL), so reruns never wait on it after the first load
+@st.cache_resource(max_entries=MAX_DRIVERS)
+def get_catalog_cache(driver_key):
+    return CatalogCache(init_driver())
 
 
-    driver.close()
-
-    return results
+# Built once per catalog; catalog_key is (credentials, the catalog's load version)
+@st.cache_resource(max_entries=2)
+def get_name_matcher(catalog_key, _phenotypes):
+    return PhraseMatcher((index, pheno['name']) for index, pheno in enumerate(_phenotypes))
 
+def matched_phenotypes(text):
+    # Catalog entries whose names are mentioned in text, in order of mention
+    matcher = get_name_matcher((driver_key(), catalog_version), all_pheno)
+    return [all_pheno[index] for index in matcher.find_keys(text)]
 
 def find_phenotype(text):
 
     driver = init_driver()
     results = []
-    processed_ids = set()
-
-    for pheno in all_pheno:
-        if pheno['id'] not in processed_ids and pheno['name'].lower() in text.lower():
-            processed_ids.add(pheno['id'])
-            details = {
-                'sentinel_detail': [],
-                'cprd_detail': [],
-                'hdruk_detail': [],
-                'ohdsi_detail': [],
-                'phekb_detail': []
-            }
-            
-            if pheno['sentinel_PID']:
-                pid = pheno['sentinel_PID']
-                query = f"MATCH (d:sentinel_detail {{PID: '{pid}'}}) RETURN d"
-                with driver.session(database="neo4j") as session:
-                    result = session.run(query).data()
-                if result:
-                    details['sentinel_detail'].extend(result)
-
-            if pheno['cprd_PID']:
-                pid = pheno['cprd_PID']
-                query = f"MATCH (d:cprd_detail {{PID: '{pid}'}}) RETURN d"
-                with driver.session(database="neo4j") as session:
-                    result = session.run(query).data()
-                if result:
-                    details['cprd_detail'].extend(result)
-
-            if pheno['hdruk_PID']:
-                try:
-                    pids = eval(pheno['hdruk_PID'])
-                    if isinstance(pids, list):
-                        for pid in pids:
-                            query = f"MATCH (d:hdruk_detail {{PID: '{pid}'}}) RETURN d"
-                            with driver.session(database="neo4j") as session:
-                                result = session.run(query).data()
-                            if result:
-                                details['hdruk_detail'].extend(result)
-                except (SyntaxError, NameError):
-                    pass
-
-            if pheno['ohdsi_PID']:
-                pid = pheno['ohdsi_PID']
-                query = f"MATCH (d:ohdsi_detail {{PID: '{pid}'}}) RETURN d"
-                with driver.session(database="neo4j") as session:
-                    result = session.run(query).data()
-                if result:
-                    details['ohdsi_detail'].extend(result)
-
-            if pheno['phekb_PID']:
-                pid = pheno['phekb_PID']
-                query = f"MATCH (d:phekb_detail {{PID: '{pid}'}}) RETURN d"
-                with driver.session(database="neo4j") as session:
-                    result = session.run(query).data()
-                if result:
-                    details['phekb_detail'].extend(result)
-
-            results.append({
-                'name': pheno['name'],
-                'id': pheno['id'],
-                'details': details
-            })
-
-    driver.close()
+
+    matched = matched_phenotypes(text)
+
+    # Every PID of every matched phenotype, fetched in one query
+    pids_by_label = {}
+    for pheno in matched:
+        for source in sources_of(pheno['sources']):
+            pid_value = pheno[PID_PROPERTIES[source]]
+            if pid_value:
+                # hdruk_PID holds a list of PIDs (legacy nodes: a stringified list);
+                # detail PIDs are strings, as the old per-PID queries quoted them
+                pids_by_label.setdefault(DETAIL_LABELS[source], []).extend(str(pid) for pid in as_list(pid_value))
+    found = load_details_by_pid(driver, pids_by_label)
+
+    for pheno in matched:
+        details = {
+            'sentinel_detail': [],
+            'cprd_detail': [],
+            'hdruk_detail': [],
+            'ohdsi_detail': [],
+            'phekb_detail': []
+        }
+
+        for source in sources_of(pheno['sources']):
+            label = DETAIL_LABELS[source]
+            pid_value = pheno[PID_PROPERTIES[source]]
+            if not pid_value:
+                continue
+            for pid in as_list(pid_value):
+                details[label].extend({'d': detail} for detail in found.get((label, str(pid)), []))
+
+        results.append({
+            'name': pheno['name'],
+            'id': pheno['id'],
+            'details': details
+        })
+
     return results
 
 def pheno_desc(text):
@@ -472,29 +485,34 @@ def pheno_desc(text):
         If there is no detail specified for a specific database, leave the string empty. Do not return anything else but the JSON. 
     """
 
-    descs = []
-
-    for pheno in pheno_info:
+    # Summaries are memoized on the phenotype's detail content, so an unchanged
+    # phenotype is only summarized once; misses run in parallel
+    summary_cache = get_summary_cache()
 
+    def summarize(pheno):
         prompt = str(pheno)
+        key = content_key(prompt, assistant, "gpt-4o-mini")
+        cached = summary_cache.get(key)
+        if cached is not None:
+            return cached
 
-        response = client.chat.completions.create(
+        response = with_retries(lambda: get_client().chat.completions.create(
             model="gpt-4o-mini",
             messages = [
                 {"role": "system", "content": assistant},
                 {"role": "user", "content": prompt}
             ]
-        )
+        ))
 
         result = response.choices[0].message.content
-        descs.append(result)
-    
-    return descs
+        summary_cache.put(key, result)
+        return result
 
+    return map_concurrent(summarize, pheno_info)
 
-def display_desc(text):
 
-    raw_data = pheno_desc(text)
+def display_desc(raw_data):
+
     for entry in raw_data:
         data = json.loads(entry)
         name = data.get('name', 'Unknown')
@@ -512,73 +530,35 @@ def display_desc(text):
             st.markdown(f"### PheKB\n{phekb_summary}")
 
 
+# Offline-built index (python -m phenomix.similarity); reloaded when the file changes
+@st.cache_resource(max_entries=1)
+def get_similarity_index(path, mtime):
+    return SimilarityIndex.load(path)
+
 def related_pheno(text):
-    driver = init_driver()
     related_pheno = []
 
-    # Extract raw phenotype descriptions
-    raw_data = pheno_desc(text)
-    
-    # Parse the raw data and extract names
-    pheno_names = []
-    for entry in raw_data:
-        if entry.strip():  # Ensure the string is not empty
-            try:
-                data = json.loads(entry)
-                name = data.get('name', 'Unknown')
-                if name != 'Unknown':
-                    pheno_names.append(name)
-            except json.JSONDecodeError:
-                # Handle or log the error if needed
-                continue  # Skip entries that can't be parsed
-
-    # Add extracted names to related_pheno list
-    related_pheno.extend(pheno_names)
-    
-    # Store concepts related to these phenotypes
-    concepts = set()
-
-    # Query to find concepts related to these phenotypes
-    for name in pheno_names:
-        query = f"""
-        MATCH (p:phenotype)-[:HAS_CONCEPT]->(c)
-        WHERE p.name = '{name}'
-        RETURN c
-        """
-
-        with driver.session(database="neo4j") as session:
-            result = session.run(query).data()
-
-        for record in result:
-            # Ensure the record and necessary fields are present
-            if 'c' in record and 'CID' in record['c']:
-                concepts.add(record['c']['CID'])
-
-    # Find other phenotypes sharing these concepts
-    if concepts:
-        concept_ids = ', '.join(f"'{concept}'" for concept in concepts)
-
-        query = f"""
-        MATCH (p:phenotype)-[:HAS_CONCEPT]->(c)
-        WHERE c.CID IN [{concept_ids}]
-        RETURN p.name AS name, COUNT(c) AS shared_count
-        ORDER BY shared_count DESC
-        """
-
-        with driver.session(database="neo4j") as session:
-            result = session.run(query).data()
-        
-        # Add related phenotypes to the list, excluding those already in pheno_names
-        for record in result:
-            if record['name'] not in pheno_names:
-                related_pheno.append(record['name'])
+    # The mentioned phenotypes come first, then their nearest neighbours by shared concepts
+    matched = matched_phenotypes(text)
+    related_pheno.extend(pheno['name'] for pheno in matched)
+
+    path = SIMILARITY_PATH
+    if not os.path.exists(path):
+        return related_pheno
+    index = get_similarity_index(path, os.path.getmtime(path))
+
+    for _, name, _ in index.lookup([pheno['id'] for pheno in matched]):
+        if name not in related_pheno:
+            related_pheno.append(name)
     
-    driver.close()
     return related_pheno
 
 
 def display_related(text):
 
+    if not os.path.exists(SIMILARITY_PATH):
+        st.info("The phenotype similarity index has not been built; run `python -m phenomix.similarity`.")
+
     related = related_pheno(text)
 
     box_style = """
@@ -611,6 +591,37 @@ def show():
     cypher_switch = st.checkbox("Cypher")
     desc_switch = st.checkbox("Relevant Phenotype Description")
     related_switch = st.checkbox("Related Phenotypes")
+    stream_switch = st.checkbox("Stream answer", value=True)
+
+    # Explicit schema refresh, from the sidebar or by typing /refresh-schema
+    schema_cache = get_schema_cache(driver_key())
+    if st.sidebar.button("Refresh schema cache"):
+        schema_cache.refresh()
+    if schema_cache.loaded_at is not None:
+        st.sidebar.caption(f"Schema cached {time.monotonic() - schema_cache.loaded_at:.0f}s ago (TTL {schema_cache.ttl:.0f}s)")
+
+    catalog_cache = get_catalog_cache(driver_key())
+    if catalog_cache.loaded_at is not None:
+        st.sidebar.caption(f"Phenotype catalog: {len(all_pheno)} phenotypes, loaded {time.monotonic() - catalog_cache.loaded_at:.0f}s ago (TTL {catalog_cache.ttl:.0f}s)")
+
+    llm_stats = get_llm_cache(driver_key()).stats()
+    st.sidebar.caption(f"Cypher cache: {llm_stats['hits']} hits, {llm_stats['misses']} misses, {llm_stats['entries']} entries")
+
+    # Time from question to the first answer token, for this session
+    if "ttft" not in st.session_state:
+        st.session_state["ttft"] = []
+    ttft_metric = st.sidebar.empty()
+
+    def show_ttft():
+        ttft = st.session_state["ttft"]
+        if ttft:
+            ttft_metric.metric("Time to first token", f"{ttft[-1]:.2f}s", help=f"Median {statistics.median(ttft):.2f}s over {len(ttft)} answers")
+
+    def record_ttft(seconds):
+        st.session_state["ttft"].append(seconds)
+        show_ttft()
+
+    show_ttft()
 
     if "messages" not in st.session_state:
         st.session_state["messages"] = [{"role": "assistant", "content": "How can I help you?"}]
@@ -618,44 +629,66 @@ def show():
     for msg in st.session_state.messages:
         st.chat_message(msg["role"]).write(msg["content"])
 
-    if prompt := st.chat_input("Ask a question about the database"):
+    prompt = st.chat_input("Ask a question about the database")
+    if prompt and prompt.strip() == "/refresh-schema":
+        schema_cache.refresh()
+        st.chat_message("assistant").write("Schema cache refreshed.")
+    elif prompt:
         st.session_state.messages.append({"role": "user", "content": prompt})
         st.chat_message("user").write(prompt)
 
-        #try:
-
-        cypher = nl_to_cypher(prompt)
+        with st.chat_message("assistant"):
+            started = time.perf_counter()
 
-        if cypher_switch:
-            st.write("**Cypher:**\n")
-            st.write(f"{cypher}\n\n")
+            # The Cypher is shown as soon as it is generated, before it runs
+            cypher = nl_to_cypher(prompt)
 
-        answer = cypher_to_answer(prompt, cypher)
-        st.write("**Answer:**\n")
-        st.write(f"{answer}\n\n")
+            if cypher_switch:
+                st.write("**Cypher:**\n")
+                st.write(f"{cypher}\n\n")
 
-        #except Exception as e:
-        #  msg = f"An error occurred: {str(e)}"
-        
-        st.session_state.messages.append({"role": "assistant", "content": msg})
-        with st.chat_message("assistant"):
-            st.write(msg)
-
-            if desc_switch:
-                st.write("**Relevant Phenotype Descriptions:**\n")
-                display_desc(answer)
-            
-            if related_switch:
-                st.write("**Related phenotypes:**\n")
-                display_related(answer)
+            try:
+                executed, result, note = run_cypher(prompt, cypher)
+            except CypherRejected as e:
+                answer = f"I could not write a query that is safe to run for this question. {e}"
+                st.error(answer)
+            else:
+                if executed != cypher:
+                    st.caption("The first query was rejected by the cost guard and revised.")
+                    if cypher_switch:
+                        st.write("**Revised Cypher:**\n")
+                        st.write(f"{executed}\n\n")
+                if note:
+                    st.caption(note)
+                if result.truncated:
+                    st.caption(f"Query result truncated: {result.describe()}")
+
+                st.write("**Answer:**\n")
+                if stream_switch:
+                    chunks = cypher_to_answer(prompt, executed, result, stream=True)
+                    answer = st.write_stream(time_first_token(chunks, started, record_ttft))
+                else:
+                    answer = cypher_to_answer(prompt, executed, result)
+                    record_ttft(time.perf_counter() - started)
+                    st.write(f"{answer}\n\n")
+
+                if desc_switch:
+                    st.write("**Relevant Phenotype Descriptions:**\n")
+                    display_desc(pheno_desc(answer))
+                
+                if related_switch:
+                    st.write("**Related phenotypes:**\n")
+                    display_related(answer)
+
+        st.session_state.messages.append({"role": "assistant", "content": answer})
 
 st.set_page_config(page_title="Chatbot", page_icon="🤖")
 st.title('Chatbot')
 
-# Initialize the OpenAI client
-api_key = os.getenv('OPENAI_API_KEY2')
-client = OpenAI(api_key = api_key)
+# Queries and chat calls made during this rerun
+trace = begin("Chatbot")
 
-# Initialize phenotype IDs
-all_pheno = all_phenotype()
+# Phenotype IDs and names, from the process-wide catalog
+catalog_version, all_pheno = get_catalog_cache(driver_key()).versioned()
 show()
+show_trace_panel(trace)
@@ -1,29 +1,40 @@
 import streamlit as st
-from neo4j import GraphDatabase
-from ast import literal_eval
+import math
 import re
-import pandas as pd
 
+from phenomix.concepts import concepts_frame, fetch_concepts_page
+from phenomix.db import get_driver
+from phenomix.details import load_phenotype_view
+from phenomix.properties import legacy_value
+from phenomix.snapshot import get_snapshot_or_warn
+from phenomix.sources import DETAIL_LABELS, source_mask, sources_of
+from phenomix.trace_panel import show_trace_panel
+from phenomix.tracing import begin
 
-# Initialize Neo4j driver
-@st.cache_resource
+CONCEPT_PAGE_SIZES = [100, 500, 1000]
+
+# Queries made during this rerun
+trace = begin("View Phenotype")
+
+
+# Shared, pooled Neo4j driver
 def init_driver():
-    return GraphDatabase.driver(st.session_state.neo_uri, auth=(st.session_state.neo_user, st.session_state.neo_password))
+    return get_driver(st.session_state.neo_uri, st.session_state.neo_user, st.session_state.neo_password)
 
-driver = init_driver()
+# Local snapshot (PHENOMIX_SNAPSHOT_PATH) if configured, otherwise Neo4j
+snapshot = get_snapshot_or_warn()
 
-def fetch_pheno_main_data(driver, phenotype_id):
-    query = """
-    MATCH (p:phenotype {id: $phenotype_id})
-    RETURN p.phenotypes AS name, p.id AS id
-    """
-    with driver.session() as session:
-        result = session.run(query, phenotype_id=phenotype_id)
-        return result.single()
+# Neo4j round trips made while rendering the current view
+st.session_state["view_round_trips"] = 0
 
-def header(phenotype_id):
-    main_data = fetch_pheno_main_data(driver, phenotype_id)
+def fetch_pheno_view(phenotype_id):
+    if snapshot is not None:
+        return snapshot.load_phenotype_view(phenotype_id)
+    # Header, details and concept counts for every source in one query
+    st.session_state["view_round_trips"] += 1
+    return load_phenotype_view(init_driver(), phenotype_id)
 
+def header(main_data):
     st.markdown(f""" 
         <h1>{main_data["name"]}</h1>
     """)
@@ -44,22 +55,9 @@ def render_hyperlink(text):
         return f'<a href="{link}" target="_blank">{name}</a>'
     return text
 
-def display_detail(record_id, tab_name, pid_property):
-    # Define the query to find the detail node
-    query = f"""
-    MATCH (p:phenotype {{id: $phenotype_id}})
-    OPTIONAL MATCH (d:{tab_name.lower()}_detail)
-    WHERE d.PID = p.{pid_property}
-    RETURN d
-    """
-
-    with driver.session() as session:
-        result = session.run(query, phenotype_id=record_id)
-        detail_node = result.single()
-
-    if detail_node and detail_node["d"]:
+def display_detail(detail_data, tab_name):
+    if detail_data:
         # Parse and display the detail node properties
-        detail_data = dict(detail_node["d"].items())
         for key, value in detail_data.items():
             # Prepare the key display
             key_display = f"<span style='font-size: 0.8em; font-weight: bold; text-transform: uppercase;'>{key.capitalize()}</span><br>"
@@ -67,16 +65,8 @@ def display_detail(record_id, tab_name, pid_property):
             # Initialize the value display
             value_display = ""
 
-            # Check if the value is a list in a string form
-            if isinstance(value, str):
-                try:
-                    # Attempt to parse the string as a list
-                    parsed_value = literal_eval(value)
-                    if isinstance(parsed_value, list):
-                        value = parsed_value
-                except (ValueError, SyntaxError):
-                    # If parsing fails, keep the original value as a string
-                    pass
+            # Lists are native once migrated; legacy "[...]" strings are still parsed
+            value = legacy_value(value)
 
             if isinstance(value, list):
                 # Strip any leading/trailing quotes from each element and create tags
@@ -93,111 +83,92 @@ def display_detail(record_id, tab_name, pid_property):
     else:
         st.write(f"No detailed data available for {tab_name}.")
 
-def display_concepts():
-    return
-
-# Define the function to get concepts related to the detail node
-def get_concepts(record_id, tab_name, pid_property):
-    query = f"""
-    MATCH (p:phenotype {{id: $phenotype_id}})
-    OPTIONAL MATCH (d:{tab_name.lower()}_detail)-[:HAS_CONCEPT]->(c)
-    WHERE d.PID = p.{pid_property}
-    RETURN d.PID AS detail_pid, c
-    """
-    with driver.session() as session:
-        result = session.run(query, phenotype_id=record_id)
-
-        detail_PID = ""
-
-        concepts = []
-        for record in result:
-            detail_pid = record["detail_pid"]
-            concept_node = record["c"]
-            if concept_node:
-                # Convert Node object to a dictionary
-                concept = dict(concept_node)
-                # Iterate over all properties in the concept
-                for key, value in concept.items():
-                    if isinstance(value, str):
-                        try:
-                            # Try to evaluate the string as a literal expression
-                            evaluated_value = literal_eval(value)
-                            concept[key] = evaluated_value
-                        except (ValueError, SyntaxError):
-                            # If evaluation fails, keep the original string
-                            pass
-                
-                # Handle PIDs and retain array properties based on PIDs
-                if "PIDs" in concept and isinstance(concept["PIDs"], list):
-                    try:
-                        index = concept["PIDs"].index(detail_pid)
-                        for key, value in concept.items():
-                            if isinstance(value, list) and len(value) > index:
-                                concept[key] = value[index]
-                    except ValueError:
-                        # detail_pid not found in PIDs list, handle accordingly
-                        pass
-                concepts.append(concept)
-
-    df_concepts = pd.DataFrame(concepts)
-
-    df_concepts = df_concepts.style.format({
-        col: lambda x: f"{x:.0f}" for col in df_concepts.select_dtypes(include=['float', 'int']).columns
-    })
-    
-    return df_concepts
-
-def tabs(record_id):
-    tab_names = []
-    pid_properties = {
-        "Sentinel": "sentinel_PID",
-        "HDRUK": "hdruk_PID",
-        "CPRD": "cprd_PID",
-        "OHDSI": "ohdsi_PID",
-        "PheKB": "phekb_PID"
-    }
-
+# Fetch and build one page of a detail's concepts
+def get_concepts(tab_name, detail_pid, after=None, limit=CONCEPT_PAGE_SIZES[0]):
+    if snapshot is not None:
+        concepts = snapshot.fetch_concepts_page(DETAIL_LABELS[tab_name], detail_pid, after, limit)
+    else:
+        st.session_state["view_round_trips"] += 1
+        concepts = fetch_concepts_page(init_driver(), DETAIL_LABELS[tab_name], detail_pid, after, limit)
+    last_cid = concepts[-1].get("CID") if concepts else None
+    return concepts_frame(concepts, detail_pid), last_cid
+
+def display_concepts(tab_name, entry):
+    detail_pid = entry["detail"].get("PID")
+    concept_count = entry["concept_count"]
+    if not concept_count:
+        st.write(f"No concepts available for {tab_name}.")
+        return
+
+    # Nothing is fetched until the user asks for this detail's concepts
+    if not st.toggle(f"Load {concept_count} concepts", key=f"concepts_{detail_pid}"):
+        return
+
+    # CID cursor for each page visited so far; the last one is the current page
+    cursor_key = f"concept_cursors_{detail_pid}"
+    page_size = st.selectbox("Concepts per page:", CONCEPT_PAGE_SIZES, key=f"concept_page_size_{detail_pid}",
+                             on_change=lambda: st.session_state.pop(cursor_key, None))
+    cursors = st.session_state.setdefault(cursor_key, [None])
+
+    df_concepts, last_cid = get_concepts(tab_name, detail_pid, cursors[-1], page_size)
+    st.dataframe(df_concepts, hide_index=True)
+
+    previous_col, page_col, next_col = st.columns([1, 2, 1])
+    page_col.caption(f"Page {len(cursors)} of {math.ceil(concept_count / page_size)}")
+    if previous_col.button("Previous", key=f"concepts_prev_{detail_pid}", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if next_col.button("Next", key=f"concepts_next_{detail_pid}",
+                       disabled=len(cursors) * page_size >= concept_count or last_cid is None):
+        cursors.append(last_cid)
+        st.rerun()
+
+def tabs(view):
     # Determine which tabs to display based on the record ID
-    if record_id[0].lower() == 's':
-        tab_names.append("Sentinel")
-    if record_id[1].lower() == 'h':
-        tab_names.append("HDRUK")
-    if record_id[2].lower() == 'c':
-        tab_names.append("CPRD")
-    if record_id[3].lower() == 'o':
-        tab_names.append("OHDSI")
-    if record_id[4].lower() == 'p':
-        tab_names.append("PheKB")
+    tab_names = sources_of(source_mask(view["id"]))
 
     if tab_names:
         selected_tab = st.tabs(tab_names)
         for i, tab_name in enumerate(tab_names):
             with selected_tab[i]:
-                pid_property = pid_properties[tab_name]
+                entries = view["sources"].get(tab_name, [])
                 with st.expander(f"## {tab_name} Details"):
-                    display_detail(record_id, tab_name, pid_property)
+                    if not entries:
+                        display_detail(None, tab_name)
+                    for entry in entries:
+                        display_detail(entry["detail"], tab_name)
                 with st.expander(f"## {tab_name} Concepts"):
-                    st.dataframe(get_concepts(record_id, tab_name, pid_property))
+                    if not entries:
+                        st.write(f"No concepts available for {tab_name}.")
+                    for entry in entries:
+                        display_concepts(tab_name, entry)
     else:
         st.write("No specific data available for this phenotype ID.")
         
 
 
 def show(phenotype_id):
-    phenotype_data = fetch_pheno_main_data(driver, phenotype_id)
+    phenotype_data = fetch_pheno_view(phenotype_id)
 
     if phenotype_data:
         st.markdown(f"# {phenotype_data['name']}")
         st.markdown(f"#### PID (Phenotype ID): {phenotype_data['id']}")
 
-        tabs(phenotype_id)
+        tabs(phenotype_data)
     else:
         st.error("No data found for the given phenotype ID.")
 
+    if snapshot is not None:
+        st.sidebar.caption("Served from the local snapshot")
+    else:
+        st.sidebar.metric("Neo4j round trips (this view)", st.session_state["view_round_trips"])
+
 # Fetch phenotype_id from query parameters
 current_phenotype = st.session_state["current_pheno"]
 
 if current_phenotype:
     show(current_phenotype)
 else:
-    st.error("No phenotype ID provided.")
\ No newline at end of file
+    st.error("No phenotype ID provided.")
+
+show_trace_panel(trace)
\ No newline at end of file
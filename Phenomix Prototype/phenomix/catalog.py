@@ -0,0 +1,63 @@
+"""
+The phenotype catalog as loaded by the Browser, with everything derived from it
+(search index, source bitmasks, ...) computed once per load rather than on
+every rerun.
+
+The ranked positions of the last PHENOMIX_SEARCH_CACHE_SIZE (default 16)
+searches are kept too, keyed on the normalized query, so reruns of the same
+search (paging, filtering) do not rank the results again.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from phenomix.search import SearchIndex, normalize
+from phenomix.sources import facet_counts, facet_filter, source_masks
+
+SEARCH_CACHE_SIZE = int(os.getenv("PHENOMIX_SEARCH_CACHE_SIZE", 16))
+
+
+class Catalog:
+
+    def __init__(self, records):
+        self.records = list(records)
+        self.ids = [record["id"] for record in self.records]
+        self.index = SearchIndex.from_records(self.records)
+        self.masks = source_masks(self.ids)
+        self.position_by_id = {record_id: position for position, record_id in enumerate(self.ids)}
+        self._searches = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def search(self, query, limit=None):
+        # Positions into self.records, best match first, as a read-only array shared between reruns
+        key = normalize(query)
+        with self._lock:
+            positions = self._searches.get(key)
+            if positions is not None:
+                self._searches.move_to_end(key)
+        if positions is None:
+            positions = np.asarray(self.index.search(key), dtype=np.intp)
+            positions.flags.writeable = False
+            with self._lock:
+                self._searches[key] = positions
+                while len(self._searches) > SEARCH_CACHE_SIZE:
+                    self._searches.popitem(last=False)
+        return positions[:limit] if limit else positions
+
+    def positions_of(self, record_ids):
+        # Catalog positions of the given IDs, in catalog order; unknown IDs are skipped
+        return sorted(self.position_by_id[record_id] for record_id in set(record_ids) if record_id in self.position_by_id)
+
+    def filter(self, positions, sources, match="all"):
+        positions = np.asarray(positions, dtype=np.intp)
+        if not sources:
+            return positions
+        return positions[facet_filter(self.masks[positions], sources, match)]
+
+    def facet_counts(self, positions):
+        return facet_counts(self.masks[np.asarray(positions, dtype=np.intp)])
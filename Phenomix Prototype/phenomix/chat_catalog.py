@@ -0,0 +1,98 @@
+"""
+Process-wide copy of the phenotype list the Chatbot matches answers against.
+
+The first caller loads it; after PHENOMIX_CATALOG_TTL seconds (default 3600)
+callers keep getting the loaded copy while one background thread fetches a
+new one, so no rerun waits on the catalog query once it has been loaded.
+"""
+import os
+import threading
+import time
+
+from phenomix.sources import source_mask
+
+DEFAULT_TTL = float(os.getenv("PHENOMIX_CATALOG_TTL", 3600))
+
+CHAT_CATALOG_QUERY = """
+MATCH (p:phenotype)
+RETURN p.id AS id, p.phenotypes AS name,
+       p.ohdsi_PID AS ohdsi_PID,
+       p.sentinel_PID AS sentinel_PID,
+       p.hdruk_PID AS hdruk_PID,
+       p.cprd_PID AS cprd_PID,
+       p.phekb_PID AS phekb_PID
+"""
+
+
+def fetch_chat_catalog(driver, database="neo4j"):
+    with driver.session(database=database) as session:
+        results = session.run(CHAT_CATALOG_QUERY).data()
+
+    # Decode each phenotype's sources once, up front
+    for pheno in results:
+        pheno['sources'] = source_mask(pheno['id'])
+
+    return results
+
+
+class CatalogCache:
+
+    def __init__(self, driver, ttl=DEFAULT_TTL, database="neo4j"):
+        self.driver = driver
+        self.ttl = ttl
+        self.database = database
+        self.loaded_at = None
+        # Bumped on every load, so anything derived from the catalog can key on it
+        self.version = 0
+        self.error = None
+        self._value = None
+        self._lock = threading.Lock()
+        self._first_load = threading.Lock()
+        self._refreshing = False
+
+    @property
+    def stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    def _load(self):
+        value = fetch_chat_catalog(self.driver, self.database)
+        with self._lock:
+            self._value = value
+            self.loaded_at = time.monotonic()
+            self.version += 1
+            self.error = None
+
+    def _refresh_in_background(self):
+        try:
+            self._load()
+        except Exception as e:
+            # Keep serving the loaded copy; the next stale read tries again
+            self.error = e
+        finally:
+            self._refreshing = False
+
+    def refresh(self, wait=False):
+        """Reloads the catalog, in the background unless wait is set."""
+        if wait:
+            self._load()
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, name="catalog-refresh", daemon=True).start()
+
+    def versioned(self):
+        """(version, phenotypes), read together so derived structures can be keyed on the version."""
+        if self._value is None:
+            # Nothing to serve yet; concurrent first callers share one load
+            with self._first_load:
+                if self._value is None:
+                    self._load()
+        elif self.stale:
+            self.refresh()
+        with self._lock:
+            return self.version, self._value
+
+    def get(self):
+        return self.versioned()[1]
@@ -0,0 +1,58 @@
+"""
+Shared plumbing for the command line tools (migration, loaders, exports):
+connection arguments, keyset-paginated reads and JSON checkpoints for
+restartable batch jobs.
+"""
+import json
+import os
+
+from neo4j import GraphDatabase
+
+
+def add_connection_arguments(parser):
+    parser.add_argument("--uri", default=os.getenv("NEO4J_URI"), help="Neo4j URI (default: $NEO4J_URI)")
+    parser.add_argument("--user", default=os.getenv("NEO4J_USER", "neo4j"), help="Neo4j user (default: $NEO4J_USER)")
+    parser.add_argument("--password", default=os.getenv("NEO4J_PASSWORD"), help="Neo4j password (default: $NEO4J_PASSWORD)")
+    parser.add_argument("--database", default=os.getenv("NEO4J_DATABASE", "neo4j"), help="Neo4j database")
+
+
+def connect(parser, args):
+    if not args.uri or not args.password:
+        parser.error("a Neo4j --uri and --password are required (or set NEO4J_URI / NEO4J_PASSWORD)")
+    return GraphDatabase.driver(args.uri, auth=(args.user, args.password))
+
+
+def keyset_batches(session, query, batch_size, **parameters):
+    """
+    Runs query page by page, yielding each non-empty batch of records (as dicts).
+    The query takes $after and $limit and returns rows ordered by a "key" column.
+    """
+    after = None
+    while True:
+        batch = session.run(query, after=after, limit=batch_size, **parameters).data()
+        if not batch:
+            return
+        yield batch
+        after = batch[-1]["key"]
+
+
+class Checkpoint:
+    # Progress of a batch job, persisted after every batch so a rerun resumes
+
+    def __init__(self, path, reset=False):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path) and not reset:
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def get(self, step):
+        return self.state.get(step, {})
+
+    def update(self, step, **values):
+        self.state.setdefault(step, {}).update(values)
+        if self.path:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.state, f, indent=2, default=str)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,242 @@
+"""
+Reverse index from medical codes to the concepts and phenotypes that use them.
+
+Codes are read from every concept label that carries them:
+
+    sentinel_concept  code (system from code_type)
+    cprd_concept      read_code (READ), medcode (MEDCODE), snomedctconceptid (SNOMED)
+    ohdsi_concept     ConceptCode (system from VocabularyId), ConceptId (OMOP)
+
+and normalized into (system, code) pairs. Systems are upper-cased with
+punctuation removed ("ICD-10-CM" -> "ICD10CM"). Codes are stripped and
+upper-cased. Whole-number floats lose their ".0" (medcode 1234.0 -> "1234"),
+as do integer IDs stored as text in the MEDCODE, SNOMED and OMOP systems.
+Other text codes keep every digit; ICD codes only lose their dots ("E11.9" ->
+"E119", and "250.00" -> "25000" stays distinct from "250.0" -> "2500").
+Lists stored as strings are parsed (phenomix.properties.as_list). List properties aligned with a
+concept's PIDs tie each code to the detail at the same position. Each code is
+linked to its concepts (label, CID) and, through the details' PIDs on the
+phenotype nodes, to phenotype IDs.
+
+The index is written to PHENOMIX_CODE_INDEX_PATH (default code_index.json),
+which the Browser's "search by code" mode loads. It can be built from Neo4j
+or from a local snapshot (phenomix.snapshot):
+
+    python -m phenomix.code_index --uri neo4j+s://... --password ... [--output code_index.json]
+    python -m phenomix.code_index --snapshot phenomix.sqlite
+"""
+import argparse
+import json
+import math
+import os
+import re
+import time
+from collections import defaultdict
+
+from phenomix.cli import add_connection_arguments, connect, keyset_batches
+from phenomix.properties import as_list
+from phenomix.sources import CONCEPT_LABELS, DETAIL_LABELS, PID_PROPERTIES
+
+DEFAULT_PATH = os.getenv("PHENOMIX_CODE_INDEX_PATH", "code_index.json")
+
+# concept label -> [(code property, property naming its system, fixed system)]
+CODE_PROPERTIES = {
+    "sentinel_concept": [("code", "code_type", None)],
+    "cprd_concept": [("read_code", None, "READ"), ("medcode", None, "MEDCODE"), ("snomedctconceptid", None, "SNOMED")],
+    "ohdsi_concept": [("ConceptCode", "VocabularyId", None), ("ConceptId", None, "OMOP")],
+}
+
+# Systems whose codes are integer IDs, so "1234.0" is an export artefact of 1234
+NUMERIC_SYSTEMS = {"MEDCODE", "SNOMED", "OMOP"}
+
+SYSTEM_ALIASES = {"SNOMEDCT": "SNOMED", "SNOMEDCTUS": "SNOMED", "READV2": "READ", "READCODE": "READ"}
+
+PHENOTYPE_PIDS_BATCH = """
+MATCH (p:phenotype)
+WHERE p.id IS NOT NULL AND ($after IS NULL OR p.id > $after)
+RETURN p.id AS key, p {{.id, {pids}}} AS props
+ORDER BY key
+LIMIT $limit
+"""
+
+CONCEPT_CODES_BATCH = """
+MATCH (c:`{label}`)
+WHERE c.CID IS NOT NULL AND ($after IS NULL OR c.CID > $after)
+RETURN c.CID AS key, c {{.CID, .PIDs, {properties}}} AS props
+ORDER BY key
+LIMIT $limit
+"""
+
+_PUNCTUATION = re.compile(r"[^0-9A-Z]")
+_WHOLE_FLOAT = re.compile(r"^-?\d+\.0*$")
+
+
+def normalize_system(system):
+    if system is None:
+        return None
+    name = _PUNCTUATION.sub("", str(system).upper())
+    return SYSTEM_ALIASES.get(name, name) or None
+
+
+def normalize_code(code, system=None):
+    """The code as stored in the index, or None for an empty / NaN value."""
+    if code is None or isinstance(code, bool):
+        return None
+    if isinstance(code, float):
+        if math.isnan(code):
+            return None
+        if code.is_integer():
+            code = int(code)
+    text = str(code).strip().upper()
+    if text in ("", "NAN", "NONE"):
+        return None
+    if system in NUMERIC_SYSTEMS and _WHOLE_FLOAT.match(text):
+        text = text.split(".")[0]
+    if system and system.startswith("ICD"):
+        text = text.replace(".", "")
+    return text
+
+
+def _per_pid(value, count):
+    # One list of values per PID: lists as long as PIDs are aligned with them,
+    # anything else applies to every PID
+    values = as_list(value)
+    if count and len(values) == count:
+        return [[item] for item in values]
+    return [values] * max(count, 1)
+
+
+def concept_codes(label, props):
+    """(detail PID or None, system, code) for every code on one concept node."""
+    pids = [str(pid) for pid in as_list(props.get("PIDs"))]
+    for code_property, system_property, system in CODE_PROPERTIES.get(label, ()):
+        codes = _per_pid(props.get(code_property), len(pids))
+        systems = _per_pid(props.get(system_property), len(pids)) if system_property else [[system]] * len(codes)
+        for index, (codes_at, systems_at) in enumerate(zip(codes, systems)):
+            pid = pids[index] if pids else None
+            for code_system in dict.fromkeys(map(normalize_system, systems_at)):
+                if code_system is None:
+                    continue
+                for code in codes_at:
+                    normalized = normalize_code(code, code_system)
+                    if normalized is not None:
+                        yield pid, code_system, normalized
+
+
+def build_code_index(phenotypes, concepts):
+    """
+    phenotypes: iterable of phenotype property dicts (id and *_PID);
+    concepts: iterable of (concept label, property dict).
+    """
+    detail_phenotypes = defaultdict(set)
+    for props in phenotypes:
+        for source, pid_property in PID_PROPERTIES.items():
+            for pid in as_list(props.get(pid_property)):
+                detail_phenotypes[(DETAIL_LABELS[source], str(pid))].add(props["id"])
+
+    detail_labels = {label: DETAIL_LABELS[source] for source, label in CONCEPT_LABELS.items()}
+    entries = defaultdict(lambda: defaultdict(set))
+    for label, props in concepts:
+        for pid, system, code in concept_codes(label, props):
+            phenotype_ids = entries[(system, code)][(label, props["CID"])]
+            if pid is not None:
+                phenotype_ids.update(detail_phenotypes.get((detail_labels[label], pid), ()))
+
+    systems = defaultdict(dict)
+    for (system, code), concepts_by_key in entries.items():
+        systems[system][code] = [
+            [label, cid, sorted(phenotype_ids)] for (label, cid), phenotype_ids in sorted(concepts_by_key.items())
+        ]
+    return CodeIndex(dict(systems))
+
+
+def fetch_phenotypes(session, batch_size=2000):
+    query = PHENOTYPE_PIDS_BATCH.format(pids=", ".join(f".{p}" for p in PID_PROPERTIES.values()))
+    for batch in keyset_batches(session, query, batch_size):
+        for record in batch:
+            yield record["props"]
+
+
+def fetch_concepts(session, batch_size=2000):
+    # Only the properties the index reads
+    for label, fields in CODE_PROPERTIES.items():
+        properties = dict.fromkeys(p for field in fields for p in field[:2] if p)
+        query = CONCEPT_CODES_BATCH.format(label=label, properties=", ".join(f".`{p}`" for p in properties))
+        for batch in keyset_batches(session, query, batch_size):
+            for record in batch:
+                yield label, record["props"]
+
+
+class CodeIndex:
+
+    def __init__(self, systems):
+        self.systems = systems    # {system: {code: [[concept label, CID, [phenotype ids]], ...]}}
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["systems"])
+
+    def save(self, path, **metadata):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({**metadata, "systems": self.systems}, f)
+        os.replace(tmp_path, path)
+
+    def system_counts(self):
+        return {system: len(codes) for system, codes in sorted(self.systems.items())}
+
+    def lookup(self, code, system=None):
+        """
+        Concepts using code, in one system or (system None) any of them:
+        [{"system", "code", "label", "CID", "phenotype_ids"}], ordered by system, label and CID.
+        """
+        systems = [normalize_system(system)] if system else sorted(self.systems)
+        hits = []
+        for name in systems:
+            normalized = normalize_code(code, name)
+            for label, cid, phenotype_ids in self.systems.get(name, {}).get(normalized, ()):
+                hits.append({"system": name, "code": normalized, "label": label, "CID": cid,
+                             "phenotype_ids": phenotype_ids})
+        return hits
+
+    def phenotype_ids(self, code, system=None):
+        """IDs of the phenotypes using code, sorted."""
+        return sorted({phenotype_id for hit in self.lookup(code, system) for phenotype_id in hit["phenotype_ids"]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_connection_arguments(parser)
+    parser.add_argument("--snapshot", help="build from this snapshot file instead of Neo4j")
+    parser.add_argument("--output", default=DEFAULT_PATH, help="index file (default: $PHENOMIX_CODE_INDEX_PATH)")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.snapshot:
+        from phenomix.snapshot import Snapshot
+        snapshot = Snapshot(args.snapshot)
+        concepts = ((label, props) for label in CODE_PROPERTIES for props in snapshot.concepts(label))
+        index = build_code_index(snapshot.phenotypes(), concepts)
+        source = args.snapshot
+    else:
+        driver = connect(parser, args)
+        try:
+            with driver.session(database=args.database) as session:
+                phenotypes = list(fetch_phenotypes(session, args.batch_size))
+                index = build_code_index(phenotypes, fetch_concepts(session, args.batch_size))
+        finally:
+            driver.close()
+        source = args.uri
+
+    index.save(args.output, built_at=time.time(), source=source)
+    counts = index.system_counts()
+    print(f"indexed {sum(counts.values())} codes in {time.perf_counter() - start:.1f}s -> {args.output}")
+    for system, count in counts.items():
+        print(f"  {system:<12} {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Concept tables for the View Phenotype page.
+
+A concept node can be shared by several detail nodes: its "PIDs" list names
+them, and the other list properties hold one entry per PID. Projecting a
+concept onto one detail means picking element `PIDs.index(detail_pid)` of
+every such list. CONCEPT_PAGE_QUERY does that in Cypher for one page of
+concepts; `project_concepts` does it for nodes whose lists are still stored as
+strings, with a columnar pandas/NumPy pass instead of a Python loop per concept
+and property.
+"""
+from itertools import chain, repeat
+
+import numpy as np
+import pandas as pd
+
+from phenomix.properties import legacy_value
+
+# One page of a detail's concepts in CID order (keyset pagination on $after),
+# with list properties projected onto the detail server-side. Nodes whose lists
+# are not yet migrated come back whole and are handled by project_concepts.
+CONCEPT_PAGE_QUERY = """
+MATCH (d:`{label}` {{PID: $detail_pid}})-[:HAS_CONCEPT]->(c)
+WHERE $after IS NULL OR c.CID > $after
+WITH d, c ORDER BY c.CID LIMIT $limit
+WITH c, CASE WHEN c.PIDs IS :: LIST<ANY> THEN apoc.coll.indexOf(c.PIDs, d.PID) ELSE -1 END AS i
+RETURN CASE WHEN i < 0 THEN properties(c) ELSE apoc.map.fromPairs([key IN keys(c) |
+           [key, CASE WHEN c[key] IS :: LIST<ANY> AND size(c[key]) > i THEN c[key][i] ELSE c[key] END]
+       ]) END AS concept
+"""
+
+
+def fetch_concepts_page(driver, label, detail_pid, after=None, limit=100):
+    query = CONCEPT_PAGE_QUERY.format(label=label)
+    with driver.session() as session:
+        result = session.run(query, detail_pid=detail_pid, after=after, limit=limit)
+        return [dict(record["concept"]) for record in result]
+
+
+def _object_array(values, count):
+    return np.fromiter(values, dtype=object, count=count)
+
+
+def _parse_legacy(column, types):
+    # Only cells still holding "[...]" strings (unmigrated nodes) are parsed
+    if str not in types:
+        return column, types
+    strings = column if types == {str} else [value for value in column if type(value) is str]
+    if not any(map(str.startswith, strings, repeat("["))):
+        return column, types
+    column = list(map(legacy_value, column))
+    return column, set(map(type, column))
+
+
+def _flatten(column, types):
+    # All list elements of a column end to end, plus where each row starts in
+    # that flat array and how many elements it has (0 for non-list cells)
+    if types == {list}:
+        lengths = np.fromiter(map(len, column), dtype=np.int64, count=len(column))
+        lists = column
+    else:
+        lengths = np.fromiter((len(value) if type(value) is list else 0 for value in column),
+                              dtype=np.int64, count=len(column))
+        lists = (value for value in column if type(value) is list)
+    flat = _object_array(chain.from_iterable(lists), int(lengths.sum()))
+    starts = np.zeros(len(column), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    return flat, starts, lengths
+
+
+def project_concepts(concepts, detail_pid):
+    """DataFrame of `concepts` with their per-PID list properties reduced to `detail_pid`'s entry."""
+    if not concepts:
+        return pd.DataFrame()
+
+    # Column-major copy of the concept properties, in first-seen key order
+    columns = {}
+    column_types = {}
+    for key in dict.fromkeys(chain.from_iterable(concepts)):
+        column = list(map(dict.get, concepts, repeat(key)))
+        columns[key], column_types[key] = _parse_legacy(column, set(map(type, column)))
+    if list not in column_types.get("PIDs", ()):
+        return pd.DataFrame(columns).infer_objects()
+
+    # Position of detail_pid within each row's PIDs (-1 where absent)
+    flat_pids, starts, lengths = _flatten(columns["PIDs"], column_types["PIDs"])
+    hits = np.flatnonzero(flat_pids == detail_pid)
+    hit_rows = np.searchsorted(starts + lengths, hits, side="right")
+    index = np.full(len(concepts), -1, dtype=np.int64)
+    rows, first = np.unique(hit_rows, return_index=True)
+    index[rows] = hits[first] - starts[rows]
+    matched = index >= 0
+
+    for key, column in columns.items():
+        if list not in column_types[key]:
+            continue
+        flat, col_starts, col_lengths = _flatten(column, column_types[key])
+        take = matched & (index < col_lengths)
+        if take.all():
+            columns[key] = flat[col_starts + index]
+        elif take.any():
+            column = _object_array(column, len(column))
+            column[take] = flat[col_starts[take] + index[take]]
+            columns[key] = column
+
+    return pd.DataFrame(columns).infer_objects()
+
+
+def concepts_frame(concepts, detail_pid):
+    # Arrow-backed table: whole-number floats become int64 columns, so codes
+    # display without decimals and need no per-cell formatter
+    df = project_concepts(concepts, detail_pid)
+    return df.convert_dtypes(dtype_backend="pyarrow")
@@ -0,0 +1,152 @@
+"""
+Pre-execution checks for LLM-generated Cypher.
+
+Every query is EXPLAINed first (planned, not run) and the plan is inspected:
+
+- writes, CartesianProduct and AllNodesScan operators, and plans whose
+  estimated row count at any step exceeds PHENOMIX_CYPHER_MAX_ESTIMATED_ROWS,
+  are rejected with a reason that can be sent back to the model;
+- read queries whose estimated output exceeds PHENOMIX_CYPHER_LIMIT get a
+  LIMIT appended unless they already end with one. Only a top-level trailing
+  LIMIT counts: one inside a CALL { } subquery, a list or pattern
+  comprehension, a string, a comment or a `quoted` name does not bound the
+  output.
+
+Queries that pass are run under a transaction timeout of
+PHENOMIX_CYPHER_TIMEOUT seconds. Callers give the model up to
+PHENOMIX_CYPHER_RETRIES chances to revise a rejected query.
+"""
+import os
+import re
+
+from neo4j import Query
+
+MAX_ESTIMATED_ROWS = float(os.getenv("PHENOMIX_CYPHER_MAX_ESTIMATED_ROWS", 1e6))
+ROW_LIMIT = int(os.getenv("PHENOMIX_CYPHER_LIMIT", 1000))
+TIMEOUT = float(os.getenv("PHENOMIX_CYPHER_TIMEOUT", 15))
+RETRIES = int(os.getenv("PHENOMIX_CYPHER_RETRIES", 2))
+
+REJECTED_OPERATORS = {
+    "CartesianProduct": "it takes a cartesian product of unconnected patterns; connect them through relationships",
+    "AllNodesScan": "it scans every node in the graph; give each node pattern a label",
+}
+
+_FENCED = re.compile(r"```(?:cypher)?\s*(.*?)```", re.IGNORECASE | re.DOTALL)
+_TRAILING_LIMIT = re.compile(r"(?<!\.)\bLIMIT\s+[$\w]+\s*$", re.IGNORECASE)
+_UNION = re.compile(r"\bUNION\b", re.IGNORECASE)
+_OPENING = {"(": ")", "[": "]", "{": "}"}
+
+
+class CypherRejected(Exception):
+    pass
+
+
+def extract_cypher(text):
+    # The model is asked for ```cypher ... ```; fall back to the bare text
+    match = _FENCED.search(text)
+    return (match.group(1) if match else text.strip("`")).strip()
+
+
+def top_level(cypher):
+    """
+    cypher with comments, string literals, `quoted` names and everything
+    inside (), [] and {} blanked out, leaving only the outermost clauses.
+    """
+    kept = []
+    closing = []
+    i, length = 0, len(cypher)
+    while i < length:
+        char = cypher[i]
+        if cypher.startswith("//", i):
+            i = cypher.find("\n", i)
+            i = length if i < 0 else i
+            continue
+        if cypher.startswith("/*", i):
+            end = cypher.find("*/", i + 2)
+            i = length if end < 0 else end + 2
+            kept.append(" ")
+            continue
+        if char in "'\"`":
+            i += 1
+            while i < length and cypher[i] != char:
+                i += 2 if cypher[i] == "\\" else 1
+            i += 1
+            kept.append(" ")
+            continue
+        if char in _OPENING:
+            closing.append(_OPENING[char])
+        elif closing and char == closing[-1]:
+            closing.pop()
+            kept.append(" ")
+        elif not closing:
+            kept.append(char)
+        i += 1
+    return "".join(kept)
+
+
+def plan_operators(plan):
+    """(operator, estimated rows) for every step of an EXPLAIN plan, root first."""
+    stack = [plan]
+    while stack:
+        step = stack.pop()
+        # Neo4j 5 suffixes operators with the runtime, e.g. "AllNodesScan@neo4j"
+        operator = step.get("operatorType", "").split("@")[0]
+        yield operator, float(step.get("args", {}).get("EstimatedRows", 0))
+        stack.extend(reversed(step.get("children", [])))
+
+
+class PlanReport:
+
+    def __init__(self, plan, query_type):
+        steps = list(plan_operators(plan)) if plan else []
+        self.query_type = query_type
+        self.operators = [operator for operator, _ in steps]
+        self.estimated_rows = steps[0][1] if steps else 0.0
+        self.max_estimated_rows = max((rows for _, rows in steps), default=0.0)
+
+    def problems(self, max_estimated_rows=MAX_ESTIMATED_ROWS):
+        problems = []
+        if self.query_type not in (None, "r"):
+            problems.append("it writes to the database; only read queries are allowed")
+        for operator, reason in REJECTED_OPERATORS.items():
+            if operator in self.operators:
+                problems.append(reason)
+        if self.max_estimated_rows > max_estimated_rows:
+            problems.append(
+                f"the planner estimates {self.max_estimated_rows:,.0f} rows at one step "
+                f"(the limit is {max_estimated_rows:,.0f}); filter earlier or aggregate"
+            )
+        return problems
+
+
+def explain(session, cypher):
+    summary = session.run(f"EXPLAIN {cypher}").consume()
+    return PlanReport(summary.plan, summary.query_type)
+
+
+def guard(session, cypher, max_estimated_rows=MAX_ESTIMATED_ROWS, row_limit=ROW_LIMIT, timeout=TIMEOUT):
+    """
+    Returns (Query to run, note), where note says how the query was rewritten
+    (or is None). Raises CypherRejected with the reasons if the plan is too
+    expensive or unsafe to run.
+    """
+    cypher = cypher.strip().rstrip(";").strip()
+    report = explain(session, cypher)
+    problems = report.problems(max_estimated_rows)
+    if problems:
+        raise CypherRejected("The query was rejected because " + "; ".join(problems) + ".")
+
+    note = None
+    outer = top_level(cypher)
+    if report.estimated_rows > row_limit and _UNION.search(outer):
+        # A trailing LIMIT only bounds the last branch, so every branch needs its own
+        if not all(_TRAILING_LIMIT.search(branch) for branch in _UNION.split(outer)):
+            raise CypherRejected(
+                f"The query was rejected because it may return about {report.estimated_rows:,.0f} rows; "
+                f"add LIMIT {row_limit} to each UNION branch or aggregate."
+            )
+    elif report.estimated_rows > row_limit and not _TRAILING_LIMIT.search(outer):
+        cypher = f"{cypher}\nLIMIT {row_limit}"
+        note = f"LIMIT {row_limit} was added (the planner estimated {report.estimated_rows:,.0f} rows)."
+
+    return Query(cypher, timeout=timeout), note
@@ -0,0 +1,201 @@
+"""
+The process-wide Neo4j drivers shared by every page.
+
+One driver (and so one connection pool, TLS session and routing table) per
+set of credentials serves all pages and users logged in with them; a login
+with another URI, user or password gets its own driver rather than the one
+already authenticated. Pool limits come from the environment:
+
+    PHENOMIX_NEO4J_MAX_POOL_SIZE        max connections per server (default 100)
+    PHENOMIX_NEO4J_ACQUISITION_TIMEOUT  seconds to wait for a free connection (default 60)
+    PHENOMIX_NEO4J_MAX_LIFETIME         seconds before a connection is recycled (default 3600)
+    PHENOMIX_NEO4J_MAX_DRIVERS          drivers kept open (default 4); beyond that the least
+                                        recently used ones are closed once no session is open
+                                        on them, and reopened if they are used again
+
+Sessions handed out by the drivers are tracked so `pool_stats()` can report
+open sessions and how long each session's first query took, and their
+queries are recorded on the page's trace (phenomix.tracing).
+"""
+import hashlib
+import os
+import threading
+import time
+
+from neo4j import GraphDatabase
+
+from phenomix.tracing import traced_run
+
+POOL_SETTINGS = {
+    "max_connection_pool_size": int(os.getenv("PHENOMIX_NEO4J_MAX_POOL_SIZE", 100)),
+    "connection_acquisition_timeout": float(os.getenv("PHENOMIX_NEO4J_ACQUISITION_TIMEOUT", 60)),
+    "max_connection_lifetime": float(os.getenv("PHENOMIX_NEO4J_MAX_LIFETIME", 3600)),
+}
+MAX_DRIVERS = int(os.getenv("PHENOMIX_NEO4J_MAX_DRIVERS", 4))
+
+_lock = threading.Lock()
+_drivers = {}    # (uri, user, password hash) -> TrackedDriver
+_override = None
+
+
+class PoolStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sessions_active = 0
+        self.sessions_opened = 0
+        self.first_queries = 0
+        self.total_first_query = 0.0
+        self.max_first_query = 0.0
+
+    def session_opened(self):
+        with self._lock:
+            self.sessions_active += 1
+            self.sessions_opened += 1
+
+    def session_closed(self):
+        with self._lock:
+            self.sessions_active -= 1
+
+    def first_query(self, seconds):
+        with self._lock:
+            self.first_queries += 1
+            self.total_first_query += seconds
+            self.max_first_query = max(self.max_first_query, seconds)
+
+
+class TrackedSession:
+    # A driver session that reports to PoolStats. The driver takes a
+    # connection from the pool when the first query runs; the driver does not
+    # expose how long that took, so the whole first run() (acquiring the
+    # connection, sending the query and receiving the first response) is
+    # recorded. Queueing for a connection shows up as slow first queries.
+
+    def __init__(self, session, stats):
+        self._session = session
+        self._stats = stats
+        self._ran = False
+        self._closed = False
+        stats.session_opened()
+
+    def run(self, query, parameters=None, **kwargs):
+        if self._ran:
+            return traced_run(self._session.run, query, parameters, **kwargs)
+        start = time.perf_counter()
+        result = traced_run(self._session.run, query, parameters, **kwargs)
+        self._ran = True
+        self._stats.first_query(time.perf_counter() - start)
+        return result
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._stats.session_closed()
+            self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+class TrackedDriver:
+    # open() creates the underlying neo4j driver; a driver built with one can
+    # be released (closed) while no session is open on it and reopens on next use
+
+    def __init__(self, driver=None, open=None):
+        self._driver = driver
+        self._open = open
+        self._lock = threading.Lock()
+        self.stats = PoolStats()
+        self.last_used = time.monotonic()
+
+    def _neo4j_driver(self):
+        # Called with self._lock held
+        if self._driver is None:
+            self._driver = self._open()
+        self.last_used = time.monotonic()
+        return self._driver
+
+    def session(self, **kwargs):
+        with self._lock:
+            return TrackedSession(self._neo4j_driver().session(**kwargs), self.stats)
+
+    def release(self):
+        """Closes the underlying driver if it can be reopened and no session is open; returns whether it did."""
+        with self._lock:
+            if self._open is None or self.stats.sessions_active:
+                return False
+            if self._driver is not None:
+                self._driver.close()
+                self._driver = None
+            return True
+
+    def close(self):
+        # The shared driver outlives any one caller; use close_driver() to shut it down
+        pass
+
+    def __getattr__(self, name):
+        with self._lock:
+            return getattr(self._neo4j_driver(), name)
+
+
+def credentials_key(uri, user, password):
+    """The key drivers are kept under; also for caches that hold a driver. The password is only hashed."""
+    return uri, user, hashlib.sha256(str(password).encode()).hexdigest()
+
+
+def get_driver(uri, user, password):
+    if _override is not None:
+        return _override
+    key = credentials_key(uri, user, password)
+    with _lock:
+        driver = _drivers.get(key)
+        if driver is None:
+            driver = _drivers[key] = TrackedDriver(
+                open=lambda: GraphDatabase.driver(uri, auth=(user, password), **POOL_SETTINGS))
+            # Drop the least recently used other drivers; ones with open sessions stay
+            others = sorted((other for other in _drivers.items() if other[1] is not driver),
+                            key=lambda item: item[1].last_used)
+            for other_key, other in others[:max(0, len(_drivers) - MAX_DRIVERS)]:
+                if other.release():
+                    del _drivers[other_key]
+        return driver
+
+
+def set_driver(driver):
+    """Serve every get_driver() call from driver (benchmarks, offline runs); None restores the real ones."""
+    global _override
+    _override = None if driver is None else TrackedDriver(driver)
+    return _override
+
+
+def close_driver():
+    with _lock:
+        for driver in _drivers.values():
+            if driver._driver is not None:
+                driver._driver.close()
+        _drivers.clear()
+
+
+def pool_stats():
+    """Telemetry summed over the shared drivers, or None if no driver has been created yet."""
+    drivers = [_override] if _override is not None else list(_drivers.values())
+    if not drivers:
+        return None
+    stats = [driver.stats for driver in drivers]
+    first_queries = sum(s.first_queries for s in stats)
+    return {
+        "drivers": len(drivers),
+        "max_pool_size": POOL_SETTINGS["max_connection_pool_size"],
+        "sessions_active": sum(s.sessions_active for s in stats),
+        "sessions_opened": sum(s.sessions_opened for s in stats),
+        "first_queries": first_queries,
+        # Acquiring a connection plus the first query's round trip (see TrackedSession)
+        "avg_first_query_ms": 1e3 * sum(s.total_first_query for s in stats) / first_queries if first_queries else 0.0,
+        "max_first_query_ms": 1e3 * max(s.max_first_query for s in stats),
+    }
@@ -0,0 +1,75 @@
+"""
+Data access for the View Phenotype page.
+
+The header, the detail node for each source and its concept count come back
+from a single parameterized query that walks the DETAILS_ARE relationships
+from the indexed phenotype id, instead of one session and label scan per tab.
+"""
+from phenomix.sources import DETAIL_LABELS
+
+DETAIL_SOURCES = {label: source for source, label in DETAIL_LABELS.items()}
+
+# Concepts are only counted here; their rows are fetched page by page when a
+# tab asks for them (phenomix.concepts.fetch_concepts_page). A detail reached
+# by more than one DETAILS_ARE edge is listed once.
+PHENOTYPE_VIEW_QUERY = """
+MATCH (p:phenotype {id: $phenotype_id})
+OPTIONAL MATCH (p)-[:DETAILS_ARE]->(d)
+WITH DISTINCT p, d
+RETURN p.phenotypes AS name, p.id AS id,
+       collect(CASE WHEN d IS NULL THEN NULL
+               ELSE {labels: labels(d), detail: d, concept_count: COUNT { (d)-[:HAS_CONCEPT]->() }} END) AS sources
+"""
+
+
+def load_phenotype_view(driver, phenotype_id):
+    """
+    Returns {"name", "id", "sources": {source: [{"detail": dict, "concept_count": int}]}},
+    or None if the phenotype does not exist.
+    """
+    with driver.session() as session:
+        record = session.run(PHENOTYPE_VIEW_QUERY, phenotype_id=phenotype_id).single()
+
+    if record is None:
+        return None
+
+    sources = {}
+    seen = set()
+    for entry in record["sources"]:
+        source = next((DETAIL_SOURCES[label] for label in entry["labels"] if label in DETAIL_SOURCES), None)
+        # The page keys its widgets on the detail PID, so each may only appear once per source
+        key = (source, entry["detail"].get("PID"))
+        if source is None or key in seen:
+            continue
+        seen.add(key)
+        sources.setdefault(source, []).append({
+            "detail": dict(entry["detail"]),
+            "concept_count": entry["concept_count"]
+        })
+
+    return {"name": record["name"], "id": record["id"], "sources": sources}
+
+
+# One UNWIND branch per detail label (labels cannot be parameters), combined
+# into a single query so any number of PIDs costs one round trip.
+DETAILS_BY_PID_QUERY = "\nUNION ALL\n".join(
+    f"UNWIND $pids.{label} AS pid MATCH (d:{label} {{PID: pid}}) RETURN '{label}' AS label, pid, d"
+    for label in DETAIL_LABELS.values()
+)
+
+
+def load_details_by_pid(driver, pids_by_label, database="neo4j"):
+    """
+    pids_by_label: {detail label: iterable of PIDs}.
+    Returns {(label, pid): [detail dict, ...]} for the PIDs that exist.
+    """
+    pids = {label: list(dict.fromkeys(pids_by_label.get(label, ()))) for label in DETAIL_LABELS.values()}
+    if not any(pids.values()):
+        return {}
+
+    with driver.session(database=database) as session:
+        records = session.run(DETAILS_BY_PID_QUERY, pids=pids)
+        details = {}
+        for record in records:
+            details.setdefault((record["label"], record["pid"]), []).append(dict(record["d"]))
+    return details
@@ -0,0 +1,223 @@
+"""
+Bulk export of the concepts of many phenotypes, one file per source.
+
+For each source with concepts, one query (one result cursor) streams every
+(phenotype, detail, concept) row for the selected phenotypes; rows are read
+`chunk_size` at a time, their list properties projected onto the detail (as
+on View Phenotype), and written out before the next chunk is read, so memory
+is bounded by the chunk size rather than the export size. Concepts of one
+source do not all have the same properties, so each chunk is first spooled to
+a JSON-lines file next to the output while the columns are collected; the
+spool is then copied, again chunk by chunk, into <source>_concepts.csv and/or
+<source>_concepts.parquet with one column per property seen. Values are
+written as text (codes keep their leading zeros and lose a float's ".0").
+
+Phenotypes are given by ID, or selected the way the Browser does (search text,
+sources and "all"/"any" match). The export can read Neo4j or a local snapshot
+(phenomix.snapshot):
+
+    python -m phenomix.export --ids-file ids.txt --output-dir export [--format csv parquet]
+    python -m phenomix.export --search asthma --sources CPRD OHDSI --snapshot phenomix.sqlite
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from itertools import islice
+
+from phenomix.cli import add_connection_arguments, connect
+from phenomix.concepts import project_concepts
+from phenomix.sources import CONCEPT_LABELS, DETAIL_LABELS, SOURCES
+
+FORMATS = ("csv", "parquet")
+CHUNK_SIZE = int(os.getenv("PHENOMIX_EXPORT_CHUNK_SIZE", 5000))
+
+# Leading columns of every file; the concept's properties follow
+KEY_COLUMNS = ["phenotype_id", "phenotype", "source", "PID"]
+
+# Every concept of the given phenotypes' details of one source, projected
+# server-side like CONCEPT_PAGE_QUERY; unmigrated nodes come back whole.
+# Duplicate DETAILS_ARE / HAS_CONCEPT edges would repeat rows, hence DISTINCT.
+EXPORT_CONCEPTS_QUERY = """
+UNWIND $phenotype_ids AS phenotype_id
+MATCH (p:phenotype {{id: phenotype_id}})-[:DETAILS_ARE]->(d:`{label}`)-[:HAS_CONCEPT]->(c)
+WITH DISTINCT p, d, c
+WITH p, d, c, CASE WHEN c.PIDs IS :: LIST<ANY> THEN apoc.coll.indexOf(c.PIDs, d.PID) ELSE -1 END AS i
+RETURN p.id AS phenotype_id, p.phenotypes AS phenotype, d.PID AS PID,
+       CASE WHEN i < 0 THEN properties(c) ELSE apoc.map.fromPairs([key IN keys(c) |
+           [key, CASE WHEN c[key] IS :: LIST<ANY> AND size(c[key]) > i THEN c[key][i] ELSE c[key] END]
+       ]) END AS concept
+"""
+
+
+def neo4j_rows(driver, database="neo4j", fetch_size=1000):
+    """rows(source, phenotype_ids) reading from Neo4j: one streamed query per source."""
+    def rows(source, phenotype_ids):
+        query = EXPORT_CONCEPTS_QUERY.format(label=DETAIL_LABELS[source])
+        with driver.session(database=database, fetch_size=fetch_size) as session:
+            for record in session.run(query, phenotype_ids=list(phenotype_ids)):
+                yield record["phenotype_id"], record["phenotype"], record["PID"], dict(record["concept"])
+    return rows
+
+
+def snapshot_rows(snapshot):
+    """rows(source, phenotype_ids) reading from a phenomix.snapshot.Snapshot."""
+    def rows(source, phenotype_ids):
+        return snapshot.export_concepts(DETAIL_LABELS[source], CONCEPT_LABELS[source], phenotype_ids)
+    return rows
+
+
+def _text(value):
+    if value is None or isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _project(source, chunk):
+    # One row dict per (phenotype, detail, concept), list properties reduced to the detail's entry
+    by_pid = {}
+    for phenotype_id, phenotype, pid, concept in chunk:
+        by_pid.setdefault(pid, []).append((phenotype_id, phenotype, concept))
+    for pid, rows in by_pid.items():
+        df = project_concepts([concept for _, _, concept in rows], pid)
+        for (phenotype_id, phenotype, _), concept in zip(rows, df.to_dict("records")):
+            yield {"phenotype_id": phenotype_id, "phenotype": phenotype, "source": source, "PID": _text(pid),
+                   **{key: _text(value) for key, value in concept.items() if key not in KEY_COLUMNS}}
+
+
+def _read_spool(path, chunk_size):
+    with open(path) as f:
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                return
+            yield [json.loads(line) for line in lines]
+
+
+def _write_outputs(spool_path, columns, output_dir, source, formats, chunk_size):
+    # Copies the spooled rows into the final files; returns their paths
+    base = os.path.join(output_dir, f"{source.lower()}_concepts")
+    paths = []
+    csv_file = parquet_writer = None
+    try:
+        if "csv" in formats:
+            paths.append(f"{base}.csv")
+            csv_file = open(f"{base}.csv.tmp", "w", newline="")
+            csv_writer = csv.DictWriter(csv_file, fieldnames=columns)
+            csv_writer.writeheader()
+        if "parquet" in formats:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            paths.append(f"{base}.parquet")
+            schema = pa.schema([(column, pa.string()) for column in columns])
+            parquet_writer = pq.ParquetWriter(f"{base}.parquet.tmp", schema)
+        for rows in _read_spool(spool_path, chunk_size):
+            if csv_file is not None:
+                csv_writer.writerows(rows)
+            if parquet_writer is not None:
+                parquet_writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+        if parquet_writer is not None:
+            parquet_writer.close()
+    for path in paths:
+        os.replace(f"{path}.tmp", path)
+    return paths
+
+
+def export_concepts(rows, phenotype_ids, output_dir, formats=FORMATS, chunk_size=CHUNK_SIZE, sources=None):
+    """
+    Writes the concepts of phenotype_ids to output_dir, one file per source and
+    format; rows is neo4j_rows(...) or snapshot_rows(...). Returns
+    {source: {"rows", "columns", "files"}}; sources with no concepts write no files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    phenotype_ids = list(dict.fromkeys(phenotype_ids))
+    results = {}
+    for source in sources or [source for source in SOURCES if source in CONCEPT_LABELS]:
+        spool_path = os.path.join(output_dir, f".{source.lower()}_concepts.jsonl")
+        columns = dict.fromkeys(KEY_COLUMNS)
+        count = 0
+        try:
+            with open(spool_path, "w") as spool:
+                stream = rows(source, phenotype_ids)
+                while chunk := list(islice(stream, chunk_size)):
+                    for row in _project(source, chunk):
+                        columns.update(dict.fromkeys(row))
+                        spool.write(json.dumps(row) + "\n")
+                        count += 1
+            files = _write_outputs(spool_path, list(columns), output_dir, source, formats, chunk_size) if count else []
+        finally:
+            os.remove(spool_path)
+        results[source] = {"rows": count, "columns": len(columns), "files": files}
+    return results
+
+
+def select_phenotypes(records, search="", sources=(), match="all"):
+    """IDs of the phenotypes the Browser would list for this search and source filter."""
+    from phenomix.catalog import Catalog
+    catalog = Catalog(records)
+    positions = catalog.filter(catalog.search(search), list(sources), match)
+    return [catalog.ids[position] for position in positions]
+
+
+def _read_ids(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_connection_arguments(parser)
+    parser.add_argument("--snapshot", help="read from this snapshot file instead of Neo4j")
+    parser.add_argument("--ids", nargs="+", default=[], help="phenotype IDs to export")
+    parser.add_argument("--ids-file", help="file with one phenotype ID per line")
+    parser.add_argument("--search", default="", help="Browser search text (without --ids)")
+    parser.add_argument("--sources", nargs="+", choices=SOURCES, default=[], help="Browser source filter (without --ids)")
+    parser.add_argument("--match", choices=["all", "any"], default="all", help="phenotypes in all or any of --sources")
+    parser.add_argument("--output-dir", default="concept_export")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=list(FORMATS), dest="formats")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="rows held in memory at a time (default: $PHENOMIX_EXPORT_CHUNK_SIZE or 5000)")
+    args = parser.parse_args()
+
+    driver = None
+    if args.snapshot:
+        from phenomix.snapshot import Snapshot
+        snapshot = Snapshot(args.snapshot)
+        rows = snapshot_rows(snapshot)
+        load_records = snapshot.phenotypes
+    else:
+        driver = connect(parser, args)
+        rows = neo4j_rows(driver, args.database)
+
+        def load_records():
+            with driver.session(database=args.database) as session:
+                return [record["p"] for record in session.run("MATCH (p:phenotype) RETURN p {.id, .phenotypes} AS p")]
+
+    try:
+        phenotype_ids = args.ids + (_read_ids(args.ids_file) if args.ids_file else [])
+        if not phenotype_ids:
+            if not args.search and not args.sources:
+                parser.error("give --ids / --ids-file, or a --search and/or --sources filter")
+            phenotype_ids = select_phenotypes(load_records(), args.search, args.sources, args.match)
+        start = time.perf_counter()
+        results = export_concepts(rows, phenotype_ids, args.output_dir, args.formats, args.chunk_size)
+    finally:
+        if driver is not None:
+            driver.close()
+
+    print(f"exported the concepts of {len(set(phenotype_ids))} phenotypes in {time.perf_counter() - start:.1f}s")
+    for source, result in results.items():
+        print(f"  {source:<9} {result['rows']:>9} rows  {', '.join(result['files']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Build the graph's relationships in batched, restartable steps.
+
+Replaces the hand-run statements in neo4j_query_saved_cypher_2024-11-15.csv:
+
+    <source>_details   (:phenotype)-[:DETAILS_ARE]->(:<source>_detail), from the phenotype's <source>_PID
+    <source>_concepts  (:<source>_detail)-[:HAS_CONCEPT]->(:<source>_concept), from the concept's PIDs
+
+Each step walks its source nodes in key order, parses the PID lists
+client-side (phenomix.properties.as_list, so migrated and legacy nodes both
+work) and MERGEs one batch of relationships per transaction, so re-running a
+step is a no-op and no transaction holds more than --batch-size nodes.
+dedupe_details removes the duplicate DETAILS_ARE relationships left behind by
+the old CREATE statements. Progress is checkpointed after every batch.
+
+The MATCHes need indexes on :phenotype(id), :<source>_detail(PID) and
+:<source>_concept(CID) to stay fast.
+
+    python -m phenomix.graph_loader --uri neo4j+s://... --password ... [--steps cprd_details ...]
+"""
+import argparse
+import time
+
+from phenomix.cli import Checkpoint, add_connection_arguments, connect
+from phenomix.properties import as_list
+from phenomix.sources import CONCEPT_LABELS, DETAIL_LABELS, PID_PROPERTIES
+
+READ_BATCH = """
+MATCH (n:`{label}`)
+WHERE n.`{key}` IS NOT NULL AND n.`{property}` IS NOT NULL AND ($after IS NULL OR n.`{key}` > $after)
+RETURN n.`{key}` AS key, n.`{property}` AS pids
+ORDER BY key
+LIMIT $limit
+"""
+
+DETAILS_ARE_BATCH = """
+UNWIND $rows AS row
+MATCH (p:phenotype {{id: row.key}})
+UNWIND row.pids AS pid
+MATCH (d:`{detail}` {{PID: pid}})
+MERGE (p)-[:DETAILS_ARE]->(d)
+"""
+
+HAS_CONCEPT_BATCH = """
+UNWIND $rows AS row
+MATCH (c:`{concept}` {{CID: row.key}})
+UNWIND row.pids AS pid
+MATCH (d:`{detail}` {{PID: pid}})
+MERGE (d)-[:HAS_CONCEPT]->(c)
+"""
+
+DEDUPE_DETAILS_BATCH = """
+UNWIND $rows AS row
+MATCH (p:phenotype {id: row.key})-[r:DETAILS_ARE]->(d)
+WITH p, d, collect(r) AS rels
+WHERE size(rels) > 1
+FOREACH (r IN tail(rels) | DELETE r)
+"""
+
+# step -> (label walked, key, property holding the PIDs, write query)
+STEPS = {"dedupe_details": ("phenotype", "id", "id", DEDUPE_DETAILS_BATCH)}
+for _source, _detail in DETAIL_LABELS.items():
+    STEPS[f"{_source.lower()}_details"] = (
+        "phenotype", "id", PID_PROPERTIES[_source], DETAILS_ARE_BATCH.format(detail=_detail)
+    )
+for _source, _concept in CONCEPT_LABELS.items():
+    STEPS[f"{_source.lower()}_concepts"] = (
+        _concept, "CID", "PIDs", HAS_CONCEPT_BATCH.format(concept=_concept, detail=DETAIL_LABELS[_source])
+    )
+
+
+def _pid(value):
+    # PIDs are matched as strings; "[123, 456]" parses to ints and pandas may have made them floats
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def parse_pids(value):
+    pids = (_pid(pid) for pid in as_list(value) if pid is not None)
+    return [pid for pid in pids if pid.lower() not in ("", "nan")]
+
+
+def load_step(driver, database, step, checkpoint, batch_size):
+    """Runs one step to completion (or from its checkpoint); returns the seconds spent."""
+    label, key, pid_property, write_query = STEPS[step]
+    progress = checkpoint.get(step)
+    if progress.get("done"):
+        print(f"{step}: already loaded, skipping")
+        return 0.0
+
+    after = progress.get("after")
+    scanned = progress.get("scanned", 0)
+    created = progress.get("created", 0)
+    deleted = progress.get("deleted", 0)
+    read_query = READ_BATCH.format(label=label, key=key, property=pid_property)
+    start = time.perf_counter()
+
+    with driver.session(database=database) as session:
+        while True:
+            batch = session.run(read_query, after=after, limit=batch_size).data()
+            if not batch:
+                break
+
+            rows = []
+            for record in batch:
+                pids = parse_pids(record["pids"])
+                if pids:
+                    rows.append({"key": record["key"], "pids": pids})
+
+            if rows:
+                summary = session.execute_write(lambda tx: tx.run(write_query, rows=rows).consume())
+                created += summary.counters.relationships_created
+                deleted += summary.counters.relationships_deleted
+
+            after = batch[-1]["key"]
+            scanned += len(batch)
+            checkpoint.update(step, after=after, scanned=scanned, created=created, deleted=deleted)
+            elapsed = time.perf_counter() - start
+            print(f"{step}: {scanned} {label} scanned, {created} created, {deleted} deleted "
+                  f"({scanned / elapsed:,.0f}/s, last {key} {after})")
+
+    seconds = time.perf_counter() - start
+    checkpoint.update(step, done=True, seconds=progress.get("seconds", 0.0) + seconds)
+    print(f"{step}: finished in {seconds:.1f}s")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_connection_arguments(parser)
+    parser.add_argument("--steps", nargs="+", choices=list(STEPS), default=list(STEPS))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--checkpoint", default="load_checkpoint.json", help="progress file used to resume")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    driver = connect(parser, args)
+    checkpoint = Checkpoint(args.checkpoint, reset=args.restart)
+    timings = {}
+    try:
+        for step in args.steps:
+            timings[step] = load_step(driver, args.database, step, checkpoint, args.batch_size)
+    finally:
+        driver.close()
+
+    print("\nstep timings:")
+    for step, seconds in timings.items():
+        print(f"  {step:<20} {seconds:8.1f}s")
+    print(f"  {'total':<20} {sum(timings.values()):8.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Helpers for calling the chat API from the pages.
+
+The chat client is created on first use and shared by the process;
+set_client() swaps in another client (benchmarks, offline runs). Its calls
+are recorded on the page's trace (phenomix.tracing), including calls made
+from map_concurrent's worker threads.
+
+Calls that fail with a transient error (rate limit, timeout, connection or
+server error) are retried with exponential backoff, and independent calls can
+be fanned out over a bounded thread pool:
+
+    PHENOMIX_LLM_CONCURRENCY  parallel requests per fan-out (default 4)
+    PHENOMIX_LLM_RETRIES      retries after the first attempt (default 3)
+    PHENOMIX_LLM_BACKOFF      first retry delay in seconds, doubled each time (default 1)
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from phenomix.tracing import TracedClient
+
+MAX_CONCURRENCY = int(os.getenv("PHENOMIX_LLM_CONCURRENCY", 4))
+MAX_RETRIES = int(os.getenv("PHENOMIX_LLM_RETRIES", 3))
+BACKOFF = float(os.getenv("PHENOMIX_LLM_BACKOFF", 1))
+
+_lock = threading.Lock()
+_client = None
+
+
+# openai is imported on first use rather than with this module: it is one of the
+# slowest imports of a cold Chatbot load and the first render does not need it
+def retryable():
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+
+def get_client():
+    global _client
+    with _lock:
+        if _client is None:
+            import openai
+            _client = TracedClient(openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY2")))
+        return _client
+
+
+def set_client(client):
+    global _client
+    with _lock:
+        _client = None if client is None else TracedClient(client)
+
+
+def with_retries(call, retries=MAX_RETRIES, backoff=BACKOFF, retry_on=None):
+    # retry_on defaults to the transient errors listed by retryable()
+    retry_on = retryable() if retry_on is None else retry_on
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except retry_on:
+            if attempt == retries:
+                raise
+            # Jitter keeps parallel workers from retrying in lockstep
+            time.sleep(backoff * 2 ** attempt + random.uniform(0, backoff))
+
+
+def map_concurrent(func, items, max_workers=MAX_CONCURRENCY):
+    """func applied to every item on at most max_workers threads; results keep the input order."""
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+    # Workers run in copies of the caller's context, so they record into its trace
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return list(pool.map(lambda item: context.copy().run(func, item), items))
+
+
+def stream_text(response):
+    # Text deltas of a chat.completions.create(..., stream=True) response
+    for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def time_first_token(chunks, started, record):
+    """Passes chunks through, calling record(seconds since started) when the first one arrives."""
+    first = True
+    for chunk in chunks:
+        if first:
+            record(time.perf_counter() - started)
+            first = False
+        yield chunk
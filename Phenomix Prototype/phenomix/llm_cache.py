@@ -0,0 +1,121 @@
+"""
+Cache for LLM responses.
+
+Entries are keyed on a normalized question plus a hash of everything else that
+shapes the answer (system prompt, schema, model), so a change to any of those
+simply stops matching old entries. Recently used entries are kept in memory
+(LRU); with a path, entries are also written to a SQLite file and survive
+restarts.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    # "What codes define X?" and "what  codes define x" share an entry
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", question.lower())).strip()
+
+
+def cache_key(question, *context):
+    digest = hashlib.sha256()
+    digest.update(normalize_question(question).encode())
+    for part in context:
+        digest.update(b"\0")
+        digest.update(hashlib.sha256(str(part).encode()).digest())
+    return digest.hexdigest()
+
+
+def content_key(*parts):
+    # Exact-content key, for inputs where case and punctuation matter
+    return cache_key("", *parts)
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries=1024, path=None, max_disk_entries=100000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, used REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+            self._db.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            value = None
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value = row[0]
+                    self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._remember(key, value)
+
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, value, time.time()))
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY used DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,)
+                )
+                self._db.commit()
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def response_cache_from_env(prefix="PHENOMIX_LLM_CACHE", default_size=1024):
+    # <prefix>_SIZE: in-memory entries; <prefix>_PATH: optional SQLite file
+    return ResponseCache(
+        max_entries=int(os.getenv(f"{prefix}_SIZE", default_size)),
+        path=os.getenv(f"{prefix}_PATH") or None
+    )
@@ -0,0 +1,105 @@
+"""
+Multi-pattern phrase matching (Aho-Corasick).
+
+Finds every phenotype name mentioned in a piece of text in one pass over the
+text, however many names the catalog holds. Matching is case-insensitive;
+by default a match must start and end on a word boundary ("asthma" does not
+match inside "asthmatic"), and where matches overlap the longest one wins
+("type 2 diabetes" rather than "diabetes").
+"""
+from collections import deque
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+class PhraseMatcher:
+
+    def __init__(self, phrases, word_boundaries=True):
+        """phrases: iterable of (key, phrase); several keys may share a phrase."""
+        self.word_boundaries = word_boundaries
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]  # (phrase length, keys) ending at each state
+        self._keys = {}
+
+        for key, phrase in phrases:
+            if not phrase:
+                continue
+            phrase = phrase.lower()
+            state = 0
+            for char in phrase:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append([])
+                state = next_state
+            if phrase not in self._keys:
+                self._keys[phrase] = []
+                self._outputs[state].append((len(phrase), self._keys[phrase]))
+            self._keys[phrase].append(key)
+
+        self._link()
+
+    def _link(self):
+        # Breadth-first, so every fail target is finished before it is used
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _bounded(self, text, start, end):
+        if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+            return False
+        if end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]):
+            return False
+        return True
+
+    def all_matches(self, text):
+        """Every (start, end, keys) occurrence, overlapping ones included."""
+        text = text.lower()
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, keys in outputs[state]:
+                start = position + 1 - length
+                if not self.word_boundaries or self._bounded(text, start, position + 1):
+                    matches.append((start, position + 1, keys))
+        return matches
+
+    def find(self, text):
+        """Non-overlapping (start, end, keys) matches, leftmost-longest first."""
+        matches = sorted(self.all_matches(text), key=lambda match: (match[0], match[0] - match[1]))
+        selected = []
+        covered = 0
+        for start, end, keys in matches:
+            if start >= covered:
+                selected.append((start, end, keys))
+                covered = end
+        return selected
+
+    def find_keys(self, text):
+        """Keys of the phrases found by find(), in order of first mention, without repeats."""
+        seen = {}
+        for _, _, keys in self.find(text):
+            for key in keys:
+                seen.setdefault(key)
+        return list(seen)
@@ -0,0 +1,105 @@
+"""
+Rewrite stringified list/number properties as native Neo4j values.
+
+Walks every phenotype, detail and concept node in key order (id / PID / CID),
+converts Python-repr strings with phenomix.properties.native_properties and
+writes the changes back in batched transactions. Keys are not unique in every
+label, so nodes are paged on (key, elementId) and written back by elementId.
+Progress is checkpointed after each batch, so an interrupted run resumes where
+it stopped; re-running a finished migration is a no-op.
+
+    python -m phenomix.migrate --uri neo4j+s://... --password ... [--dry-run]
+"""
+import argparse
+import time
+
+from phenomix.cli import Checkpoint, add_connection_arguments, connect
+from phenomix.properties import native_properties
+from phenomix.sources import CONCEPT_LABELS, DETAIL_LABELS
+
+LABEL_KEYS = {
+    "phenotype": "id",
+    **{label: "PID" for label in DETAIL_LABELS.values()},
+    **{label: "CID" for label in CONCEPT_LABELS.values()},
+}
+
+READ_BATCH = """
+MATCH (n:`{label}`)
+WHERE n.`{key}` IS NOT NULL
+  AND ($after IS NULL OR n.`{key}` > $after OR n.`{key}` = $after AND elementId(n) > $after_id)
+RETURN n.`{key}` AS key, elementId(n) AS id, properties(n) AS props
+ORDER BY key, id
+LIMIT $limit
+"""
+
+WRITE_BATCH = """
+UNWIND $rows AS row
+MATCH (n:`{label}`)
+WHERE elementId(n) = row.id
+SET n += row.props
+"""
+
+
+def migrate_label(driver, database, label, key, checkpoint, batch_size, dry_run=False):
+    progress = checkpoint.get(label)
+    if progress.get("done"):
+        print(f"{label}: already migrated, skipping")
+        return
+
+    after = progress.get("after")
+    # Checkpoints from before after_id re-read the nodes sharing the last key, which is harmless
+    after_id = progress.get("after_id", "")
+    scanned = progress.get("scanned", 0)
+    updated = progress.get("updated", 0)
+    read_query = READ_BATCH.format(label=label, key=key)
+    write_query = WRITE_BATCH.format(label=label)
+    start = time.perf_counter()
+
+    with driver.session(database=database) as session:
+        while True:
+            batch = session.run(read_query, after=after, after_id=after_id, limit=batch_size).data()
+            if not batch:
+                break
+
+            rows = []
+            for record in batch:
+                changes = native_properties(label, record["props"])
+                if changes:
+                    rows.append({"id": record["id"], "props": changes})
+
+            if rows and not dry_run:
+                session.execute_write(lambda tx: tx.run(write_query, rows=rows).consume())
+
+            after, after_id = batch[-1]["key"], batch[-1]["id"]
+            scanned += len(batch)
+            updated += len(rows)
+            if not dry_run:
+                checkpoint.update(label, after=after, after_id=after_id, scanned=scanned, updated=updated)
+            print(f"{label}: {scanned} scanned, {updated} {'to update' if dry_run else 'updated'} (last {key} {after})")
+
+    if not dry_run:
+        checkpoint.update(label, done=True)
+    print(f"{label}: finished in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_connection_arguments(parser)
+    parser.add_argument("--labels", nargs="+", choices=sorted(LABEL_KEYS), default=list(LABEL_KEYS))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--checkpoint", default="migrate_checkpoint.json", help="progress file used to resume")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+
+    driver = connect(parser, args)
+    checkpoint = Checkpoint(None if args.dry_run else args.checkpoint, reset=args.restart)
+    try:
+        for label in args.labels:
+            migrate_label(driver, args.database, label, LABEL_KEYS[label], checkpoint, args.batch_size, args.dry_run)
+    finally:
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
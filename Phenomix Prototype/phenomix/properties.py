@@ -0,0 +1,144 @@
+"""
+Conversion of legacy stringified properties to native values.
+
+Ingestion stored arrays as Python-repr strings ("['a', 'b']", "[1.0, nan]").
+The migration (phenomix.migrate) rewrites them as native Neo4j lists/numbers;
+the read paths use `legacy_value` / `as_list` so they accept both forms and
+only pay for parsing on nodes that have not been migrated yet. Nothing here
+ever calls eval.
+
+Unlike the original get_concepts, which ran literal_eval on every string,
+`legacy_value` only parses "[...]" strings. Scalar strings stay text:
+"250.00" (ICD-9), "04224" (Read) and "1371." are codes, and literal_eval
+would have turned the first into the float 250.0, failed on the second and
+made the third 1371.0. So numeric-looking strings such as "123" or "1.0" now
+show as text in the concept tables instead of numbers. The migration
+converts the few properties that really are numeric (NUMERIC_PROPERTIES).
+
+Some lists were written without quotes ("[XXXXP0001, XXXXP0002]"), which is
+not a Python literal; those are split on commas into a list of strings.
+"""
+import ast
+import math
+import re
+
+_INT = re.compile(r"^-?\d+$")
+_FLOAT = re.compile(r"^-?(\d+\.\d*|\.\d+|\d+)([eE][-+]?\d+)?$")
+
+# Scalar properties documented as numeric that ingestion may have stored as text
+NUMERIC_PROPERTIES = {
+    "cprd_detail": {"disease_num"},
+    "hdruk_detail": {"world_access", "group_access", "phenotype_version_id", "status"},
+    "phekb_detail": {"phenotype_id"},
+    "ohdsi_concept": {"ConceptId"},
+    "phekb_concept": {"phenotype_id"},
+}
+
+
+class _NanToFloat(ast.NodeTransformer):
+
+    def visit_Name(self, node):
+        if node.id in ("nan", "NaN"):
+            return ast.copy_location(ast.Constant(math.nan), node)
+        return node
+
+
+def parse_literal(text):
+    # ast.literal_eval, additionally accepting the bare `nan` pandas writes into reprs
+    try:
+        return ast.literal_eval(text)
+    except ValueError:
+        if "nan" not in text.lower():
+            raise
+        tree = _NanToFloat().visit(ast.parse(text, mode="eval"))
+        return ast.literal_eval(tree)
+
+
+def _split_list(value):
+    # "[a, 'b']" -> ["a", "b"]; only flat lists, so nested or unbalanced brackets are not lists
+    inner = value.strip()[1:-1] if value.rstrip().endswith("]") else None
+    if inner is None or "[" in inner or "]" in inner:
+        return None
+    items = [item.strip().strip("'\"").strip() for item in inner.split(",")]
+    return [item for item in items if item]
+
+
+def parse_list(value):
+    """The list encoded in a legacy string property, or None if it is not one."""
+    if not isinstance(value, str) or not value.startswith("["):
+        return None
+    try:
+        parsed = parse_literal(value)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return _split_list(value)
+    return parsed if isinstance(parsed, list) else None
+
+
+def legacy_value(value):
+    # Native values and scalar strings pass straight through; only "[...]" strings are parsed
+    parsed = parse_list(value)
+    return value if parsed is None else parsed
+
+
+def as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    parsed = parse_list(value)
+    if parsed is not None:
+        return parsed
+    if isinstance(value, str) and value.strip().lower() in ("", "nan"):
+        return []
+    return [value]
+
+
+def _storable_list(items):
+    # Neo4j lists must be flat, null-free and homogeneous
+    if any(item is None or isinstance(item, (list, tuple, dict, set)) for item in items):
+        return None
+    kinds = {bool if isinstance(item, bool) else int if isinstance(item, int) else
+             float if isinstance(item, float) else str if isinstance(item, str) else None
+             for item in items}
+    if None in kinds:
+        return None
+    if kinds <= {str} or kinds <= {bool} or kinds <= {int}:
+        return list(items)
+    if kinds <= {int, float}:
+        return [float(item) for item in items]
+    return None
+
+
+def native_value(label, key, value):
+    """
+    The native replacement for a stored property value, or `value` itself when
+    there is nothing to convert (already native, or not representable).
+    """
+    if not isinstance(value, str):
+        return value
+
+    if value.startswith("["):
+        parsed = parse_list(value)
+        if parsed is not None:
+            converted = _storable_list(parsed)
+            if converted is not None:
+                return converted
+        return value
+
+    if key in NUMERIC_PROPERTIES.get(label, ()):
+        text = value.strip()
+        if _INT.match(text):
+            return int(text)
+        if _FLOAT.match(text):
+            return float(text)
+    return value
+
+
+def native_properties(label, properties):
+    """Only the properties that change, mapped to their native values."""
+    changes = {}
+    for key, value in properties.items():
+        converted = native_value(label, key, value)
+        if converted is not value:
+            changes[key] = converted
+    return changes
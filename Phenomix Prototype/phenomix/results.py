@@ -0,0 +1,138 @@
+"""
+Bounded handling of query results that are passed to the LLM.
+
+Records are consumed one at a time. Rows are kept verbatim until a row cap or
+a token budget is reached. After that, the scan continues for a while
+without keeping rows: it counts them, tallies the most common scalar values
+per column and reservoir-samples a few rows. Then the rest of the result is
+discarded. The prompt text says plainly when the rows were cut off.
+
+    PHENOMIX_RESULT_MAX_ROWS      rows passed verbatim (default 200)
+    PHENOMIX_RESULT_TOKEN_BUDGET  approximate prompt tokens for those rows (default 4000)
+    PHENOMIX_RESULT_SCAN_LIMIT    rows read in total before giving up on an exact count (default 100000)
+"""
+import json
+import os
+import random
+from collections import Counter
+
+MAX_ROWS = int(os.getenv("PHENOMIX_RESULT_MAX_ROWS", 200))
+TOKEN_BUDGET = int(os.getenv("PHENOMIX_RESULT_TOKEN_BUDGET", 4000))
+SCAN_LIMIT = int(os.getenv("PHENOMIX_RESULT_SCAN_LIMIT", 100000))
+
+_SCALARS = (str, int, float, bool)
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English and JSON; close enough for budgeting
+    return len(text) // 4 + 1
+
+
+def _row_text(row):
+    return json.dumps(row, default=str)
+
+
+def _short(value, width=80):
+    text = str(value)
+    return text if len(text) <= width else text[:width - 1] + "…"
+
+
+class ResultSummary:
+
+    def __init__(self, token_budget=TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.rows = []          # rows passed verbatim
+        self.row_count = 0      # rows read
+        self.exhausted = True   # False if the scan stopped before the end, so row_count is a lower bound
+        self.truncated = False  # True if rows were read but not passed verbatim
+        self.tokens = 0
+        self.value_counts = {}  # column -> Counter of scalar values, over every row read
+        self.samples = []       # reservoir sample of the rows that were not kept
+
+    @property
+    def columns(self):
+        return list(self.value_counts)
+
+    def to_prompt(self, top_values=5):
+        if not self.truncated:
+            return json.dumps(self.rows, default=str)
+
+        total = f"{self.row_count}" if self.exhausted else f"more than {self.row_count}"
+        lines = [
+            f"The query returned {total} rows, which is too many to include. "
+            f"The first {len(self.rows)} rows are:",
+            json.dumps(self.rows, default=str),
+            "Most common values per column across all rows read:",
+        ]
+        for column, counts in self.value_counts.items():
+            if counts:
+                common = ", ".join(f"{_short(value)!r} ({count})" for value, count in counts.most_common(top_values))
+                lines.append(f"- {column}: {common}")
+        # Samples get at most a quarter of the budget on top of the verbatim rows
+        samples, tokens = [], 0
+        for row in self.samples:
+            tokens += estimate_tokens(_row_text(row))
+            if tokens > self.token_budget // 4:
+                break
+            samples.append(row)
+        if samples:
+            lines.append("A random sample of the remaining rows:")
+            lines.append(json.dumps(samples, default=str))
+        return "\n".join(lines)
+
+    def describe(self):
+        # One line for the UI
+        if not self.truncated:
+            return f"{self.row_count} rows"
+        total = f"{self.row_count}" if self.exhausted else f"{self.row_count}+"
+        return f"{len(self.rows)} of {total} rows passed to the model (truncated)"
+
+
+def summarize_records(records, max_rows=MAX_ROWS, token_budget=TOKEN_BUDGET, scan_limit=SCAN_LIMIT,
+                      sample_size=20, seed=0):
+    """
+    records: an iterable of dict rows (e.g. record.data() for each record of a
+    neo4j Result). It is consumed lazily and only up to scan_limit rows.
+    """
+    summary = ResultSummary(token_budget)
+    rng = random.Random(seed)
+    skipped = 0
+
+    for row in records:
+        if summary.row_count >= scan_limit:
+            summary.exhausted = False
+            break
+        summary.row_count += 1
+
+        for column, value in row.items():
+            counts = summary.value_counts.setdefault(column, Counter())
+            if isinstance(value, _SCALARS):
+                counts[value] += 1
+
+        if not summary.truncated:
+            tokens = estimate_tokens(_row_text(row))
+            if len(summary.rows) < max_rows and summary.tokens + tokens <= token_budget:
+                summary.rows.append(row)
+                summary.tokens += tokens
+                continue
+            summary.truncated = True
+
+        # Reservoir sample over the rows that did not fit
+        skipped += 1
+        if len(summary.samples) < sample_size:
+            summary.samples.append(row)
+        else:
+            slot = rng.randrange(skipped)
+            if slot < sample_size:
+                summary.samples[slot] = row
+
+    return summary
+
+
+def run_bounded(session, query, parameters=None, **kwargs):
+    """Runs query and summarizes its records without materializing the whole result."""
+    result = session.run(query, parameters)
+    summary = summarize_records((record.data() for record in result), **kwargs)
+    # Tell the server to drop whatever was not read
+    result.consume()
+    return summary
@@ -0,0 +1,64 @@
+"""
+Process-wide cache of the detail property keys used by the Chatbot prompts.
+
+The property scan walks every detail node, so it is run once and its result
+reused until the TTL expires or someone asks for an explicit refresh. The
+node and relationship layout in the prompt is written out by hand
+(node_properties_relationships), so apoc.meta.schema() is not queried.
+"""
+import os
+import threading
+import time
+
+from phenomix.sources import DETAIL_LABELS
+
+DEFAULT_TTL = float(os.getenv("PHENOMIX_SCHEMA_TTL", 3600))
+
+PROPERTIES_QUERY = "MATCH (n:`{label}`) WITH n, keys(n) AS keys UNWIND keys AS key RETURN DISTINCT key"
+
+
+def fetch_properties(driver, database="neo4j"):
+    # Property keys present on each detail label
+    node_property = {}
+    with driver.session(database=database) as session:
+        for label in DETAIL_LABELS.values():
+            result = session.run(PROPERTIES_QUERY.format(label=label)).data()
+            node_property[label] = sorted(record["key"] for record in result)
+    return node_property
+
+
+def format_properties(properties):
+    return "\n".join(f"{label}: {', '.join(keys)}" for label, keys in properties.items())
+
+
+class SchemaCache:
+
+    def __init__(self, driver, ttl=DEFAULT_TTL, database="neo4j"):
+        self.driver = driver
+        self.ttl = ttl
+        self.database = database
+        self.loaded_at = None
+        self.refreshes = 0
+        self._value = None
+        self._lock = threading.RLock()
+
+    @property
+    def stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    def refresh(self):
+        with self._lock:
+            self._value = fetch_properties(self.driver, self.database)
+            self.loaded_at = time.monotonic()
+            self.refreshes += 1
+            return self._value
+
+    def get(self):
+        # Concurrent callers on a stale cache wait for one refresh rather than each running the scan
+        with self._lock:
+            if self.stale:
+                return self.refresh()
+            return self._value
+
+    def properties(self):
+        return self.get()
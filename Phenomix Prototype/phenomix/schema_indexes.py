@@ -0,0 +1,204 @@
+"""
+Declare and verify the constraints and indexes the app's lookups rely on.
+
+- a uniqueness constraint (which brings its own range index) on
+  phenotype.id, every <source>_detail.PID and every <source>_concept.CID;
+  where existing duplicates prevent the constraint, a plain range index
+  is created instead and the duplicates are reported (once they are
+  removed, drop that index and run the command again to get the constraint);
+- full-text indexes on the names the text lookups search: phenotype names
+  (phenotype_names), each source's detail names (<source>_detail_names:
+  Sentinel outcome and title, CPRD disease, HDRUK and PheKB name, OHDSI
+  cohortName) and concept names (<source>_concept_names: Sentinel
+  description, CPRD descr, OHDSI ConceptName). PheKB concepts carry no
+  concept name, so they have no full-text index.
+
+After creating them the command waits for the indexes to come online, lists
+their state, and PROFILEs the app's hot lookup queries against sample keys,
+reporting any that still use a label or all-nodes scan. It exits with status
+1 if anything is missing or still scanning.
+
+    python -m phenomix.schema_indexes --uri neo4j+s://... --password ... [--dry-run]
+"""
+import argparse
+import sys
+
+from neo4j.exceptions import Neo4jError
+
+from phenomix.cli import add_connection_arguments, connect
+from phenomix.concepts import CONCEPT_PAGE_QUERY
+from phenomix.details import DETAILS_BY_PID_QUERY, PHENOTYPE_VIEW_QUERY
+from phenomix.sources import CONCEPT_LABELS, DETAIL_LABELS
+
+KEYS = {
+    "phenotype": "id",
+    **{label: "PID" for label in DETAIL_LABELS.values()},
+    **{label: "CID" for label in CONCEPT_LABELS.values()},
+}
+
+# Name properties per label, as described to the Chatbot (node_properties_relationships)
+DETAIL_NAMES = {"Sentinel": ["outcome", "title"], "HDRUK": ["name"], "CPRD": ["disease"], "OHDSI": ["cohortName"],
+                "PheKB": ["name"]}
+CONCEPT_NAMES = {"Sentinel": ["description"], "CPRD": ["descr"], "OHDSI": ["ConceptName"]}
+
+FULLTEXT = {
+    "phenotype_names": ("phenotype", ["phenotypes"]),
+    **{f"{DETAIL_LABELS[source]}_names": (DETAIL_LABELS[source], names) for source, names in DETAIL_NAMES.items()},
+    **{f"{CONCEPT_LABELS[source]}_names": (CONCEPT_LABELS[source], names) for source, names in CONCEPT_NAMES.items()},
+}
+
+CONSTRAINT = "CREATE CONSTRAINT `{label}_{key}_unique` IF NOT EXISTS FOR (n:`{label}`) REQUIRE n.`{key}` IS UNIQUE"
+RANGE_INDEX = "CREATE RANGE INDEX `{label}_{key}_range` IF NOT EXISTS FOR (n:`{label}`) ON (n.`{key}`)"
+FULLTEXT_INDEX = "CREATE FULLTEXT INDEX `{name}` IF NOT EXISTS FOR (n:`{label}`) ON EACH [{properties}]"
+DUPLICATES = "MATCH (n:`{label}`) WHERE n.`{key}` IS NOT NULL WITH n.`{key}` AS key, count(*) AS nodes WHERE nodes > 1 RETURN count(*) AS duplicates"
+
+SHOW_INDEXES = "SHOW INDEXES YIELD name, type, labelsOrTypes, properties, state, populationPercent"
+SHOW_CONSTRAINTS = "SHOW CONSTRAINTS YIELD name, type, labelsOrTypes, properties"
+
+SCAN_OPERATORS = ("NodeByLabelScan", "AllNodesScan")
+
+
+def declare(session, dry_run=False):
+    """Creates the constraints and indexes; returns {label: number of duplicate keys} where a constraint failed."""
+    duplicates = {}
+    statements = [(label, key, CONSTRAINT.format(label=label, key=key)) for label, key in KEYS.items()]
+    statements += [
+        (label, None, FULLTEXT_INDEX.format(name=name, label=label, properties=", ".join(f"n.`{p}`" for p in properties)))
+        for name, (label, properties) in FULLTEXT.items()
+    ]
+    for label, key, statement in statements:
+        print(statement)
+        if dry_run:
+            continue
+        try:
+            session.run(statement).consume()
+        except Neo4jError as e:
+            if key is None:
+                raise
+            count = session.run(DUPLICATES.format(label=label, key=key)).single()["duplicates"]
+            if not count:
+                # No duplicates left: usually the range index from an earlier run is in the constraint's way
+                print(f"  constraint failed ({e.code}) but there are no duplicate {key} values; drop the existing "
+                      f"index (DROP INDEX `{label}_{key}_range`) and run this again to create the constraint")
+                continue
+            # Still index the property so lookups are not scans
+            duplicates[label] = count
+            print(f"  constraint failed ({e.code}); {count} duplicate {key} values; creating a range index instead")
+            session.run(RANGE_INDEX.format(label=label, key=key)).consume()
+    return duplicates
+
+
+def verify(session):
+    """Prints the state of every expected index; returns the number missing or not online."""
+    indexes = session.run(SHOW_INDEXES).data()
+    unique = {
+        (constraint["labelsOrTypes"][0], tuple(constraint["properties"]))
+        for constraint in session.run(SHOW_CONSTRAINTS).data()
+        if "UNIQUENESS" in constraint["type"] and constraint["labelsOrTypes"]
+    }
+
+    def find(label, properties, index_type):
+        for index in indexes:
+            if (index["type"] == index_type and index["labelsOrTypes"] == [label]
+                    and list(index["properties"]) == properties):
+                return index
+
+    problems = 0
+    expected = [(label, [key], "RANGE") for label, key in KEYS.items()]
+    expected += [(label, properties, "FULLTEXT") for label, properties in FULLTEXT.values()]
+    for label, properties, index_type in expected:
+        index = find(label, properties, index_type)
+        target = f"{label}({', '.join(properties)})"
+        if index is None:
+            problems += 1
+            print(f"MISSING   {index_type:<8} {target}")
+            continue
+        if index["state"] != "ONLINE":
+            problems += 1
+        state = index["state"] if index["state"] == "ONLINE" else f"{index['state']} {index['populationPercent']:.0f}%"
+        flag = " unique" if (label, tuple(properties)) in unique else ""
+        print(f"{state:<9} {index_type:<8} {target}{flag}  [{index['name']}]")
+    return problems
+
+
+def scans(plan):
+    """(operator, details) for every label / all-nodes scan in a PROFILE plan."""
+    found = []
+    stack = [plan]
+    while stack:
+        step = stack.pop()
+        operator = step.get("operatorType", "").split("@")[0]
+        if operator in SCAN_OPERATORS:
+            found.append((operator, step.get("args", {}).get("Details", "")))
+        stack.extend(step.get("children", []))
+    return found
+
+
+def _sample(session, query):
+    record = session.run(query).single()
+    return record[0] if record else None
+
+
+def hot_queries(session):
+    """(name, query, parameters) for the app's key lookups, with keys sampled from the graph."""
+    phenotype_id = _sample(session, "MATCH (p:phenotype) WHERE p.id IS NOT NULL RETURN p.id LIMIT 1")
+    if phenotype_id is not None:
+        yield "View Phenotype: load_phenotype_view", PHENOTYPE_VIEW_QUERY, {"phenotype_id": phenotype_id}
+
+    pids = {}
+    for source, label in DETAIL_LABELS.items():
+        pid = _sample(session, f"MATCH (d:`{label}`) WHERE d.PID IS NOT NULL RETURN d.PID LIMIT 1")
+        pids[label] = [] if pid is None else [pid]
+        if source in CONCEPT_LABELS:
+            detail_pid = _sample(session, f"MATCH (d:`{label}`)-[:HAS_CONCEPT]->() RETURN d.PID LIMIT 1")
+            if detail_pid is not None:
+                yield (f"View Phenotype: concept page ({label})", CONCEPT_PAGE_QUERY.format(label=label),
+                       {"detail_pid": detail_pid, "after": None, "limit": 100})
+    yield "Chatbot: find_phenotype detail lookup", DETAILS_BY_PID_QUERY, {"pids": pids}
+
+
+def profile(session):
+    """PROFILEs each hot query and prints its scans; returns the number of queries that scan."""
+    scanning = 0
+    for name, query, parameters in hot_queries(session):
+        plan = session.run(f"PROFILE {query}", parameters).consume().profile
+        found = scans(plan) if plan else []
+        if found:
+            scanning += 1
+            print(f"SCAN      {name}: " + "; ".join(f"{operator} {details}".strip() for operator, details in found))
+        else:
+            print(f"ok        {name}")
+    return scanning
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_connection_arguments(parser)
+    parser.add_argument("--dry-run", action="store_true", help="print the statements without running them")
+    parser.add_argument("--wait", type=float, default=300, help="seconds to wait for indexes to come online")
+    parser.add_argument("--no-profile", action="store_true", help="skip PROFILE of the hot queries")
+    args = parser.parse_args()
+
+    driver = connect(parser, args)
+    try:
+        with driver.session(database=args.database) as session:
+            duplicates = declare(session, args.dry_run)
+            if args.dry_run:
+                return
+
+            session.run("CALL db.awaitIndexes($timeout)", timeout=int(args.wait)).consume()
+            print("\nindexes:")
+            problems = verify(session)
+            if not args.no_profile:
+                print("\nhot queries:")
+                problems += profile(session)
+            problems += len(duplicates)
+    finally:
+        driver.close()
+
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
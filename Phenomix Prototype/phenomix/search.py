@@ -0,0 +1,173 @@
+"""
+In-memory search index over phenotype names and IDs.
+
+The index is built once per catalog load. Query words are resolved against the
+(small) vocabulary of distinct words -- exact, prefix, trigram fuzzy matches
+for typos, then words containing the query word anywhere -- and the matching
+records are combined with set operations, so a query never walks the whole
+catalog. The last tier keeps every name the original Browser's substring
+filter found ("betes" -> "Diabetes", also for queries under three letters),
+ranked after the better matches.
+"""
+import heapq
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    # Lowercase and collapse anything that is not a letter/digit to one space
+    return _NON_WORD.sub(" ", str(text).lower()).strip()
+
+
+def trigrams(word):
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+_EMPTY = frozenset()
+
+
+def _union(postings, word_ids):
+    if len(word_ids) == 1:
+        return postings[word_ids[0]]
+    return _EMPTY.union(*(postings[i] for i in word_ids))
+
+
+class SearchIndex:
+
+    def __init__(self, entries, min_similarity=0.5, fuzzy_min_length=4):
+        # entries: iterable of (id, name) in catalog order
+        self.min_similarity = min_similarity
+        self.fuzzy_min_length = fuzzy_min_length
+
+        normalized = [(normalize(record_id), normalize(name)) for record_id, name in entries]
+
+        # Records are numbered internally shortest-name-first, so a sorted set of
+        # internal numbers is already in ranking order within a match tier.
+        self.order = sorted(range(len(normalized)), key=lambda pos: (len(normalized[pos][1]), pos))
+
+        self.whole = defaultdict(list)
+        vocabulary = defaultdict(list)
+        record_ids = []
+        for rank, position in enumerate(self.order):
+            record_id, text = normalized[position]
+            for key in {record_id, text}:
+                self.whole[key].append(rank)
+            for word in set(text.split()):
+                vocabulary[word].append(rank)
+            record_ids.append((record_id, rank))
+
+        # IDs are only matched by prefix, so they stay out of the fuzzy vocabulary
+        record_ids.sort()
+        self.record_ids = [record_id for record_id, _ in record_ids]
+        self.record_id_ranks = [rank for _, rank in record_ids]
+
+        self.words = sorted(vocabulary)
+        self.postings = [frozenset(vocabulary[word]) for word in self.words]
+        # All words in one string, for substring lookups with str.find
+        self.joined_words = "\n".join(self.words)
+        self.word_starts = []
+        offset = 0
+        for word in self.words:
+            self.word_starts.append(offset)
+            offset += len(word) + 1
+        self.word_gram_counts = []
+        self.word_grams = defaultdict(list)
+        for word_id, word in enumerate(self.words):
+            grams = trigrams(word)
+            self.word_gram_counts.append(len(grams))
+            for gram in grams:
+                self.word_grams[gram].append(word_id)
+
+    @classmethod
+    def from_records(cls, records, id_key="id", name_key="phenotypes", **kwargs):
+        return cls(((record[id_key], record[name_key] or "") for record in records), **kwargs)
+
+    def __len__(self):
+        return len(self.order)
+
+    def _resolve(self, word):
+        # Vocabulary word ids matching `word` exactly, by prefix, and fuzzily
+        low = bisect_left(self.words, word)
+        high = bisect_left(self.words, word + "\uffff", low)
+        exact = [low] if low < high and self.words[low] == word else []
+        prefix = range(low + len(exact), high)
+
+        fuzzy = []
+        if len(word) >= self.fuzzy_min_length:
+            grams = trigrams(word)
+            shared = Counter()
+            for gram in grams:
+                shared.update(self.word_grams.get(gram, ()))
+            for word_id, count in shared.items():
+                if low <= word_id < high:
+                    continue
+                if 2 * count / (len(grams) + self.word_gram_counts[word_id]) >= self.min_similarity:
+                    fuzzy.append(word_id)
+        return exact, prefix, fuzzy
+
+    def _substring(self, word):
+        # Vocabulary word ids containing `word` anywhere, each found once
+        word_ids = []
+        start = self.joined_words.find(word)
+        while start >= 0:
+            word_id = bisect_right(self.word_starts, start) - 1
+            word_ids.append(word_id)
+            if word_id + 1 == len(self.words):
+                break
+            start = self.joined_words.find(word, self.word_starts[word_id + 1])
+        return word_ids
+
+    def _id_prefix(self, word):
+        low = bisect_left(self.record_ids, word)
+        high = bisect_left(self.record_ids, word + "\uffff", low)
+        return frozenset(self.record_id_ranks[low:high])
+
+    def search(self, query, limit=None):
+        """Return catalog positions ranked by relevance; all positions for an empty query."""
+        query = normalize(query)
+        if not query:
+            positions = list(range(len(self.order)))
+            return positions[:limit] if limit else positions
+
+        exact_all = strong_all = loose_all = substring_all = None
+        for word in query.split():
+            exact, prefix, fuzzy = self._resolve(word)
+            exact_docs = _union(self.postings, exact)
+            strong_docs = exact_docs | _union(self.postings, prefix) | self._id_prefix(word)
+            loose_docs = strong_docs | _union(self.postings, fuzzy)
+            substring_docs = loose_docs | _union(self.postings, self._substring(word))
+            if substring_all is None:
+                exact_all, strong_all, loose_all, substring_all = exact_docs, strong_docs, loose_docs, substring_docs
+            else:
+                exact_all &= exact_docs
+                strong_all &= strong_docs
+                loose_all &= loose_docs
+                substring_all &= substring_docs
+            if not substring_all:
+                return []
+
+        # Tiers: whole name/ID match, every word exact, every word exact or prefix, any typo match,
+        # any word containing the query word
+        whole = self.whole.get(query, [])
+        ranked = list(whole)
+        seen = set(whole)
+        for docs in (exact_all, strong_all, loose_all, substring_all):
+            docs = docs - seen
+            seen |= docs
+            if limit and len(ranked) + len(docs) > limit:
+                ranked.extend(heapq.nsmallest(limit - len(ranked), docs))
+                break
+            ranked.extend(sorted(docs))
+
+        order = self.order
+        positions = [order[rank] for rank in ranked]
+        return positions[:limit] if limit else positions
+
+
+def scan_search(records, query, name_key="phenotypes"):
+    # The original Browser filter: a case-insensitive substring scan over every record
+    return [record for record in records if query.lower() in record[name_key].lower()]
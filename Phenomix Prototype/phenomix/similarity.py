@@ -0,0 +1,209 @@
+"""
+Phenotype-to-phenotype similarity over shared concepts.
+
+Each phenotype's concept set is every concept reachable through
+(:phenotype)-[:DETAILS_ARE]->(:x_detail)-[:HAS_CONCEPT]->(:x_concept).
+Similarity is the Jaccard index of two sets:
+
+- phenotypes with up to --exact-max concepts are scored exactly, by counting
+  intersections through an inverted concept -> phenotype index;
+- larger sets are scored from MinHash signatures, with LSH banding to pick
+  the candidates, so a few huge sets do not dominate the build.
+
+The top-k neighbours of every phenotype are written to a JSON file, which the
+Chatbot loads for its "Related Phenotypes" lookups.
+
+    python -m phenomix.similarity --uri neo4j+s://... --password ... [--output phenotype_similarity.json]
+"""
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from phenomix.cli import add_connection_arguments, connect
+
+DEFAULT_PATH = os.getenv("PHENOMIX_SIMILARITY_PATH", "phenotype_similarity.json")
+
+# Concepts are qualified by label: CIDs are only unique within one source
+CONCEPT_SETS_BATCH = """
+MATCH (p:phenotype)
+WHERE $after IS NULL OR p.id > $after
+WITH p ORDER BY p.id LIMIT $limit
+OPTIONAL MATCH (p)-[:DETAILS_ARE]->(d)-[:HAS_CONCEPT]->(c)
+RETURN p.id AS id, p.phenotypes AS name,
+       collect(DISTINCT CASE WHEN c IS NULL THEN NULL ELSE labels(c)[0] + ':' + c.CID END) AS concepts
+ORDER BY id
+"""
+
+_PRIME = (1 << 31) - 1
+
+
+def fetch_concept_sets(driver, database="neo4j", batch_size=500):
+    """Yields (phenotype id, name, [concept keys]) in id order."""
+    after = None
+    with driver.session(database=database) as session:
+        while True:
+            batch = session.run(CONCEPT_SETS_BATCH, after=after, limit=batch_size).data()
+            if not batch:
+                return
+            for record in batch:
+                yield record["id"], record["name"], record["concepts"]
+            after = batch[-1]["id"]
+
+
+def minhash_signatures(sets, num_perm=128, seed=0, chunk=65536):
+    # sets: list of int arrays. One row per set; empty sets get all-max rows.
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+    signatures = np.full((len(sets), num_perm), _PRIME, dtype=np.uint64)
+    for row, members in enumerate(sets):
+        for offset in range(0, len(members), chunk):
+            values = members[offset:offset + chunk].astype(np.uint64)[None, :]
+            hashed = (a * values + b) % _PRIME
+            np.minimum(signatures[row], hashed.min(axis=1), out=signatures[row])
+    return signatures
+
+
+def lsh_candidates(signatures, rows, bands):
+    """For each row of signatures, the set of other rows sharing at least one LSH band."""
+    candidates = defaultdict(set)
+    for band in range(bands):
+        buckets = defaultdict(list)
+        band_values = signatures[:, band * rows:(band + 1) * rows]
+        for index, values in enumerate(band_values):
+            buckets[values.tobytes()].append(index)
+        for members in buckets.values():
+            if 1 < len(members):
+                for index in members:
+                    candidates[index].update(members)
+    for index, members in candidates.items():
+        members.discard(index)
+    return candidates
+
+
+def build_similarity(concept_sets, top_k=20, exact_max=5000, num_perm=128, bands=32, min_score=0.0):
+    """
+    concept_sets: list of concept-key collections, one per phenotype.
+    Returns, per phenotype, up to top_k (other index, jaccard) pairs, best first.
+    """
+    vocabulary = {}
+    sets = [np.array(sorted({vocabulary.setdefault(key, len(vocabulary)) for key in keys}), dtype=np.int64)
+            for keys in concept_sets]
+    sizes = np.array([len(members) for members in sets], dtype=np.int64)
+    count = len(sets)
+
+    # Inverted index: concept -> phenotypes, as one CSR array pair
+    owners = np.repeat(np.arange(count), sizes)
+    concepts = np.concatenate(sets) if count else np.array([], dtype=np.int64)
+    order = np.argsort(concepts, kind="stable")
+    postings = owners[order]
+    starts = np.searchsorted(concepts[order], np.arange(len(vocabulary) + 1))
+
+    scores = [dict() for _ in range(count)]
+
+    def keep(left, right, score):
+        if score > min_score:
+            scores[left][right] = score
+            scores[right][left] = score
+
+    large = [index for index in range(count) if sizes[index] > exact_max]
+    for index in range(count):
+        if sizes[index] == 0 or sizes[index] > exact_max:
+            continue
+        # Count only the phenotypes sharing a concept, not all `count` of them
+        shared = np.concatenate([postings[starts[c]:starts[c + 1]] for c in sets[index]])
+        others, intersections = np.unique(shared, return_counts=True)
+        others, intersections = others[others != index], intersections[others != index]
+        jaccard = intersections / (sizes[index] + sizes[others] - intersections)
+        if len(others) > top_k:
+            best = np.argpartition(-jaccard, top_k)[:top_k]
+            others, jaccard = others[best], jaccard[best]
+        for other, score in zip(others.tolist(), jaccard.tolist()):
+            keep(index, other, score)
+
+    if large:
+        rows = num_perm // bands
+        signatures = minhash_signatures(sets, num_perm=rows * bands)
+        candidates = lsh_candidates(signatures, rows, bands)
+        for index in large:
+            for other in candidates.get(index, ()):
+                # Pairs already scored exactly keep the exact value
+                if sizes[other] and other not in scores[index]:
+                    keep(index, other, float(np.mean(signatures[index] == signatures[other])))
+
+    return [sorted(neighbours.items(), key=lambda item: -item[1])[:top_k] for neighbours in scores]
+
+
+class SimilarityIndex:
+
+    def __init__(self, names, related):
+        self.names = names        # {phenotype id: name}
+        self.related = related    # {phenotype id: [[other id, score], ...]}, best first
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["names"], data["related"])
+
+    def save(self, path, **metadata):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({**metadata, "names": self.names, "related": self.related}, f)
+        os.replace(tmp_path, path)
+
+    def lookup(self, phenotype_ids, k=10):
+        """Top-k (id, name, score) related to any of phenotype_ids, excluding them; best score wins."""
+        exclude = set(phenotype_ids)
+        best = {}
+        for phenotype_id in phenotype_ids:
+            for other, score in self.related.get(phenotype_id, ()):
+                if other not in exclude and score > best.get(other, 0.0):
+                    best[other] = score
+        ranked = sorted(best.items(), key=lambda item: -item[1])[:k]
+        return [(other, self.names.get(other, other), score) for other, score in ranked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_connection_arguments(parser)
+    parser.add_argument("--output", default=DEFAULT_PATH, help="index file (default: $PHENOMIX_SIMILARITY_PATH)")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--exact-max", type=int, default=5000, help="largest concept set scored exactly")
+    parser.add_argument("--num-perm", type=int, default=128, help="MinHash permutations")
+    parser.add_argument("--bands", type=int, default=32, help="LSH bands (num-perm / bands rows each)")
+    parser.add_argument("--min-score", type=float, default=0.0)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    driver = connect(parser, args)
+    start = time.perf_counter()
+    try:
+        ids, names, concept_sets = [], {}, []
+        for phenotype_id, name, concepts in fetch_concept_sets(driver, args.database, args.batch_size):
+            ids.append(phenotype_id)
+            names[phenotype_id] = name
+            concept_sets.append(concepts)
+    finally:
+        driver.close()
+    print(f"fetched {len(ids)} phenotypes in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    neighbours = build_similarity(concept_sets, args.top_k, args.exact_max, args.num_perm, args.bands, args.min_score)
+    related = {
+        ids[index]: [[ids[other], round(score, 4)] for other, score in pairs]
+        for index, pairs in enumerate(neighbours) if pairs
+    }
+    SimilarityIndex(names, related).save(
+        args.output, built_at=time.time(), top_k=args.top_k, exact_max=args.exact_max,
+        num_perm=args.num_perm, bands=args.bands
+    )
+    print(f"scored in {time.perf_counter() - start:.1f}s; {len(related)} phenotypes with neighbours -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
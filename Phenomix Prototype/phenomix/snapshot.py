@@ -0,0 +1,238 @@
+"""
+Local read replica of the phenotype catalog.
+
+`python -m phenomix.snapshot` exports every phenotype, detail and concept,
+along with their DETAILS_ARE / HAS_CONCEPT relationships, into one SQLite
+file. Each table is keyed on id / (label, PID) / (label, CID). The export is
+written to a temporary file and swapped in when complete, so pages never see
+a half-written snapshot.
+
+With PHENOMIX_SNAPSHOT_PATH set, the Browser and View Phenotype pages read
+from that file instead of Neo4j. The Chatbot still runs its Cypher against
+Neo4j.
+
+    python -m phenomix.snapshot --uri neo4j+s://... --password ... --output phenomix.sqlite
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from phenomix.cli import add_connection_arguments, connect, keyset_batches
+from phenomix.details import DETAIL_SOURCES
+from phenomix.sources import CONCEPT_LABELS, DETAIL_LABELS
+
+SNAPSHOT_PATH = os.getenv("PHENOMIX_SNAPSHOT_PATH")
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE phenotype (id PRIMARY KEY, props TEXT NOT NULL);
+CREATE TABLE detail (label TEXT, pid, props TEXT NOT NULL, PRIMARY KEY (label, pid));
+CREATE TABLE concept (label TEXT, cid, props TEXT NOT NULL, PRIMARY KEY (label, cid));
+CREATE TABLE details_are (phenotype_id, label TEXT, pid, PRIMARY KEY (phenotype_id, label, pid));
+CREATE TABLE has_concept (detail_label TEXT, pid, concept_label TEXT, cid, PRIMARY KEY (detail_label, pid, cid));
+"""
+
+EXPORT_PHENOTYPES = """
+MATCH (p:phenotype)
+WHERE p.id IS NOT NULL AND ($after IS NULL OR p.id > $after)
+WITH p ORDER BY p.id LIMIT $limit
+OPTIONAL MATCH (p)-[:DETAILS_ARE]->(d)
+RETURN p.id AS key, properties(p) AS props,
+       collect(CASE WHEN d IS NULL THEN NULL
+               ELSE [[label IN labels(d) WHERE label IN $detail_labels][0], d.PID] END) AS details
+ORDER BY key
+"""
+
+EXPORT_DETAILS = """
+MATCH (d:`{label}`)
+WHERE d.PID IS NOT NULL AND ($after IS NULL OR d.PID > $after)
+WITH d ORDER BY d.PID LIMIT $limit
+OPTIONAL MATCH (d)-[:HAS_CONCEPT]->(c)
+RETURN d.PID AS key, properties(d) AS props, collect(c.CID) AS concepts
+ORDER BY key
+"""
+
+EXPORT_CONCEPTS = """
+MATCH (c:`{label}`)
+WHERE c.CID IS NOT NULL AND ($after IS NULL OR c.CID > $after)
+RETURN c.CID AS key, properties(c) AS props
+ORDER BY key
+LIMIT $limit
+"""
+
+
+def _dumps(props):
+    return json.dumps(props, default=str)
+
+
+def export_snapshot(driver, path, database="neo4j", batch_size=2000, source=None):
+    """Writes a snapshot to path (atomically); returns {table: rows}."""
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    db.executescript(SCHEMA)
+    counts = dict.fromkeys(["phenotype", "detail", "concept", "details_are", "has_concept"], 0)
+
+    def insert(table, rows):
+        if rows:
+            db.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+            counts[table] += len(rows)
+
+    with driver.session(database=database) as session:
+        start = time.perf_counter()
+        detail_labels = list(DETAIL_LABELS.values())
+        for batch in keyset_batches(session, EXPORT_PHENOTYPES, batch_size, detail_labels=detail_labels):
+            insert("phenotype", [(record["key"], _dumps(record["props"])) for record in batch])
+            insert("details_are", [
+                (record["key"], label, pid) for record in batch for label, pid in record["details"] if label
+            ])
+        print(f"phenotype: {counts['phenotype']} nodes in {time.perf_counter() - start:.1f}s")
+
+        for source, label in DETAIL_LABELS.items():
+            start = time.perf_counter()
+            concept_label = CONCEPT_LABELS.get(source)
+            for batch in keyset_batches(session, EXPORT_DETAILS.format(label=label), batch_size):
+                insert("detail", [(label, record["key"], _dumps(record["props"])) for record in batch])
+                insert("has_concept", [
+                    (label, record["key"], concept_label, cid) for record in batch for cid in record["concepts"]
+                ])
+            print(f"{label}: {time.perf_counter() - start:.1f}s")
+
+        for label in CONCEPT_LABELS.values():
+            start = time.perf_counter()
+            for batch in keyset_batches(session, EXPORT_CONCEPTS.format(label=label), batch_size):
+                insert("concept", [(label, record["key"], _dumps(record["props"])) for record in batch])
+            print(f"{label}: {time.perf_counter() - start:.1f}s")
+
+    meta = {"exported_at": time.time(), "source": source, **{f"{table}_rows": rows for table, rows in counts.items()}}
+    db.executemany("INSERT INTO meta VALUES (?, ?)", [(key, json.dumps(value)) for key, value in meta.items()])
+    db.commit()
+    db.execute("ANALYZE")
+    db.close()
+    os.replace(tmp_path, path)
+    return counts
+
+
+class Snapshot:
+    # Read-only access to an exported snapshot; one connection per thread
+
+    def __init__(self, path):
+        self.path = path
+        self.version = os.path.getmtime(path)
+        self._local = threading.local()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.db = db
+        return db
+
+    def info(self):
+        return {key: json.loads(value) for key, value in self._db().execute("SELECT key, value FROM meta")}
+
+    def phenotypes(self):
+        return [json.loads(props) for (props,) in self._db().execute("SELECT props FROM phenotype ORDER BY id")]
+
+    def concepts(self, label):
+        return (json.loads(props) for (props,) in self._db().execute(
+            "SELECT props FROM concept WHERE label = ? ORDER BY cid", (label,)))
+
+    def load_phenotype_view(self, phenotype_id):
+        # Same shape as phenomix.details.load_phenotype_view
+        db = self._db()
+        row = db.execute("SELECT props FROM phenotype WHERE id = ?", (phenotype_id,)).fetchone()
+        if row is None:
+            return None
+        props = json.loads(row[0])
+
+        sources = {}
+        details = db.execute("""
+            SELECT a.label, d.props,
+                   (SELECT count(*) FROM has_concept h WHERE h.detail_label = a.label AND h.pid = a.pid)
+            FROM details_are a JOIN detail d ON d.label = a.label AND d.pid = a.pid
+            WHERE a.phenotype_id = ?
+        """, (phenotype_id,))
+        for label, detail, concept_count in details:
+            sources.setdefault(DETAIL_SOURCES[label], []).append({
+                "detail": json.loads(detail),
+                "concept_count": concept_count
+            })
+
+        return {"name": props.get("phenotypes"), "id": props.get("id"), "sources": sources}
+
+    def fetch_concepts_page(self, label, detail_pid, after=None, limit=100):
+        # Whole concept nodes, like unmigrated ones from CONCEPT_PAGE_QUERY;
+        # concepts_frame projects their lists onto the detail
+        rows = self._db().execute("""
+            SELECT c.props FROM has_concept h JOIN concept c ON c.label = h.concept_label AND c.cid = h.cid
+            WHERE h.detail_label = ? AND h.pid = ? AND (? IS NULL OR h.cid > ?)
+            ORDER BY h.cid LIMIT ?
+        """, (label, detail_pid, after, after, limit))
+        return [json.loads(props) for (props,) in rows]
+
+    def export_concepts(self, detail_label, concept_label, phenotype_ids):
+        # (phenotype id, name, detail PID, whole concept) rows for phenomix.export, read lazily off one cursor
+        rows = self._db().execute("""
+            SELECT a.phenotype_id, json_extract(p.props, '$.phenotypes'), a.pid, c.props
+            FROM details_are a
+            JOIN phenotype p ON p.id = a.phenotype_id
+            JOIN has_concept h ON h.detail_label = a.label AND h.pid = a.pid
+            JOIN concept c ON c.label = h.concept_label AND c.cid = h.cid
+            WHERE a.label = ? AND c.label = ? AND a.phenotype_id IN (SELECT value FROM json_each(?))
+        """, (detail_label, concept_label, json.dumps(list(phenotype_ids))))
+        return ((phenotype_id, name, pid, json.loads(props)) for phenotype_id, name, pid, props in rows)
+
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+def get_snapshot(path=SNAPSHOT_PATH):
+    """The snapshot at path (default $PHENOMIX_SNAPSHOT_PATH), reopened when the file changes; None if unset."""
+    global _snapshot
+    if not path:
+        return None
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"snapshot {path} does not exist; create it with python -m phenomix.snapshot")
+    with _lock:
+        if _snapshot is None or _snapshot.path != path or _snapshot.version != os.path.getmtime(path):
+            _snapshot = Snapshot(path)
+        return _snapshot
+
+
+def get_snapshot_or_warn(fallback="Reading from Neo4j instead."):
+    """get_snapshot() for the pages: a configured but missing file shows a warning and gives None."""
+    try:
+        return get_snapshot()
+    except FileNotFoundError as e:
+        # A missing snapshot should not take the page down
+        import streamlit as st
+        st.warning(f"{e}. {fallback}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_connection_arguments(parser)
+    parser.add_argument("--output", default=SNAPSHOT_PATH or "phenomix.sqlite",
+                        help="snapshot file (default: $PHENOMIX_SNAPSHOT_PATH or phenomix.sqlite)")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    driver = connect(parser, args)
+    start = time.perf_counter()
+    try:
+        counts = export_snapshot(driver, args.output, args.database, args.batch_size, source=args.uri)
+    finally:
+        driver.close()
+    print(f"wrote {args.output} in {time.perf_counter() - start:.1f}s: "
+          + ", ".join(f"{rows} {table}" for table, rows in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
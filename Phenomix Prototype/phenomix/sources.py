@@ -0,0 +1,69 @@
+"""
+Source databases a phenotype is defined in.
+
+A phenotype ID encodes its sources positionally (e.g. "SHCOP0001" is in all
+five, "XHXOX0002" only in HDRUK and OHDSI). That is decoded once per record into
+a bitmask so membership tests and facet counts become bitwise operations.
+"""
+import numpy as np
+
+SOURCES = ["Sentinel", "HDRUK", "CPRD", "OHDSI", "PheKB"]
+SOURCE_CODES = "shcop"
+SOURCE_BITS = {source: 1 << i for i, source in enumerate(SOURCES)}
+
+PID_PROPERTIES = {
+    "Sentinel": "sentinel_PID",
+    "HDRUK": "hdruk_PID",
+    "CPRD": "cprd_PID",
+    "OHDSI": "ohdsi_PID",
+    "PheKB": "phekb_PID"
+}
+DETAIL_LABELS = {source: f"{source.lower()}_detail" for source in SOURCES}
+# HDRUK has no concept nodes
+CONCEPT_LABELS = {source: f"{source.lower()}_concept" for source in SOURCES if source != "HDRUK"}
+
+TAG_COLORS = {
+    "Sentinel": "darkblue",
+    "HDRUK": "teal",
+    "CPRD": "blue",
+    "OHDSI": "orange",
+    "PheKB": "green"
+}
+
+
+def source_mask(record_id):
+    mask = 0
+    for i, code in enumerate(SOURCE_CODES):
+        if len(record_id) > i and record_id[i].lower() == code:
+            mask |= 1 << i
+    return mask
+
+
+def mask_of(sources):
+    mask = 0
+    for source in sources:
+        mask |= SOURCE_BITS[source]
+    return mask
+
+
+def sources_of(mask):
+    return [source for source in SOURCES if mask & SOURCE_BITS[source]]
+
+
+def source_masks(record_ids):
+    # One uint8 per record: the precomputed source column of the catalog
+    return np.fromiter((source_mask(record_id) for record_id in record_ids), dtype=np.uint8, count=len(record_ids))
+
+
+def facet_counts(masks):
+    return {source: int(np.count_nonzero(masks & bit)) for source, bit in SOURCE_BITS.items()}
+
+
+def facet_filter(masks, sources, match="all"):
+    # Boolean array: records in all (or any) of the given sources
+    wanted = mask_of(sources)
+    if not wanted:
+        return np.ones(len(masks), dtype=bool)
+    if match == "all":
+        return (masks & wanted) == wanted
+    return (masks & wanted) != 0
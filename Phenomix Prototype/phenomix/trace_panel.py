@@ -0,0 +1,85 @@
+"""
+Sidebar debug panel for phenomix.tracing.
+
+Each page calls `show_trace_panel(trace)` last. The rerun's summary is kept in
+the session (the last PHENOMIX_TRACE_HISTORY reruns, across pages); with the
+"Show query trace" toggle on, the panel shows a waterfall of the selected
+rerun's Neo4j queries and chat calls, their rows and tokens, and offers the
+traces and the process-wide latency histograms as JSON downloads.
+"""
+import json
+import os
+from collections import deque
+
+import pandas as pd
+import streamlit as st
+
+from phenomix.tracing import export_histograms
+
+HISTORY = int(os.getenv("PHENOMIX_TRACE_HISTORY", 20))
+
+KIND_LABELS = {"neo4j": "Neo4j", "llm": "Chat API"}
+
+
+def _waterfall(spans):
+    df = pd.DataFrame(spans)
+    df["step"] = [f"{i + 1:>2} {KIND_LABELS.get(kind, kind)} {detail or name}"
+                  for i, (kind, name, detail) in enumerate(zip(df["kind"], df["name"], df["detail"]))]
+    df["end_ms"] = df["start_ms"] + df["duration_ms"]
+    df["first_at_ms"] = df["start_ms"] + df["first_ms"]
+    encoding = {
+        "y": {"field": "step", "type": "nominal", "sort": None, "title": None, "axis": {"labelLimit": 320}},
+        "color": {"field": "kind", "type": "nominal", "title": None},
+        "tooltip": [
+            {"field": "detail"}, {"field": "name"}, {"field": "duration_ms", "format": ".1f"},
+            {"field": "first_ms", "format": ".1f"}, {"field": "rows"}, {"field": "tokens_in"},
+            {"field": "tokens_out"}, {"field": "thread"}, {"field": "error"},
+        ],
+    }
+    st.vega_lite_chart(df, {
+        "height": max(60, 22 * len(df)),
+        "layer": [
+            {"mark": "bar", "encoding": {**encoding, "x": {"field": "start_ms", "type": "quantitative", "title": "ms"},
+                                         "x2": {"field": "end_ms"}}},
+            # Where the first response / chunk arrived
+            {"mark": {"type": "tick", "color": "black"},
+             "encoding": {"y": encoding["y"], "x": {"field": "first_at_ms", "type": "quantitative"}}},
+        ],
+    }, width="stretch")
+
+
+def show_trace_panel(trace):
+    trace.finish()
+    history = st.session_state.setdefault("trace_history", deque(maxlen=HISTORY))
+    history.append(trace.summary())
+
+    if not st.sidebar.toggle("Show query trace", key="trace_panel"):
+        return
+
+    with st.sidebar.expander("Query trace", expanded=True):
+        reruns = list(reversed(history))
+        selected = st.selectbox(
+            "Rerun:", range(len(reruns)), key="trace_rerun",
+            format_func=lambda i: f"{reruns[i]['page']} · {reruns[i]['duration_ms']:.0f} ms"
+                                  + (" (this one)" if i == 0 else f" ({i} back)"),
+        )
+        summary = reruns[selected]
+        totals = summary["totals"]
+        neo4j = totals.get("neo4j", {})
+        llm = totals.get("llm", {})
+        st.caption(
+            f"{summary['duration_ms']:.0f} ms in total · "
+            f"{neo4j.get('calls', 0)} queries ({neo4j.get('ms', 0):.0f} ms, {neo4j.get('rows', 0)} rows) · "
+            f"{llm.get('calls', 0)} chat calls ({llm.get('ms', 0):.0f} ms, "
+            f"{llm.get('tokens_in', 0)} tokens in, {llm.get('tokens_out', 0)} out)"
+        )
+        if summary["spans"]:
+            _waterfall(summary["spans"])
+            st.dataframe(pd.DataFrame(summary["spans"]).drop(columns=["start_ms"]), hide_index=True)
+        else:
+            st.write("No queries or chat calls in this rerun.")
+
+        st.download_button("Download traces (JSON)", json.dumps(list(history), indent=2),
+                           file_name="phenomix_traces.json", mime="application/json")
+        st.download_button("Download latency histograms (JSON)", json.dumps(export_histograms(), indent=2),
+                           file_name="phenomix_latency_histograms.json", mime="application/json")
@@ -0,0 +1,345 @@
+"""
+Per-rerun tracing of Neo4j queries and chat API calls.
+
+A page calls `begin(page)` at the top of every rerun. Until the next
+begin(), every query run through the shared driver's sessions
+(phenomix.db) and every chat.completions.create made through
+phenomix.llm.get_client() is recorded as a Span on that rerun's Trace:
+
+    Neo4j  query text hash, first line, rows read, seconds to the first
+           response and until the result was read to the end
+    chat   model, streamed or not, tokens in / out, seconds to the first
+           chunk and in total
+
+Token counts come from the API's usage figures (requested for streamed calls
+too); when a client does not report them they are estimated from the text
+and `estimated` is set on the span.
+
+Worker threads started with phenomix.llm.map_concurrent record into the
+caller's trace. Every finished span is also added to process-wide latency
+histograms, keyed by page, kind, query hash / model and detail, which
+`export_histograms()` returns. Keep PHENOMIX_TRACE_BUCKETS_MS (comma
+separated bucket bounds in milliseconds) fixed between exports that will be
+compared.
+"""
+import contextvars
+import hashlib
+import os
+import threading
+import time
+
+BUCKETS_MS = [
+    float(bound) for bound in os.getenv("PHENOMIX_TRACE_BUCKETS_MS", "5,10,25,50,100,250,500,1000,2500,5000,10000,30000").split(",")
+]
+
+_current = contextvars.ContextVar("phenomix_trace", default=None)
+
+
+def query_hash(text):
+    return hashlib.sha1(" ".join(text.split()).encode()).hexdigest()[:12]
+
+
+def _first_line(text, width=80):
+    line = next((line.strip() for line in text.splitlines() if line.strip()), "")
+    return line if len(line) <= width else line[:width - 1] + "…"
+
+
+class Span:
+
+    def __init__(self, trace, kind, name, detail):
+        self.trace = trace
+        self.kind = kind
+        self.name = name
+        self.detail = detail
+        self.thread = threading.current_thread().name
+        self.start = time.perf_counter()
+        self.first = None
+        self.end = None
+        self.rows = None
+        self.tokens_in = None
+        self.tokens_out = None
+        self.estimated = False
+        self.error = None
+
+    def first_response(self):
+        if self.first is None:
+            self.first = time.perf_counter()
+
+    def finish(self, error=None):
+        if self.end is not None:
+            return
+        self.end = time.perf_counter()
+        self.first_response()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _histograms.add(self.trace.page, self.kind, self.name, self.detail, self.end - self.start)
+
+    def to_dict(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "detail": self.detail,
+            "thread": self.thread,
+            "start_ms": 1e3 * (self.start - self.trace.start),
+            "first_ms": 1e3 * ((self.first or end) - self.start),
+            "duration_ms": 1e3 * (end - self.start),
+            "finished": self.end is not None,
+            "rows": self.rows,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "estimated": self.estimated,
+            "error": self.error,
+        }
+
+
+class Trace:
+    # Spans recorded during one rerun of one page
+
+    def __init__(self, page):
+        self.page = page
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.end = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def span(self, kind, name, detail):
+        span = Span(self, kind, name, detail)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.perf_counter()
+
+    def summary(self):
+        spans = [span.to_dict() for span in self.spans]
+        totals = {}
+        for span in spans:
+            kind = totals.setdefault(span["kind"], {"calls": 0, "ms": 0.0, "rows": 0, "tokens_in": 0, "tokens_out": 0})
+            kind["calls"] += 1
+            kind["ms"] += span["duration_ms"]
+            for key in ("rows", "tokens_in", "tokens_out"):
+                kind[key] += span[key] or 0
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "page": self.page,
+            "started_at": self.started_at,
+            "duration_ms": 1e3 * (end - self.start),
+            "totals": totals,
+            "spans": spans,
+        }
+
+
+def begin(page):
+    """Starts a new trace for this rerun of page and returns it."""
+    trace = Trace(page)
+    _current.set(trace)
+    return trace
+
+
+def current():
+    return _current.get()
+
+
+def start_span(kind, name, detail=""):
+    # None when no page has begun a trace in this context
+    trace = _current.get()
+    return trace.span(kind, name, detail) if trace is not None else None
+
+
+# Neo4j
+
+class TracedResult:
+    # Counts the rows read from a neo4j Result and finishes the span when the
+    # result is exhausted or consumed
+
+    def __init__(self, result, span):
+        self._result = result
+        self._span = span
+        span.rows = 0
+
+    def __iter__(self):
+        try:
+            for record in self._result:
+                self._span.rows += 1
+                yield record
+        except Exception as e:
+            self._span.finish(e)
+            raise
+        self._span.finish()
+
+    def data(self, *keys):
+        records = self._result.data(*keys)
+        self._span.rows += len(records)
+        self._span.finish()
+        return records
+
+    def single(self, strict=False):
+        record = self._result.single(strict) if strict else self._result.single()
+        self._span.rows += record is not None
+        self._span.finish()
+        return record
+
+    def consume(self):
+        summary = self._result.consume()
+        self._span.finish()
+        return summary
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+
+def traced_run(run, query, parameters=None, **kwargs):
+    """run(query, parameters, **kwargs) (a session's run), recorded on the current trace."""
+    text = getattr(query, "text", query)
+    span = start_span("neo4j", query_hash(text), _first_line(text))
+    if span is None:
+        return run(query, parameters, **kwargs)
+    try:
+        result = run(query, parameters, **kwargs)
+    except Exception as e:
+        span.finish(e)
+        raise
+    span.first_response()
+    return TracedResult(result, span)
+
+
+# Chat API
+
+def _estimate_tokens(text):
+    # About four characters per token for English text
+    return max(1, len(text) // 4) if text else 0
+
+
+def _message_text(messages):
+    return "".join(str(message.get("content", "")) for message in messages)
+
+
+class _TracedCompletions:
+
+    def __init__(self, completions):
+        self._completions = completions
+
+    def create(self, *args, **kwargs):
+        # Named by model; the system prompt's first sentence says which prompt it was
+        messages = kwargs.get("messages", ())
+        purpose = _first_line(str(messages[0].get("content", "")).strip().split(".")[0], 60) if messages else ""
+        span = start_span("llm", kwargs.get("model", "?"), purpose + (" (stream)" if kwargs.get("stream") else ""))
+        if span is None:
+            return self._completions.create(*args, **kwargs)
+        if kwargs.get("stream"):
+            # Streamed responses only report usage when asked, in a final chunk with no choices
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        try:
+            response = self._completions.create(*args, **kwargs)
+        except Exception as e:
+            span.finish(e)
+            raise
+        prompt = _message_text(messages)
+        if kwargs.get("stream"):
+            return self._stream(response, span, prompt)
+        span.first_response()
+        choices = getattr(response, "choices", None) or []
+        self._usage(span, getattr(response, "usage", None), prompt, choices[0].message.content if choices else "")
+        span.finish()
+        return response
+
+    @staticmethod
+    def _usage(span, usage, prompt, text):
+        if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+            span.tokens_in = usage.prompt_tokens
+            span.tokens_out = usage.completion_tokens
+        else:
+            span.tokens_in = _estimate_tokens(prompt)
+            span.tokens_out = _estimate_tokens(text)
+            span.estimated = True
+
+    def _stream(self, response, span, prompt):
+        parts, usage = [], None
+        try:
+            for chunk in response:
+                span.first_response()
+                usage = getattr(chunk, "usage", None) or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                yield chunk
+        except Exception as e:
+            span.finish(e)
+            raise
+        self._usage(span, usage, prompt, "".join(parts))
+        span.finish()
+
+    def __getattr__(self, name):
+        return getattr(self._completions, name)
+
+
+class _TracedChat:
+
+    def __init__(self, chat):
+        self._chat = chat
+        self.completions = _TracedCompletions(chat.completions)
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+class TracedClient:
+    # Wraps an OpenAI client so client.chat.completions.create is traced
+
+    def __init__(self, client):
+        self._client = client
+        self.chat = _TracedChat(client.chat)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+# Aggregated latency histograms
+
+class Histograms:
+
+    def __init__(self, bounds_ms=BUCKETS_MS):
+        self.bounds_ms = list(bounds_ms)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def add(self, page, kind, name, detail, seconds):
+        ms = 1e3 * seconds
+        bucket = next((i for i, bound in enumerate(self.bounds_ms) if ms <= bound), len(self.bounds_ms))
+        with self._lock:
+            series = self._series.get((page, kind, name, detail))
+            if series is None:
+                series = self._series[(page, kind, name, detail)] = {
+                    "count": 0, "sum_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(self.bounds_ms) + 1)
+                }
+            series["count"] += 1
+            series["sum_ms"] += ms
+            series["max_ms"] = max(series["max_ms"], ms)
+            series["buckets"][bucket] += 1
+
+    def export(self):
+        with self._lock:
+            series = [
+                {"page": page, "kind": kind, "name": name, "detail": detail, **values, "buckets": list(values["buckets"])}
+                for (page, kind, name, detail), values in sorted(self._series.items())
+            ]
+        return {"bounds_ms": self.bounds_ms + ["inf"], "exported_at": time.time(), "series": series}
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+_histograms = Histograms()
+
+
+def export_histograms():
+    """Process-wide latency histograms: {"bounds_ms", "exported_at", "series": [...]}; bucket i counts calls <= bounds_ms[i]."""
+    return _histograms.export()
+
+
+def clear_histograms():
+    _histograms.clear()
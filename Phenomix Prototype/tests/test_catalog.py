@@ -0,0 +1,37 @@
+import numpy as np
+
+from benchmarks.synthetic import SyntheticGraph
+from phenomix import catalog as catalog_module
+from phenomix.catalog import Catalog
+
+
+def test_search_is_cached_per_normalized_query(monkeypatch):
+    catalog = Catalog(SyntheticGraph(200).phenotypes)
+    calls = []
+    search = catalog.index.search
+    monkeypatch.setattr(catalog.index, "search", lambda query, limit=None: calls.append(query) or search(query, limit))
+
+    positions = catalog.search("Asthma")
+    assert list(positions) == search("asthma")
+    assert catalog.search("  ASTHMA ") is positions
+    assert list(catalog.search("asthma", limit=3)) == list(positions[:3])
+    assert calls == ["asthma"]
+    assert not positions.flags.writeable
+
+
+def test_search_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(catalog_module, "SEARCH_CACHE_SIZE", 2)
+    catalog = Catalog(SyntheticGraph(50).phenotypes)
+    first = catalog.search("a")
+    catalog.search("b")
+    catalog.search("c")
+    assert len(catalog._searches) == 2
+    assert catalog.search("a") is not first
+    assert np.array_equal(catalog.search("a"), first)
+
+
+def test_filter_without_sources_keeps_positions():
+    catalog = Catalog(SyntheticGraph(50).phenotypes)
+    positions = catalog.search("")
+    assert catalog.filter(positions, []) is positions
+    assert len(catalog.filter(positions, ["CPRD"])) == catalog.facet_counts(positions)["CPRD"]
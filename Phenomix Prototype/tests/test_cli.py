@@ -0,0 +1,28 @@
+from phenomix.cli import keyset_batches
+
+
+class Result:
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def data(self):
+        return self.rows
+
+
+class Session:
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.calls = []
+
+    def run(self, query, after=None, limit=None, **parameters):
+        self.calls.append((after, parameters))
+        return Result([{"key": key} for key in self.keys if after is None or key > after][:limit])
+
+
+def test_keyset_batches():
+    session = Session(["a", "b", "c", "d", "e"])
+    batches = list(keyset_batches(session, "query", 2, label="x"))
+    assert [[row["key"] for row in batch] for batch in batches] == [["a", "b"], ["c", "d"], ["e"]]
+    assert session.calls == [(None, {"label": "x"}), ("b", {"label": "x"}), ("d", {"label": "x"}), ("e", {"label": "x"})]
@@ -0,0 +1,80 @@
+import pytest
+
+from phenomix.code_index import CodeIndex, build_code_index, concept_codes, normalize_code, normalize_system
+
+
+@pytest.mark.parametrize("code, system, expected", [
+    ("250.00", "ICD9CM", "25000"),
+    ("250.0", "ICD9CM", "2500"),
+    ("250", "ICD9CM", "250"),
+    ("E11.9", "ICD10", "E119"),
+    ("1371.", "READ", "1371."),
+    (" c10e. ", "READ", "C10E."),
+    ("1234.0", "MEDCODE", "1234"),
+    (1234.0, "MEDCODE", "1234"),
+    (44054006.0, "SNOMED", "44054006"),
+    ("201826", "OMOP", "201826"),
+    (None, "READ", None),
+    (float("nan"), "MEDCODE", None),
+    ("nan", "READ", None),
+    ("", "ICD10", None),
+])
+def test_normalize_code(code, system, expected):
+    assert normalize_code(code, system) == expected
+
+
+def test_normalize_system():
+    assert normalize_system("ICD-10-CM") == "ICD10CM"
+    assert normalize_system("SNOMED CT") == "SNOMED"
+    assert normalize_system("") is None
+
+
+def test_concept_codes_follow_pids():
+    # Lists aligned with PIDs tie each code to its detail; legacy string lists are parsed
+    props = {"CID": "C1", "PIDs": ["A", "B"], "medcode": [1.0, 2.0], "read_code": '["x1", "y2"]',
+             "snomedctconceptid": 99}
+    codes = set(concept_codes("cprd_concept", props))
+    assert codes == {
+        ("A", "MEDCODE", "1"), ("B", "MEDCODE", "2"),
+        ("A", "READ", "X1"), ("B", "READ", "Y2"),
+        ("A", "SNOMED", "99"), ("B", "SNOMED", "99"),
+    }
+
+
+def test_concept_codes_system_per_pid():
+    props = {"CID": "S1", "PIDs": ["A", "B"], "code": "250.00", "code_type": ["ICD9", "ICD-10"]}
+    assert set(concept_codes("sentinel_concept", props)) == {("A", "ICD9", "25000"), ("B", "ICD10", "25000")}
+
+
+@pytest.fixture
+def index():
+    phenotypes = [
+        {"id": "P1", "sentinel_PID": "S-A"},
+        {"id": "P2", "sentinel_PID": "S-B", "cprd_PID": "C-A"},
+    ]
+    concepts = [
+        ("sentinel_concept", {"CID": "S1", "PIDs": ["S-A"], "code": "250.00", "code_type": ["ICD9CM"]}),
+        ("sentinel_concept", {"CID": "S2", "PIDs": ["S-B"], "code": "250.0", "code_type": ["ICD9CM"]}),
+        ("cprd_concept", {"CID": "C1", "PIDs": ["C-A"], "medcode": ["1234.0"]}),
+    ]
+    return build_code_index(phenotypes, concepts)
+
+
+def test_icd_codes_stay_distinct(index):
+    assert [hit["CID"] for hit in index.lookup("250.00", "ICD9CM")] == ["S1"]
+    assert [hit["CID"] for hit in index.lookup("250.0", "ICD-9-CM")] == ["S2"]
+    assert index.lookup("250", "ICD9CM") == []
+
+
+def test_lookup(index):
+    assert index.lookup("1234", "medcode") == [
+        {"system": "MEDCODE", "code": "1234", "label": "cprd_concept", "CID": "C1", "phenotype_ids": ["P2"]}
+    ]
+    assert index.phenotype_ids("25000") == ["P1"]
+    assert index.lookup("9999") == []
+
+
+def test_save_and_load(index, tmp_path):
+    path = str(tmp_path / "index.json")
+    index.save(path, built_at=0)
+    assert CodeIndex.load(path).systems == index.systems
@@ -0,0 +1,46 @@
+import math
+
+from phenomix.concepts import concepts_frame, project_concepts
+
+
+def test_project_native_lists():
+    concepts = [
+        {"CID": "C1", "PIDs": ["A", "B"], "medcode": [1.0, 2.0], "descr": "one"},
+        {"CID": "C2", "PIDs": ["B"], "medcode": [3.0], "descr": "two"},
+    ]
+    df = project_concepts(concepts, "B")
+    assert df["PIDs"].tolist() == ["B", "B"]
+    assert df["medcode"].tolist() == [2.0, 3.0]
+    assert df["descr"].tolist() == ["one", "two"]
+
+
+def test_project_legacy_strings_and_mixed_rows():
+    concepts = [
+        {"CID": "C1", "PIDs": "['A', 'B']", "code": "['x', 'y']", "num": "[1.0, nan]"},
+        {"CID": "C2", "PIDs": ["B"], "code": ["z"], "num": [4.0]},
+    ]
+    df = project_concepts(concepts, "B")
+    assert df["code"].tolist() == ["y", "z"]
+    assert math.isnan(df["num"][0]) and df["num"][1] == 4.0
+
+
+def test_project_leaves_unmatched_and_short_lists():
+    concepts = [
+        {"CID": "C1", "PIDs": ["A"], "code": ["x"]},            # detail not in PIDs
+        {"CID": "C2", "PIDs": ["A", "B"], "code": ["only"]},    # list shorter than PIDs
+    ]
+    df = project_concepts(concepts, "B")
+    assert df["code"].tolist() == [["x"], ["only"]]
+    assert df["PIDs"].tolist() == [["A"], "B"]
+
+
+def test_project_without_pids():
+    df = project_concepts([{"CID": "C1", "code": "['x']"}], "B")
+    assert df["code"].tolist() == [["x"]]
+    assert project_concepts([], "B").empty
+
+
+def test_concepts_frame_whole_floats_become_integers():
+    df = concepts_frame([{"CID": "C1", "PIDs": ["A"], "medcode": [1234.0]}], "A")
+    assert str(df["medcode"].dtype).startswith("int64")
+    assert df["medcode"][0] == 1234
@@ -0,0 +1,103 @@
+import pytest
+
+from phenomix.cypher_guard import CypherRejected, PlanReport, extract_cypher, guard, top_level
+
+
+class Summary:
+
+    def __init__(self, plan, query_type="r"):
+        self.plan = plan
+        self.query_type = query_type
+
+
+class ExplainSession:
+    # Answers EXPLAIN with a fixed plan
+
+    def __init__(self, plan, query_type="r"):
+        self.summary = Summary(plan, query_type)
+        self.queries = []
+
+    def run(self, query):
+        self.queries.append(query)
+        return self
+
+    def consume(self):
+        return self.summary
+
+
+def plan(rows, operator="ProduceResults@neo4j", children=()):
+    return {"operatorType": operator, "args": {"EstimatedRows": float(rows)}, "children": list(children)}
+
+
+def test_extract_cypher():
+    assert extract_cypher("Here:\n```cypher\nMATCH (n) RETURN n\n```") == "MATCH (n) RETURN n"
+    assert extract_cypher("`MATCH (n) RETURN n`") == "MATCH (n) RETURN n"
+
+
+def test_top_level():
+    assert "LIMIT" not in top_level("CALL { MATCH (n) RETURN n LIMIT 5 } RETURN n")
+    assert "LIMIT" not in top_level("MATCH (n {name: 'LIMIT 3'}) RETURN n.`LIMIT` // LIMIT 3")
+    assert "LIMIT" not in top_level("RETURN [x IN range(1, 10) | x][..3] /* LIMIT 3 */")
+    assert top_level("MATCH (n) RETURN n LIMIT 5").split()[-2:] == ["LIMIT", "5"]
+
+
+@pytest.mark.parametrize("cypher", [
+    "CALL { MATCH (c:cprd_concept) RETURN c LIMIT 5 } MATCH (c)--(d) RETURN d",
+    "MATCH (c:cprd_concept {descr: 'limit 10'}) RETURN c",
+    "MATCH (c:cprd_concept) RETURN c.limit AS `LIMIT`",
+    "MATCH (c:cprd_concept) // LIMIT 10\nRETURN c",
+    "MATCH (c:cprd_concept) WITH c LIMIT 10 MATCH (c)--(d) RETURN d",
+])
+def test_limit_appended_when_no_trailing_top_level_limit(cypher):
+    query, note = guard(ExplainSession(plan(50000)), cypher, row_limit=1000)
+    assert query.text.endswith("\nLIMIT 1000")
+    assert "LIMIT 1000 was added" in note
+
+
+@pytest.mark.parametrize("cypher", [
+    "MATCH (c:cprd_concept) RETURN c LIMIT 25",
+    "MATCH (c:cprd_concept) RETURN c ORDER BY c.CID limit $n;",
+])
+def test_trailing_limit_kept(cypher):
+    query, note = guard(ExplainSession(plan(50000)), cypher, row_limit=1000)
+    assert not query.text.endswith("LIMIT 1000") and note is None
+
+
+def test_small_results_untouched():
+    query, note = guard(ExplainSession(plan(10)), "MATCH (c:cprd_concept) RETURN c", row_limit=1000)
+    assert query.text == "MATCH (c:cprd_concept) RETURN c" and note is None
+
+
+def test_union_without_limits_rejected():
+    # A UNION inside a subquery does not count
+    with pytest.raises(CypherRejected, match="UNION"):
+        guard(ExplainSession(plan(50000)), "MATCH (a:x) RETURN a UNION MATCH (a:y) RETURN a", row_limit=1000)
+    query, _ = guard(ExplainSession(plan(50000)), "CALL { MATCH (a:x) RETURN a UNION MATCH (a:y) RETURN a } RETURN a",
+                     row_limit=1000)
+    assert query.text.endswith("LIMIT 1000")
+
+
+def test_union_needs_a_limit_on_every_branch():
+    with pytest.raises(CypherRejected, match="UNION"):
+        guard(ExplainSession(plan(50000)), "MATCH (a:x) RETURN a UNION ALL MATCH (a:y) RETURN a LIMIT 10",
+              row_limit=1000)
+    cypher = "MATCH (a:x) RETURN a LIMIT 10 UNION MATCH (a:y) RETURN a LIMIT 10"
+    query, note = guard(ExplainSession(plan(50000)), cypher, row_limit=1000)
+    assert query.text == cypher and note is None
+
+
+def test_unsafe_plans_rejected():
+    with pytest.raises(CypherRejected, match="writes"):
+        guard(ExplainSession(plan(1), query_type="rw"), "CREATE (n:x)")
+    with pytest.raises(CypherRejected, match="cartesian"):
+        guard(ExplainSession(plan(1, children=[plan(1, "CartesianProduct@neo4j")])), "MATCH (a), (b) RETURN a")
+    with pytest.raises(CypherRejected, match="estimates"):
+        guard(ExplainSession(plan(1, children=[plan(5e7, "Expand(All)")])), "MATCH (a)--(b) RETURN count(*)",
+              max_estimated_rows=1e6)
+
+
+def test_plan_report():
+    report = PlanReport(plan(5, children=[plan(100, "NodeByLabelScan@neo4j")]), "r")
+    assert report.operators == ["ProduceResults", "NodeByLabelScan"]
+    assert (report.estimated_rows, report.max_estimated_rows) == (5.0, 100.0)
+    assert report.problems() == []
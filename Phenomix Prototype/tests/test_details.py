@@ -0,0 +1,40 @@
+import pytest
+
+from benchmarks.bench_pages import app, clear_caches, rerun
+from benchmarks.synthetic import StandInDriver, SyntheticGraph
+from phenomix import db
+from phenomix.details import PHENOTYPE_VIEW_QUERY, load_phenotype_view
+from phenomix.sources import PID_PROPERTIES
+
+
+@pytest.fixture
+def duplicated():
+    # A CPRD detail reached by two DETAILS_ARE edges
+    graph = SyntheticGraph(60, concepts_per_detail=10)
+    phenotype = next(p for p in graph.phenotypes if p.get(PID_PROPERTIES["CPRD"]))
+    pid = phenotype[PID_PROPERTIES["CPRD"]]
+    phenotype[PID_PROPERTIES["CPRD"]] = [pid, pid]
+    return graph, phenotype["id"], pid
+
+
+def test_query_lists_each_detail_once():
+    assert "WITH DISTINCT p, d" in PHENOTYPE_VIEW_QUERY
+
+
+def test_duplicate_edge_gives_one_entry(duplicated):
+    graph, phenotype_id, pid = duplicated
+    view = load_phenotype_view(StandInDriver(graph), phenotype_id)
+    assert [entry["detail"]["PID"] for entry in view["sources"]["CPRD"]] == [pid]
+
+
+def test_view_page_with_duplicate_edge(duplicated):
+    graph, phenotype_id, _ = duplicated
+    clear_caches()
+    db.set_driver(StandInDriver(graph))
+    try:
+        at = rerun(app("view", phenotype_id))
+        cprd = next(toggle for toggle in at.toggle if toggle.label.startswith("Load"))
+        rerun(at, lambda at: cprd.set_value(True))
+    finally:
+        db.set_driver(None)
+        clear_caches()
@@ -0,0 +1,98 @@
+import csv
+import os
+
+import pyarrow.parquet as pq
+import pytest
+
+from benchmarks.synthetic import StandInDriver, SyntheticGraph
+from phenomix.export import EXPORT_CONCEPTS_QUERY, KEY_COLUMNS, export_concepts, neo4j_rows, select_phenotypes
+from phenomix.sources import CONCEPT_LABELS, DETAIL_LABELS, PID_PROPERTIES
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return SyntheticGraph(120, concepts_per_detail=20)
+
+
+def expected_rows(graph, phenotype_ids, source):
+    # (phenotype id, PID, CID) for every concept of the phenotypes' details of source
+    label = DETAIL_LABELS[source]
+    rows = set()
+    for phenotype_id in phenotype_ids:
+        value = graph.by_id[phenotype_id].get(PID_PROPERTIES[source])
+        for pid in value if isinstance(value, list) else [value] if value else []:
+            rows.update((phenotype_id, pid, cid) for cid in graph.concept_index[label].get(pid, ()))
+    return rows
+
+
+def test_export_concepts(graph, tmp_path):
+    driver = StandInDriver(graph)
+    phenotype_ids = graph.sample_ids(30)
+    results = export_concepts(neo4j_rows(driver), phenotype_ids, str(tmp_path), chunk_size=37)
+
+    # One query per source with concepts; HDRUK has none
+    assert set(results) == set(CONCEPT_LABELS)
+    assert driver.queries["concept export"] == len(CONCEPT_LABELS)
+    for source, result in results.items():
+        expected = expected_rows(graph, phenotype_ids, source)
+        assert result["rows"] == len(expected)
+        if not expected:
+            assert result["files"] == []
+            continue
+
+        with open(tmp_path / f"{source.lower()}_concepts.csv", newline="") as f:
+            rows = list(csv.DictReader(f))
+        table = pq.read_table(tmp_path / f"{source.lower()}_concepts.parquet")
+        columns = list(rows[0])
+        assert columns[:len(KEY_COLUMNS)] == KEY_COLUMNS
+        assert table.column_names == columns
+        assert len(columns) == result["columns"]
+        assert {(row["phenotype_id"], row["PID"], row["CID"]) for row in rows} == expected
+        assert table.num_rows == len(rows)
+
+        # List properties are projected onto the row's detail
+        for row in rows:
+            assert row["PIDs"] == row["PID"]
+            assert row["source"] == source
+
+    leftovers = [name for name in os.listdir(tmp_path) if name.endswith((".jsonl", ".tmp"))]
+    assert leftovers == []
+
+
+def test_duplicate_edges_export_once(tmp_path):
+    # A CPRD detail reached by two DETAILS_ARE edges
+    graph = SyntheticGraph(60, concepts_per_detail=10)
+    phenotype = next(p for p in graph.phenotypes if graph.concept_index["cprd_detail"].get(p.get("cprd_PID")))
+    pid = phenotype["cprd_PID"]
+    phenotype["cprd_PID"] = [pid, pid]
+    assert "WITH DISTINCT p, d, c" in EXPORT_CONCEPTS_QUERY
+
+    results = export_concepts(neo4j_rows(StandInDriver(graph)), [phenotype["id"]], str(tmp_path),
+                              formats=["csv"], sources=["CPRD"])
+    with open(tmp_path / "cprd_concepts.csv", newline="") as f:
+        rows = [(row["PID"], row["CID"]) for row in csv.DictReader(f)]
+    assert results["CPRD"]["rows"] == len(rows) == len(set(rows)) == len(graph.concept_index["cprd_detail"][pid])
+
+
+def test_export_csv_only(graph, tmp_path):
+    phenotype_ids = graph.sample_ids(5)
+    results = export_concepts(neo4j_rows(StandInDriver(graph)), phenotype_ids, str(tmp_path), formats=["csv"])
+    files = [path for result in results.values() for path in result["files"]]
+    assert files and all(path.endswith(".csv") for path in files)
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(path) for path in files)
+
+
+def test_failed_export_leaves_no_spool(tmp_path):
+    def rows(source, phenotype_ids):
+        yield "P1", "Phenotype", "D1", {"CID": "C1", "PIDs": ["D1"], "code": ["1"]}
+        raise RuntimeError("connection lost")
+
+    with pytest.raises(RuntimeError):
+        export_concepts(rows, ["P1"], str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_select_phenotypes(graph):
+    ids = select_phenotypes(graph.phenotypes, "", ["CPRD", "OHDSI"], "all")
+    assert ids and all(phenotype_id[2] != "X" and phenotype_id[3] != "X" for phenotype_id in ids)
+    assert set(ids) == {p["id"] for p in graph.phenotypes if p.get("cprd_PID") and p.get("ohdsi_PID")}
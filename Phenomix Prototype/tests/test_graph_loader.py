@@ -0,0 +1,20 @@
+import pytest
+
+from phenomix.graph_loader import parse_pids
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("['XXXXP0001', 'XXXXP0002']", ["XXXXP0001", "XXXXP0002"]),
+    # Written without quotes, which literal_eval cannot parse
+    ("[XXXXP0001, XXXXP0002]", ["XXXXP0001", "XXXXP0002"]),
+    ("[XXXXP0001, 'XXXXP0002']", ["XXXXP0001", "XXXXP0002"]),
+    # Numeric PIDs still match the string PID of the detail
+    ("[123, 456]", ["123", "456"]),
+    ("[123.0, nan]", ["123"]),
+    (["P1", 2], ["P1", "2"]),
+    ("P1", ["P1"]),
+    ("nan", []),
+    (None, []),
+])
+def test_parse_pids(value, expected):
+    assert parse_pids(value) == expected
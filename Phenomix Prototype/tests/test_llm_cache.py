@@ -0,0 +1,47 @@
+from phenomix.llm_cache import ResponseCache, cache_key, content_key, normalize_question, response_cache_from_env
+
+
+def test_question_normalization():
+    assert normalize_question("What codes  define Asthma?") == "what codes define asthma"
+    assert cache_key("What codes define X?", "prompt") == cache_key("what  codes define x", "prompt")
+    # Any change in the context is a different entry
+    assert cache_key("q", "prompt", "gpt-4o-mini") != cache_key("q", "prompt", "gpt-4o")
+    assert content_key("A?") != content_key("a")
+
+
+def test_lru_eviction_and_stats():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")    # evicts b, the least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+    assert len(cache) == 2
+    assert cache.stats() == {"entries": 2, "hits": 2, "misses": 1, "hit_rate": 2 / 3}
+
+
+def test_disk_entries_survive_restarts(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    ResponseCache(path=path).put("key", "cypher")
+    reopened = ResponseCache(path=path)
+    assert len(reopened) == 0
+    assert reopened.get("key") == "cypher"
+    assert len(reopened) == 1
+    reopened.clear()
+    assert ResponseCache(path=path).get("key") is None
+
+
+def test_disk_cap_keeps_most_recent(tmp_path):
+    cache = ResponseCache(max_entries=1, path=str(tmp_path / "responses.sqlite"), max_disk_entries=2)
+    for key in "abc":
+        cache.put(key, key.upper())
+    fresh = ResponseCache(path=str(tmp_path / "responses.sqlite"))
+    assert [fresh.get(key) for key in "abc"] == [None, "B", "C"]
+
+
+def test_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("PHENOMIX_TEST_CACHE_SIZE", "7")
+    monkeypatch.setenv("PHENOMIX_TEST_CACHE_PATH", str(tmp_path / "c.sqlite"))
+    cache = response_cache_from_env("PHENOMIX_TEST_CACHE")
+    assert cache.max_entries == 7 and cache._db is not None
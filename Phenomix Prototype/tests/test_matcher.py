@@ -0,0 +1,35 @@
+from phenomix.matcher import PhraseMatcher
+
+
+def matcher(**kwargs):
+    return PhraseMatcher([
+        ("P1", "Diabetes"), ("P2", "Type 2 Diabetes"), ("P3", "Asthma"),
+        ("P4", "asthma"), ("P5", "Heart failure"), ("P6", "he"),
+    ], **kwargs)
+
+
+def test_longest_match_wins():
+    assert matcher().find_keys("Patients with type 2 diabetes and heart failure") == ["P2", "P5"]
+
+
+def test_word_boundaries():
+    assert matcher().find_keys("asthmatic children") == []
+    assert matcher().find_keys("the asthma.") == ["P3", "P4"]
+    # Without boundaries, phrases match inside words
+    assert "P6" in matcher(word_boundaries=False).find_keys("the asthma")
+
+
+def test_shared_phrase_and_order_of_mention():
+    keys = matcher().find_keys("ASTHMA, then diabetes, then asthma again")
+    assert keys == ["P3", "P4", "P1"]
+    assert len(matcher()) == 5
+
+
+def test_all_matches_include_overlaps():
+    spans = sorted((start, end) for start, end, _ in matcher().all_matches("type 2 diabetes"))
+    assert spans == [(0, 15), (7, 15)]
+
+
+def test_empty_phrases_and_text():
+    assert PhraseMatcher([("P1", ""), ("P2", None)]).find("anything") == []
+    assert matcher().find("") == []
@@ -0,0 +1,56 @@
+from phenomix.cli import Checkpoint
+from phenomix.migrate import migrate_label
+
+
+class Result:
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def data(self):
+        return self.rows
+
+    def consume(self):
+        pass
+
+
+class Session:
+    # Pages and writes like READ_BATCH / WRITE_BATCH over {elementId: node}
+
+    def __init__(self, nodes, key):
+        self.nodes = nodes
+        self.key = key
+
+    def run(self, query, after=None, after_id=None, limit=None, rows=None):
+        if rows is not None:
+            for row in rows:
+                self.nodes[row["id"]].update(row["props"])
+            return Result([])
+        page = sorted((node[self.key], id, dict(node)) for id, node in self.nodes.items()
+                      if after is None or (node[self.key], id) > (after, after_id))
+        return Result([{"key": key, "id": id, "props": props} for key, id, props in page[:limit]])
+
+    def execute_write(self, work):
+        return work(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class Driver:
+
+    def __init__(self, session):
+        self._session = session
+
+    def session(self, **kwargs):
+        return self._session
+
+
+def test_duplicate_keys_across_batches():
+    # Three nodes share CID "C2" and the first batch ends on one of them
+    nodes = {f"4:x:{n}": {"CID": cid, "PIDs": f"['P{n}']"} for n, cid in enumerate(["C1", "C2", "C2", "C2", "C3"])}
+    migrate_label(Driver(Session(nodes, "CID")), "neo4j", "cprd_concept", "CID", Checkpoint(None), batch_size=2)
+    assert {id: node["PIDs"] for id, node in nodes.items()} == {f"4:x:{n}": [f"P{n}"] for n in range(5)}
@@ -0,0 +1,70 @@
+import math
+
+import pytest
+
+from phenomix.properties import as_list, legacy_value, native_properties, native_value, parse_list
+
+
+def test_parse_list():
+    assert parse_list("['a', 'b']") == ["a", "b"]
+    assert parse_list("[1.0, 2]") == [1.0, 2]
+    parsed = parse_list("[1.0, nan]")
+    assert parsed[0] == 1.0 and math.isnan(parsed[1])
+    assert parse_list("[not a list") is None
+    assert parse_list("__import__('os')") is None
+    assert parse_list(["a"]) is None
+
+
+@pytest.mark.parametrize("value", ["123", "1.0", "250.00", "04224", "1371.", "True", "None", "'quoted'", "text"])
+def test_legacy_value_keeps_scalar_strings(value):
+    # Only "[...]" strings are parsed; scalar strings are left as text (see the module docstring)
+    assert legacy_value(value) == value
+
+
+def test_legacy_value():
+    assert legacy_value("['x', 'y']") == ["x", "y"]
+    assert legacy_value(["x"]) == ["x"]
+    assert legacy_value(1.5) == 1.5
+    assert legacy_value(None) is None
+
+
+def test_as_list():
+    assert as_list(None) == []
+    assert as_list("nan") == []
+    assert as_list("") == []
+    assert as_list("['a']") == ["a"]
+    assert as_list("a") == ["a"]
+    assert as_list(3) == [3]
+
+
+def test_native_value():
+    assert native_value("cprd_concept", "medcode", "[1, 2.5]") == [1.0, 2.5]
+    assert native_value("cprd_concept", "read_code", "['a', 'b']") == ["a", "b"]
+    # Lists Neo4j cannot store are left alone
+    mixed = "['a', 1]"
+    assert native_value("cprd_concept", "x", mixed) is mixed
+    assert native_value("cprd_detail", "disease_num", " 12 ") == 12
+    assert native_value("hdruk_detail", "status", "2.0") == 2.0
+    # Only documented numeric properties become numbers
+    assert native_value("cprd_concept", "read_code", "04224") == "04224"
+
+
+def test_native_properties_only_returns_changes():
+    props = {"PIDs": "['A']", "descr": "text", "disease_num": "3"}
+    assert native_properties("cprd_detail", props) == {"PIDs": ["A"], "disease_num": 3}
+
+
+def test_parse_list_unquoted():
+    assert parse_list("[XXXXP0001, XXXXP0002]") == ["XXXXP0001", "XXXXP0002"]
+    assert parse_list("[a, 'b', \"c\", ]") == ["a", "b", "c"]
+    # Nested or unbalanced brackets are not split
+    assert parse_list("[a, [b]]") is None
+    assert parse_list("[a, b") is None
+
+
+def test_unquoted_lists():
+    # Displayed and migrated as lists of strings
+    assert legacy_value("[PK1, PK2]") == ["PK1", "PK2"]
+    assert as_list("[PK1, PK2]") == ["PK1", "PK2"]
+    assert native_value("phekb_concept", "PIDs", "[PK1, PK2]") == ["PK1", "PK2"]
+    assert native_properties("phekb_concept", {"PIDs": "[PK1]", "name": "x"}) == {"PIDs": ["PK1"]}
@@ -0,0 +1,84 @@
+import json
+
+from phenomix.results import ResultSummary, estimate_tokens, run_bounded, summarize_records
+
+
+def rows(count):
+    return ({"id": i, "group": "even" if i % 2 == 0 else "odd"} for i in range(count))
+
+
+def test_small_results_pass_verbatim():
+    summary = summarize_records(rows(3))
+    assert not summary.truncated and summary.exhausted
+    assert summary.row_count == 3
+    assert json.loads(summary.to_prompt()) == list(rows(3))
+    assert summary.describe() == "3 rows"
+
+
+def test_row_cap():
+    summary = summarize_records(rows(50), max_rows=10, sample_size=5)
+    assert summary.truncated and summary.exhausted
+    assert summary.rows == list(rows(10))
+    assert summary.row_count == 50
+    assert len(summary.samples) == 5 and all(row["id"] >= 10 for row in summary.samples)
+    assert summary.value_counts["group"] == {"even": 25, "odd": 25}
+    prompt = summary.to_prompt()
+    assert "The query returned 50 rows" in prompt and "'even' (25)" in prompt
+    assert summary.describe() == "10 of 50 rows passed to the model (truncated)"
+
+
+def test_token_budget():
+    big = ({"text": "x" * 400} for _ in range(10))
+    summary = summarize_records(big, token_budget=3 * estimate_tokens(json.dumps({"text": "x" * 400})))
+    assert len(summary.rows) == 3 and summary.truncated
+
+
+def test_scan_limit_stops_reading():
+    consumed = []
+
+    def source():
+        for row in rows(1000):
+            consumed.append(row)
+            yield row
+
+    summary = summarize_records(source(), max_rows=5, scan_limit=100)
+    assert summary.row_count == 100 and not summary.exhausted
+    assert len(consumed) == 101
+    assert "more than 100 rows" in summary.to_prompt()
+    assert summary.describe() == "5 of 100+ rows passed to the model (truncated)"
+
+
+class Record(dict):
+
+    def data(self):
+        return dict(self)
+
+
+class Result:
+
+    def __init__(self, records):
+        self.records = records
+        self.consumed = False
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def consume(self):
+        self.consumed = True
+
+
+class Session:
+
+    def __init__(self, result):
+        self.result = result
+
+    def run(self, query, parameters=None):
+        return self.result
+
+
+def test_run_bounded_consumes_the_rest():
+    result = Result([Record(row) for row in rows(20)])
+    summary = run_bounded(Session(result), "MATCH (n) RETURN n", max_rows=5)
+    assert isinstance(summary, ResultSummary)
+    assert summary.row_count == 20 and len(summary.rows) == 5
+    assert result.consumed
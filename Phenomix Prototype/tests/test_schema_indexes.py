@@ -0,0 +1,45 @@
+from neo4j.exceptions import Neo4jError
+
+from phenomix.schema_indexes import declare
+
+
+class Result:
+
+    def __init__(self, record=None):
+        self.record = record
+
+    def consume(self):
+        pass
+
+    def single(self):
+        return self.record
+
+
+class Session:
+    # Constraints fail on cprd_concept, which has the given number of duplicate CIDs
+
+    def __init__(self, duplicates):
+        self.duplicates = duplicates
+        self.statements = []
+
+    def run(self, statement):
+        self.statements.append(statement)
+        if statement.startswith("CREATE CONSTRAINT `cprd_concept_CID_unique`"):
+            raise Neo4jError("constraint failed")
+        if statement.startswith("MATCH"):
+            return Result({"duplicates": self.duplicates})
+        return Result()
+
+
+def test_duplicates_fall_back_to_range_index(capsys):
+    session = Session(3)
+    assert declare(session) == {"cprd_concept": 3}
+    assert any(statement.startswith("CREATE RANGE INDEX `cprd_concept_CID_range`") for statement in session.statements)
+
+
+def test_failure_without_duplicates_is_not_reported_as_duplicates(capsys):
+    # Rerun after the duplicates were removed: the range index blocks the constraint
+    session = Session(0)
+    assert declare(session) == {}
+    assert not any(statement.startswith("CREATE RANGE INDEX") for statement in session.statements)
+    assert "DROP INDEX `cprd_concept_CID_range`" in capsys.readouterr().out
@@ -0,0 +1,53 @@
+import pytest
+
+from phenomix.search import SearchIndex, normalize, scan_search
+
+RECORDS = [
+    {"id": "SHXXX0001", "phenotypes": "Type 2 Diabetes Mellitus"},
+    {"id": "XXCOX0002", "phenotypes": "Diabetes"},
+    {"id": "XXXOP0003", "phenotypes": "Heart failure"},
+    {"id": "SXXXX0004", "phenotypes": "Asthma"},
+    {"id": "XXCXX0005", "phenotypes": "Prediabetes screening"},
+    {"id": "XXXXP0006", "phenotypes": "Gestational diabetes"},
+]
+
+
+@pytest.fixture
+def index():
+    return SearchIndex.from_records(RECORDS)
+
+
+def ids(index, query, limit=None):
+    return [RECORDS[position]["id"] for position in index.search(query, limit=limit)]
+
+
+def test_normalize():
+    assert normalize("  Type-2  Diabetes! ") == "type 2 diabetes"
+
+
+def test_empty_query_returns_everything(index):
+    assert ids(index, "") == [record["id"] for record in RECORDS]
+
+
+def test_ranking_tiers(index):
+    # Whole name, then exact words, then prefixes, then words containing the query
+    assert ids(index, "diabetes") == ["XXCOX0002", "XXXXP0006", "SHXXX0001", "XXCXX0005"]
+    assert ids(index, "diab")[-1] == "XXCXX0005"
+
+
+@pytest.mark.parametrize("query", ["betes", "abet", "es mel", "as", "a", "rt fail", "2"])
+def test_finds_every_substring_match(index, query):
+    # Everything the original Browser's substring filter found is still found
+    expected = {record["id"] for record in scan_search(RECORDS, query)}
+    assert expected and expected <= set(ids(index, query))
+
+
+def test_typos_and_ids(index):
+    assert ids(index, "diabtes")[:1] == ["XXCOX0002"]
+    assert ids(index, "xxxop") == ["XXXOP0003"]
+    assert ids(index, "no such thing") == []
+
+
+def test_limit(index):
+    assert ids(index, "diabetes", limit=2) == ids(index, "diabetes")[:2]
+    assert len(ids(index, "", limit=3)) == 3
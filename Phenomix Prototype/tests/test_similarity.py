@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from phenomix.similarity import SimilarityIndex, build_similarity
+
+
+def jaccard(left, right):
+    return len(left & right) / len(left | right)
+
+
+@pytest.fixture
+def concept_sets():
+    rng = random.Random(0)
+    return [set(rng.sample(range(60), rng.randint(0, 12))) for _ in range(40)]
+
+
+def test_exact_scores_match_brute_force(concept_sets):
+    neighbours = build_similarity(concept_sets, top_k=5)
+    for index, pairs in enumerate(neighbours):
+        expected = sorted(
+            (jaccard(concept_sets[index], other_set) for other, other_set in enumerate(concept_sets)
+             if other != index and concept_sets[index] & other_set),
+            reverse=True)
+        assert [score for _, score in pairs][:len(expected[:5])] == pytest.approx(expected[:5])
+        for other, score in pairs:
+            assert other != index
+            assert score == pytest.approx(jaccard(concept_sets[index], concept_sets[other]))
+
+
+def test_empty_and_disjoint_sets_have_no_neighbours():
+    assert build_similarity([set(), {"a"}, {"b"}]) == [[], [], []]
+
+
+def test_large_sets_use_minhash():
+    big = {f"c{i}" for i in range(400)}
+    near = big | {"extra"}
+    neighbours = build_similarity([big, near, {"other"}], exact_max=100)
+    assert [other for other, _ in neighbours[0]] == [1]
+    assert neighbours[0][0][1] == pytest.approx(400 / 401, abs=0.1)
+
+
+def test_lookup_excludes_queried_ids():
+    index = SimilarityIndex({"A": "a", "B": "b", "C": "c"},
+                            {"A": [["B", 0.5], ["C", 0.2]], "B": [["A", 0.5], ["C", 0.9]]})
+    assert index.lookup(["A", "B"]) == [("C", "c", 0.9)]
+    assert index.lookup(["A"], k=1) == [("B", "b", 0.5)]